@@ -0,0 +1,73 @@
+import threading
+import time
+import traceback
+from typing import List
+
+from scripts.sim.scenarios import connect
+from scripts.utils.decent import vertical_landing
+
+
+# guided landing from a circular Mun orbit, whose steering burns leave
+# orbits missing the surface on the way down
+SCENARIO = "mun_orbit"
+TARGET_LAT = 0.0
+TARGET_LON = 10.0
+# seconds of real time to fly, enough at time scale 1 to pass pre-entry
+# guidance and the burn wait
+DURATION = 1200.0
+
+
+def run_check(time_scale: float = 1.0, duration: float = DURATION) -> bool:
+    """Fly a guided landing on the simulator and watch for errors
+
+    vertical_landing runs in a thread for duration seconds of real time,
+    or until it returns. The check fails if it raises, e.g. on a missing
+    impact prediction.
+
+    Args:
+        time_scale: simulation speed relative to real time
+        duration: seconds of real time to fly
+
+    Returns:
+        return True if vertical_landing did not raise
+    """
+    errors: List[str] = []
+    done = threading.Event()
+
+    with connect(scenario=SCENARIO, time_scale=time_scale) as conn:
+        vessel = conn.space_center.active_vessel
+
+        def land():
+            try:
+                vertical_landing(
+                    conn, target_lat=TARGET_LAT, target_lon=TARGET_LON
+                )
+            except Exception:
+                if not done.is_set():
+                    errors.append(traceback.format_exc())
+            finally:
+                done.set()
+
+        start = time.monotonic()
+        threading.Thread(target=land, daemon=True).start()
+        returned = done.wait(duration)
+        # the connection closes under a landing still running
+        done.set()
+        flight = vessel.flight(vessel.orbit.body.reference_frame)
+        print(
+            f"{'returned' if returned else 'flying'} after "
+            f"{time.monotonic() - start:.0f} s: {vessel.situation.name} at "
+            f"{flight.latitude:.3f}, {flight.longitude:.3f}, "
+            f"{flight.surface_altitude:.0f} m"
+        )
+
+    for error in errors:
+        print(error)
+    return not errors
+
+
+if __name__ == "__main__":
+    import sys
+
+    time_scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    sys.exit(0 if run_check(time_scale) else 1)
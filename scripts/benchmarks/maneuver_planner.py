@@ -0,0 +1,187 @@
+import time
+from typing import Callable, Tuple
+
+import numpy as np
+from astropy import units as AstropyUnit
+from astropy.constants import Constant as AstropyConstant
+from poliastro.bodies import Body as PoliastroBody
+from poliastro.maneuver import Maneuver
+from poliastro.twobody import Orbit as PoliastroOrbit
+from scripts.utils.kepler import KeplerOrbit
+from scripts.utils.maneuver import plan_change_apoapsis, plan_change_periapsis
+from scripts.utils.orbital_frame import orbital_frames
+
+
+KERBIN_GM = 3.5316e12
+KERBIN_RADIUS = 600000.0
+# speedup required from closed-form plans, fallback plans search
+REQUIRED_SPEEDUP = 100
+# tolerance of the legacy bisection, in m/s
+DV_TOLERANCE = 0.01
+
+
+def _poliastro_kerbin() -> PoliastroBody:
+    GM = AstropyConstant(
+        "GM_kKerbin",
+        "Kerbal Kerbin gravitational constant",
+        KERBIN_GM,
+        "m3 / (s2)",
+        0,
+        "benchmark",
+        system="si",
+    )
+    R = AstropyConstant(
+        "R_kKerbin",
+        "Kerbal Kerbin equatorial radius",
+        KERBIN_RADIUS,
+        "m",
+        0,
+        "benchmark",
+        system="si",
+    )
+    return PoliastroBody(None, GM, "", "Kerbin", R)
+
+
+def _legacy_bisection(
+    orbit: KeplerOrbit,
+    attractor: PoliastroBody,
+    ut: float,
+    node_ut: float,
+    burn_unit_vector: np.ndarray,
+    target: float,
+    use_apoapsis: bool,
+) -> float:
+    """Bisection on poliastro apply_maneuver, as maneuver.py used to plan"""
+    current = orbit.apoapsis if use_apoapsis else orbit.periapsis
+    is_raising = target > current
+    burn_direction = 1 if is_raising else -1
+    burn_vector = burn_direction * burn_unit_vector
+
+    r_i, v_i = orbit.state_at(ut)
+    ss_i = PoliastroOrbit.from_vectors(
+        attractor, r_i * AstropyUnit.m, v_i * AstropyUnit.m / AstropyUnit.s
+    )
+
+    def new_apsis(dv: float) -> float:
+        burn = dv * burn_vector * AstropyUnit.m / AstropyUnit.s
+        maneuver = Maneuver(((node_ut - ut) * AstropyUnit.s, burn))
+        new_ss = ss_i.apply_maneuver(maneuver)
+        apsis = new_ss.r_a if use_apoapsis else new_ss.r_p
+        return abs(apsis.to(AstropyUnit.m).value)
+
+    min_dv = 0
+    max_dv = 0
+    if is_raising:
+        max_dv = 0.25
+        tmp_new = current
+        while tmp_new < target:
+            max_dv *= 2
+            tmp_new = new_apsis(max_dv)
+            if max_dv > 100000:
+                break
+    else:
+        max_dv = np.linalg.norm(orbit.velocity_at(node_ut))
+
+    while max_dv - min_dv > DV_TOLERANCE:
+        tmp_dv = (max_dv + min_dv) / 2.0
+        tmp_new = new_apsis(tmp_dv)
+        if (is_raising and tmp_new > target) or (
+            not is_raising and tmp_new < target
+        ):
+            max_dv = tmp_dv
+        else:
+            min_dv = tmp_dv
+
+    return burn_direction * (max_dv + min_dv) / 2.0
+
+
+def _best_of(func: Callable[[], float], repeat: int) -> Tuple[float, float]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(repeat: int = 5) -> bool:
+    """Compare closed-form planner against poliastro bisection
+
+    Args:
+        repeat: number of repetition, best time is reported
+
+    Returns:
+        return True if every case gives deltaV within DV_TOLERANCE, and
+        every closed-form case reaches REQUIRED_SPEEDUP
+    """
+    attractor = _poliastro_kerbin()
+    orbit = KeplerOrbit(KERBIN_GM, 800000.0, 0.1, 0.3, 1.0, 2.0, 0.5, 0.0)
+    ut = 1000.0
+    node_ut = 1600.0
+    frames = orbital_frames(orbit, node_ut)
+    # no prograde burn brings the apoapsis below the vessel, which forces
+    # the secant fallback: both solvers burn down to a stop
+    radius = float(orbit.radius_at(node_ut))
+    below_vessel = (orbit.periapsis + radius) / 2
+
+    cases = [
+        ("raise apoapsis", True, frames.prograde, 1500000.0, True),
+        ("lower apoapsis", True, frames.prograde, 850000.0, True),
+        ("raise periapsis", False, frames.horizontal, 760000.0, True),
+        ("lower periapsis", False, frames.horizontal, 630000.0, True),
+        ("secant fallback", True, frames.prograde, below_vessel, False),
+    ]
+
+    ok = True
+    print(f"{'case':<16} {'legacy':>10} {'planner':>10} {'speedup':>8} dv diff")
+    for name, use_apoapsis, burn_unit_vector, target, closed_form in cases:
+        legacy_time, legacy_dv = _best_of(
+            lambda: _legacy_bisection(
+                orbit,
+                attractor,
+                ut,
+                node_ut,
+                burn_unit_vector,
+                target,
+                use_apoapsis,
+            ),
+            repeat,
+        )
+        if use_apoapsis:
+            planner_time, node = _best_of(
+                lambda: plan_change_apoapsis(orbit, node_ut, target),
+                repeat * 100,
+            )
+            planner_dv = node.prograde
+        else:
+            planner_time, node = _best_of(
+                lambda: plan_change_periapsis(orbit, node_ut, target),
+                repeat * 100,
+            )
+            planner_dv = np.dot(
+                (node.prograde, node.normal, node.radial),
+                (
+                    np.dot(frames.horizontal, frames.prograde),
+                    np.dot(frames.horizontal, frames.normal),
+                    np.dot(frames.horizontal, frames.anti_radial),
+                ),
+            )
+
+        speedup = legacy_time / planner_time
+        dv_diff = abs(planner_dv - legacy_dv)
+        ok = ok and dv_diff <= DV_TOLERANCE
+        if closed_form:
+            ok = ok and speedup >= REQUIRED_SPEEDUP
+        print(
+            f"{name:<16} {legacy_time * 1000:8.2f}ms {planner_time * 1000:8.3f}ms "
+            f"{speedup:7.0f}x {dv_diff:.4f} m/s"
+        )
+
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,410 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from scripts.sim.client import Client, LatencyModel
+from scripts.sim.scenarios import SCENARIOS
+from scripts.utils.body_catalog import body_catalog
+from scripts.utils.decent import (
+    impact_prediction,
+    landing_target_steering,
+    time_to_radius,
+)
+from scripts.utils.hohmann_transfer import (
+    get_phase_angle,
+    time_to_hohmann_transfer_at_phase_angle,
+)
+from scripts.utils.kepler import KeplerOrbit
+from scripts.utils.maneuver import (
+    plan_change_apoapsis,
+    plan_change_periapsis,
+    plan_circularize,
+    plan_match_plane,
+)
+from scripts.utils.rpc_counter import rpc_counter
+from scripts.utils.trajectory import (
+    TrajectoryModel,
+    atmosphere_table,
+    predict_impact,
+)
+
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "history.json")
+
+# a result regresses when it exceeds best recorded * ratio + slack
+THRESHOLDS = {
+    "wall_time": {"ratio": 1.5, "slack": 1e-5},
+    "rpc_count": {"ratio": 1.0, "slack": 0},
+    "peak_memory": {"ratio": 1.25, "slack": 1024},
+}
+
+
+class BenchmarkCase(NamedTuple):
+    """Benchmark of one call against a simulated scenario
+
+    prepare() sets the fixture up and returns the call to measure, number
+    is the number of calls per timing, for calls too fast to time alone.
+    """
+
+    name: str
+    scenario: str
+    prepare: Callable[[Client], Callable[[], Any]]
+    number: int = 1
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    wall_time: float
+    median_time: float
+    rpc_count: float
+    peak_memory: int
+
+
+def _circularize(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    node_ut = conn.space_center.ut + vessel.orbit.time_to_apoapsis
+
+    return lambda: plan_circularize(
+        KeplerOrbit.from_krpc_orbit(vessel.orbit), node_ut
+    )
+
+
+def _change_apoapsis(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    node_ut = conn.space_center.ut + vessel.orbit.time_to_periapsis
+    new_apoapsis = vessel.orbit.body.equatorial_radius + 400000.0
+
+    return lambda: plan_change_apoapsis(
+        KeplerOrbit.from_krpc_orbit(vessel.orbit), node_ut, new_apoapsis
+    )
+
+
+def _change_periapsis(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    node_ut = conn.space_center.ut + vessel.orbit.time_to_apoapsis
+    new_periapsis = vessel.orbit.body.equatorial_radius + 200000.0
+
+    return lambda: plan_change_periapsis(
+        KeplerOrbit.from_krpc_orbit(vessel.orbit), node_ut, new_periapsis
+    )
+
+
+def _match_plane(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    target = conn.space_center.bodies["Minmus"]
+
+    return lambda: plan_match_plane(vessel.orbit, target.orbit)
+
+
+def _hohmann_phase(conn: Client) -> Callable[[], Any]:
+    space_center = conn.space_center
+    vessel = space_center.active_vessel
+    target = space_center.bodies["Mun"]
+
+    def run():
+        phase_angle = get_phase_angle(vessel, target)
+        return time_to_hohmann_transfer_at_phase_angle(
+            vessel, target, space_center.ut, phase_angle
+        )
+
+    return run
+
+
+def _impact_prediction(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    body = vessel.orbit.body
+    flight = vessel.flight(body.reference_frame)
+    radius = vessel.orbit.radius
+    altitude = flight.surface_altitude
+    vertical_speed = flight.vertical_speed
+    horizontal_speed = flight.horizontal_speed
+    surface_gravity = body.surface_gravity
+    ut = conn.space_center.ut
+
+    return lambda: impact_prediction(
+        radius,
+        altitude,
+        vertical_speed,
+        horizontal_speed,
+        surface_gravity,
+        ut,
+    )
+
+
+def _time_to_radius(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    body = vessel.orbit.body
+    body_info = body_catalog(conn)[body.name]
+    position = vessel.position(body.reference_frame)
+    velocity = vessel.velocity(body.reference_frame)
+    ut = conn.space_center.ut
+
+    def run():
+        orbit = KeplerOrbit.from_surface_state(
+            body_info.gravitational_parameter,
+            body_info.rotational_speed,
+            position,
+            velocity,
+            ut,
+        )
+        return time_to_radius(orbit, body_info.equatorial_radius, ut)
+
+    return run
+
+
+def _landing_target_steering(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    ut = conn.space_center.ut
+    body_info = body_catalog(conn)[vessel.orbit.body.name]
+
+    return lambda: landing_target_steering(vessel, 0.5, 10.0, ut, body_info)
+
+
+def _trajectory_impact(conn: Client) -> Callable[[], Any]:
+    vessel = conn.space_center.active_vessel
+    body = vessel.orbit.body
+    body_info = body_catalog(conn)[body.name]
+    model = TrajectoryModel.for_body(
+        body_info,
+        atmosphere_table(conn, body.name),
+        drag_area=4.0,
+        mass=vessel.mass,
+    )
+    position = vessel.position(body.reference_frame)
+    velocity = vessel.velocity(body.reference_frame)
+    ut = conn.space_center.ut
+
+    return lambda: predict_impact(
+        model, position, velocity, ut, body_info.equatorial_radius
+    )
+
+
+CASES = [
+    BenchmarkCase("circularize", "kerbin_elliptic_orbit", _circularize),
+    BenchmarkCase("change_apoapsis", "kerbin_elliptic_orbit", _change_apoapsis),
+    BenchmarkCase(
+        "change_periapsis", "kerbin_elliptic_orbit", _change_periapsis
+    ),
+    BenchmarkCase("match_plane_with_target", "kerbin_orbit", _match_plane),
+    BenchmarkCase("hohmann_phase_angle", "kerbin_orbit", _hohmann_phase),
+    BenchmarkCase(
+        "impact_prediction", "mun_descent", _impact_prediction, number=1000
+    ),
+    BenchmarkCase("time_to_radius", "mun_descent", _time_to_radius, number=100),
+    BenchmarkCase(
+        "landing_target_steering", "mun_descent", _landing_target_steering
+    ),
+    BenchmarkCase(
+        "trajectory_impact", "kerbin_reentry", _trajectory_impact, number=100
+    ),
+]
+
+
+def measure(case: BenchmarkCase, conn: Client, repeat: int) -> BenchmarkResult:
+    """Measure a case
+
+    Args:
+        case: benchmark case
+        conn: connection to the scenario of the case
+        repeat: number of timings
+
+    Returns:
+        return BenchmarkResult, times and RPC count are per call
+    """
+    func = case.prepare(conn)
+    counter = rpc_counter(conn)
+    func()
+
+    times = []
+    start_count = counter.count
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(case.number):
+            func()
+        times.append((time.perf_counter() - start) / case.number)
+    rpc_count = (counter.count - start_count) / (repeat * case.number)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        case.name,
+        min(times),
+        statistics.median(times),
+        rpc_count,
+        peak_memory,
+    )
+
+
+def run_cases(
+    cases: List[BenchmarkCase], repeat: int, latency: LatencyModel
+) -> List[BenchmarkResult]:
+    """Measure cases, each against a new connection to its scenario
+
+    The simulation is frozen (time_scale 0), so every call sees the same
+    state.
+    """
+    results = []
+    for case in cases:
+        with Client(SCENARIOS[case.scenario](), latency, time_scale=0) as conn:
+            results.append(measure(case, conn, repeat))
+    return results
+
+
+def _fixture(latency: LatencyModel) -> Dict[str, Any]:
+    """properties a run must share with another to be comparable"""
+    return {
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "round_trip": latency.round_trip,
+        "jitter": latency.jitter,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"thresholds": THRESHOLDS, "runs": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_regressions(
+    results: List[BenchmarkResult],
+    history: Dict[str, Any],
+    fixture: Dict[str, Any],
+) -> List[str]:
+    """Compare results with the best comparable results in history
+
+    Args:
+        results: results of the current run
+        history: history loaded with load_history()
+        fixture: fixture of the current run
+
+    Returns:
+        return description of each regression, empty if none
+    """
+    thresholds = history.get("thresholds", THRESHOLDS)
+    runs = [run for run in history["runs"] if run["fixture"] == fixture]
+    regressions = []
+    for result in results:
+        previous = [
+            run["results"][result.name]
+            for run in runs
+            if result.name in run["results"]
+        ]
+        if not previous:
+            continue
+        for metric, threshold in thresholds.items():
+            best = min(p[metric] for p in previous)
+            limit = best * threshold["ratio"] + threshold["slack"]
+            value = getattr(result, metric)
+            if value > limit:
+                regressions.append(
+                    f"{result.name}: {metric} {value:.6g} > {limit:.6g} "
+                    f"(best {best:.6g})"
+                )
+    return regressions
+
+
+def record_run(
+    path: str,
+    history: Dict[str, Any],
+    results: List[BenchmarkResult],
+    fixture: Dict[str, Any],
+    regressions: List[str],
+):
+    history.setdefault("thresholds", THRESHOLDS)
+    history["runs"].append(
+        {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _commit(),
+            "fixture": fixture,
+            "results": {r.name: r._asdict() for r in results},
+            "regressions": regressions,
+        }
+    )
+    with open(path, "w") as f:
+        json.dump(history, f, indent=2)
+
+
+def run_suite(
+    repeat: int = 20,
+    latency: LatencyModel = LatencyModel(),
+    history_path: str = HISTORY_PATH,
+    record: bool = True,
+) -> bool:
+    """Run benchmark suite, and check results against the history file
+
+    Args:
+        repeat: number of timings per case
+        latency: RPC latency of the simulated connection
+        history_path: JSON history file of runs and thresholds
+        record: append this run to the history file
+
+    Returns:
+        return True if no case regressed
+    """
+    results = run_cases(CASES, repeat, latency)
+    print(
+        f"{'case':<24} {'best':>10} {'median':>10} {'RPCs':>7} {'peak mem':>10}"
+    )
+    for r in results:
+        print(
+            f"{r.name:<24} {r.wall_time * 1000:8.3f}ms "
+            f"{r.median_time * 1000:8.3f}ms {r.rpc_count:7.1f} "
+            f"{r.peak_memory / 1024:8.1f}KB"
+        )
+
+    history = load_history(history_path)
+    fixture = _fixture(latency)
+    regressions = find_regressions(results, history, fixture)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if record:
+        record_run(history_path, history, results, fixture, regressions)
+    return not regressions
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description=run_suite.__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="RPC round trip in seconds"
+    )
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument(
+        "--no-record", action="store_true", help="do not append this run"
+    )
+    args = parser.parse_args()
+
+    ok = run_suite(
+        repeat=args.repeat,
+        latency=LatencyModel(round_trip=args.latency),
+        history_path=args.history,
+        record=not args.no_record,
+    )
+    sys.exit(0 if ok else 1)
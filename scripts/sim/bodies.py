@@ -0,0 +1,138 @@
+import math
+from typing import Dict, NamedTuple, Optional
+
+
+class BodySpec(NamedTuple):
+    """Constants of a simulated celestial body
+
+    Orbital elements follow KSP conventions and are None for the root body.
+    The atmosphere is exponential with sea level density atmosphere_density
+    and scale height atmosphere_scale_height, cut off at atmosphere_depth.
+    Terrain is a sum of two sinusoids of terrain_amplitude above the
+    equatorial radius.
+    """
+
+    name: str
+    parent: Optional[str]
+    gravitational_parameter: float
+    equatorial_radius: float
+    rotational_period: float
+    initial_rotation: float
+    sphere_of_influence: float
+    atmosphere_depth: float = 0.0
+    atmosphere_density: float = 0.0
+    atmosphere_scale_height: float = 1.0
+    terrain_amplitude: float = 0.0
+    semi_major_axis: Optional[float] = None
+    eccentricity: Optional[float] = None
+    inclination: Optional[float] = None
+    longitude_of_ascending_node: Optional[float] = None
+    argument_of_periapsis: Optional[float] = None
+    mean_anomaly_at_epoch: Optional[float] = None
+    epoch: Optional[float] = None
+
+    @property
+    def has_atmosphere(self) -> bool:
+        return self.atmosphere_depth > 0
+
+    @property
+    def surface_gravity(self) -> float:
+        return self.gravitational_parameter / self.equatorial_radius ** 2
+
+    @property
+    def rotational_speed(self) -> float:
+        return 2 * math.pi / self.rotational_period
+
+    def rotation_angle_at(self, ut: float) -> float:
+        return (self.initial_rotation + self.rotational_speed * ut) % (
+            2 * math.pi
+        )
+
+    def surface_height(self, latitude: float, longitude: float) -> float:
+        """terrain height above equatorial radius, lat/lon in degree"""
+        if not self.terrain_amplitude:
+            return 0.0
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+        return self.terrain_amplitude * (
+            1.0
+            + 0.6 * math.sin(3 * lon + 1.0) * math.cos(2 * lat)
+            + 0.4 * math.sin(7 * lat + 11 * lon)
+        )
+
+    def density_at(self, altitude: float) -> float:
+        """atmosphere density in kg/m^3 at altitude above sea level"""
+        if altitude >= self.atmosphere_depth:
+            return 0.0
+        return self.atmosphere_density * math.exp(
+            -max(0.0, altitude) / self.atmosphere_scale_height
+        )
+
+
+STOCK_BODIES: Dict[str, BodySpec] = {
+    body.name: body
+    for body in [
+        BodySpec(
+            name="Sun",
+            parent=None,
+            gravitational_parameter=1.1723328e18,
+            equatorial_radius=261600000.0,
+            rotational_period=432000.0,
+            initial_rotation=0.0,
+            sphere_of_influence=math.inf,
+        ),
+        BodySpec(
+            name="Kerbin",
+            parent="Sun",
+            gravitational_parameter=3.5316e12,
+            equatorial_radius=600000.0,
+            rotational_period=21549.425,
+            initial_rotation=math.pi / 2,
+            sphere_of_influence=84159286.0,
+            atmosphere_depth=70000.0,
+            atmosphere_density=1.225,
+            atmosphere_scale_height=5600.0,
+            semi_major_axis=13599840256.0,
+            eccentricity=0.0,
+            inclination=0.0,
+            longitude_of_ascending_node=0.0,
+            argument_of_periapsis=0.0,
+            mean_anomaly_at_epoch=3.14,
+            epoch=0.0,
+        ),
+        BodySpec(
+            name="Mun",
+            parent="Kerbin",
+            gravitational_parameter=6.5138398e10,
+            equatorial_radius=200000.0,
+            rotational_period=138984.38,
+            initial_rotation=4.014,
+            sphere_of_influence=2429559.1,
+            terrain_amplitude=300.0,
+            semi_major_axis=12000000.0,
+            eccentricity=0.0,
+            inclination=0.0,
+            longitude_of_ascending_node=0.0,
+            argument_of_periapsis=0.0,
+            mean_anomaly_at_epoch=1.7,
+            epoch=0.0,
+        ),
+        BodySpec(
+            name="Minmus",
+            parent="Kerbin",
+            gravitational_parameter=1.7658e9,
+            equatorial_radius=60000.0,
+            rotational_period=40400.0,
+            initial_rotation=4.014,
+            sphere_of_influence=2247428.4,
+            terrain_amplitude=150.0,
+            semi_major_axis=47000000.0,
+            eccentricity=0.0,
+            inclination=math.radians(6.0),
+            longitude_of_ascending_node=math.radians(78.0),
+            argument_of_periapsis=math.radians(38.0),
+            mean_anomaly_at_epoch=0.9,
+            epoch=0.0,
+        ),
+    ]
+}
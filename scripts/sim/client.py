@@ -0,0 +1,303 @@
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from scripts.sim.krpc_service import KRPC, Event
+from scripts.sim.physics import Simulator
+from scripts.sim.remote import PROCEDURES, RemoteMethod
+from scripts.sim.space_center import RAILS_WARP_RATES, SpaceCenter
+
+
+class LatencyModel(NamedTuple):
+    """Round trip time of an RPC, in seconds
+
+    Each RPC sleeps round_trip plus a uniform jitter in [0, jitter).
+    """
+
+    round_trip: float = 0.0
+    jitter: float = 0.0
+    seed: Optional[int] = None
+
+    def delay(self, rng: random.Random) -> float:
+        if self.jitter:
+            return self.round_trip + rng.uniform(0.0, self.jitter)
+        return self.round_trip
+
+
+class Call(object):
+    """Remote call, as returned by get_call"""
+
+    def __init__(self, client: "Client", procedure: Callable, args: list):
+        self._client = client
+        self._procedure = procedure
+        self._args = args
+
+    def evaluate(self) -> Any:
+        """Evaluate the call on the simulation side, without latency"""
+        with self._client.sim.lock:
+            return self._procedure(*self._args)
+
+
+class Stream(object):
+    """Stream of a call, as krpc.stream.Stream
+
+    Updated by the simulation thread at most rate times per second, every
+    update if rate is 0.
+    """
+
+    def __init__(self, client: "Client", call: Call):
+        self._client = client
+        self._call = call
+        self._value = call.evaluate()
+        self._callbacks: List[Callable[[Any], None]] = []
+        self._last_update = 0.0
+        self.condition = threading.Condition()
+        self.started = True
+        self.removed = False
+        self.rate = 0.0
+
+    def __call__(self) -> Any:
+        return self._value
+
+    def start(self, wait: bool = True):
+        self.started = True
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait for the next update, call while holding condition"""
+        self.condition.wait(timeout)
+
+    def add_callback(self, callback: Callable[[Any], None]):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[Any], None]):
+        self._callbacks.remove(callback)
+
+    def remove(self):
+        self.removed = True
+        self._client.remove_stream(self)
+
+    def due(self, now: float) -> bool:
+        return not self.rate or now - self._last_update >= 1.0 / self.rate
+
+    def update(self, value: Any, now: float) -> List[Callable[[], None]]:
+        """Set value, return callbacks to call for this update"""
+        with self.condition:
+            self._value = value
+            self._last_update = now
+            self.condition.notify_all()
+        return [lambda c=c: c(value) for c in self._callbacks]
+
+
+class Client(object):
+    """In process stand-in of krpc.client.Client running a Simulator
+
+    Every RPC goes through _invoke, which sleeps for the latency model,
+    so RPC counters and profilers wrapping _invoke work as with kRPC.
+    A background thread advances the simulation in real time multiplied
+    by time_scale and by the rails warp rate, updates streams and fires
+    events. Stream and event callbacks run on a separate thread, so that
+    callbacks making RPCs do not stall the simulation.
+
+    Attributes:
+        sim: simulation
+        space_center: SpaceCenter service
+        krpc: KRPC service
+        stream_update_condition: notified after each stream update
+    """
+
+    def __init__(
+        self,
+        sim: Simulator,
+        latency: LatencyModel = LatencyModel(),
+        time_scale: float = 1.0,
+        tick: float = 0.01,
+        max_steps_per_tick: int = 50,
+    ):
+        self.sim = sim
+        self.latency = latency
+        self.time_scale = time_scale
+        self.tick = tick
+        self.max_steps_per_tick = max_steps_per_tick
+        self.stream_update_condition = threading.Condition()
+        self._random = random.Random(latency.seed)
+        self._rpc_lock = threading.Lock()
+        self._streams: List[Stream] = []
+        self._events: List[Event] = []
+        self._callbacks: "queue.Queue[Optional[Callable]]" = queue.Queue()
+        self._closed = threading.Event()
+
+        self.space_center = SpaceCenter(self)
+        self.krpc = KRPC(self)
+
+        self._sim_thread = threading.Thread(
+            target=self._run_simulation, name="sim", daemon=True
+        )
+        self._callback_thread = threading.Thread(
+            target=self._run_callbacks, name="sim-callbacks", daemon=True
+        )
+        self._sim_thread.start()
+        self._callback_thread.start()
+
+    def _invoke(
+        self,
+        service: str,
+        procedure: str,
+        args: Optional[list] = None,
+        param_names: Optional[list] = None,
+        param_types: Optional[list] = None,
+        return_type: Any = None,
+    ) -> Any:
+        handler = self._handler(service, procedure)
+        args = args or []
+        with self._rpc_lock:
+            delay = self.latency.delay(self._random)
+        if delay:
+            time.sleep(delay)
+        if getattr(handler, "blocking", False):
+            return handler(*args)
+        with self.sim.lock:
+            return handler(*args)
+
+    def _handler(self, service: str, procedure: str) -> Callable:
+        return PROCEDURES[(service, procedure)]
+
+    def get_call(self, func: Callable, *args, **kwargs) -> Call:
+        """Return call of a remote property or method
+
+        Args:
+            func: getattr with (obj, name) args, or a remote method
+            args: arguments of func
+
+        Returns:
+            return Call, to use with add_stream or Expression.call
+        """
+        if func is getattr:
+            obj, name = args
+            descriptor = getattr(type(obj), name)
+            handler = self._handler(descriptor.service, descriptor.getter)
+            return Call(self, handler, [obj])
+        if isinstance(func, RemoteMethod):
+            return Call(self, func.method.func, func.bind(*args, **kwargs))
+        raise TypeError(f"{func} is not a remote procedure")
+
+    def add_stream(self, func: Callable, *args, **kwargs) -> Stream:
+        """Create a stream, costs one RPC as with kRPC"""
+        call = self.get_call(func, *args, **kwargs)
+        return self._invoke("KRPC", "AddStream", [self, call])
+
+    def stream(self, func: Callable, *args, **kwargs):
+        """Context manager of a stream, removed on exit"""
+        return _StreamContext(self.add_stream(func, *args, **kwargs))
+
+    def remove_stream(self, stream: Stream):
+        with self.sim.lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    def add_event(self, event: Event):
+        with self.sim.lock:
+            self._events.append(event)
+
+    def remove_event(self, event: Event):
+        with self.sim.lock:
+            if event in self._events:
+                self._events.remove(event)
+
+    def wait_for(
+        self, predicate: Callable[[], bool], timeout: Optional[float] = None
+    ) -> bool:
+        """Block until predicate, evaluated under the simulation lock, holds
+
+        Args:
+            predicate: condition on the simulation
+            timeout: timeout in seconds of real time, None waits forever
+
+        Returns:
+            return True if predicate holds, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.sim.lock:
+                if predicate():
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(self.tick)
+
+    def update_streams(self):
+        """Update streams and fire events from the current simulation state"""
+        now = time.monotonic()
+        callbacks = []
+        with self.sim.lock:
+            updates = [
+                (stream, stream._call.evaluate())
+                for stream in list(self._streams)
+                if stream.started and stream.due(now)
+            ]
+            for event in list(self._events):
+                callbacks += event.check()
+        # as kRPC, values are stored one stream at a time under the lock of
+        # each stream, and stream_update_condition is only notified after
+        for stream, value in updates:
+            callbacks += stream.update(value, now)
+        with self.stream_update_condition:
+            self.stream_update_condition.notify_all()
+        for callback in callbacks:
+            self._callbacks.put(callback)
+
+    def _run_simulation(self):
+        last = time.monotonic()
+        while not self._closed.wait(self.tick):
+            now = time.monotonic()
+            with self.sim.lock:
+                rate = (
+                    self.time_scale
+                    * RAILS_WARP_RATES[self.sim.rails_warp_factor]
+                )
+                self.sim.advance(
+                    self.sim.ut + (now - last) * rate,
+                    max_steps=self.max_steps_per_tick,
+                )
+            last = now
+            self.update_streams()
+
+    def _run_callbacks(self):
+        while True:
+            callback = self._callbacks.get()
+            if callback is None:
+                return
+            callback()
+
+    def close(self):
+        """Stop the simulation thread"""
+        self._closed.set()
+        self._callbacks.put(None)
+        self._sim_thread.join()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _StreamContext(object):
+    def __init__(self, stream: Stream):
+        self._stream = stream
+
+    def __enter__(self) -> Stream:
+        return self._stream
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stream.remove()
+
+
+def _add_stream(client: Client, call: Call) -> Stream:
+    stream = Stream(client, call)
+    client._streams.append(stream)
+    return stream
+
+
+PROCEDURES[("KRPC", "AddStream")] = _add_stream
@@ -0,0 +1,261 @@
+import operator
+import threading
+from enum import Enum
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from scripts.sim.remote import RemoteObject, remote_method
+
+
+# version reported by get_status, as "<kRPC version>-sim"
+VERSION = "0.4.9-sim"
+
+
+class Status(NamedTuple):
+    version: str
+
+
+class Type(RemoteObject):
+    """Expression types, as conn.krpc.Type"""
+
+    _service = "KRPC"
+
+    def __init__(self, client, convert: Optional[Callable] = None):
+        super().__init__(client)
+        self.convert = convert
+
+    def _key(self):
+        return self.convert
+
+    @remote_method
+    def int(self) -> "Type":
+        return Type(self._client, _to_int)
+
+    @remote_method
+    def double(self) -> "Type":
+        return Type(self._client, float)
+
+    @remote_method
+    def float(self) -> "Type":
+        return Type(self._client, float)
+
+    @remote_method
+    def bool(self) -> "Type":
+        return Type(self._client, bool)
+
+    @remote_method
+    def string(self) -> "Type":
+        return Type(self._client, str)
+
+
+def _to_int(value: Any) -> int:
+    """cast as kRPC, enums to their value"""
+    return int(value.value if isinstance(value, Enum) else value)
+
+
+class Expression(RemoteObject):
+    """Server side expression, as conn.krpc.Expression
+
+    Expressions are evaluated by the simulation, without latency. The
+    conn.krpc.Expression object only builds expressions, each construction
+    is an RPC as with kRPC.
+    """
+
+    _service = "KRPC"
+
+    def __init__(self, client, evaluate: Optional[Callable[[], Any]] = None):
+        super().__init__(client)
+        self.evaluate = evaluate
+
+    def _unary(self, func: Callable, a: "Expression") -> "Expression":
+        return Expression(self._client, lambda: func(a.evaluate()))
+
+    def _binary(
+        self, func: Callable, a: "Expression", b: "Expression"
+    ) -> "Expression":
+        return Expression(
+            self._client, lambda: func(a.evaluate(), b.evaluate())
+        )
+
+    def _constant(self, value: Any) -> "Expression":
+        return Expression(self._client, lambda: value)
+
+    @remote_method
+    def call(self, call) -> "Expression":
+        return Expression(self._client, call.evaluate)
+
+    @remote_method
+    def constant_double(self, value: float) -> "Expression":
+        return self._constant(float(value))
+
+    @remote_method
+    def constant_float(self, value: float) -> "Expression":
+        return self._constant(float(value))
+
+    @remote_method
+    def constant_int(self, value: int) -> "Expression":
+        return self._constant(int(value))
+
+    @remote_method
+    def constant_bool(self, value: bool) -> "Expression":
+        return self._constant(bool(value))
+
+    @remote_method
+    def constant_string(self, value: str) -> "Expression":
+        return self._constant(str(value))
+
+    @remote_method
+    def equal(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.eq, arg0, arg1)
+
+    @remote_method
+    def not_equal(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.ne, arg0, arg1)
+
+    @remote_method
+    def greater_than(
+        self, arg0: "Expression", arg1: "Expression"
+    ) -> "Expression":
+        return self._binary(operator.gt, arg0, arg1)
+
+    @remote_method
+    def greater_than_or_equal(
+        self, arg0: "Expression", arg1: "Expression"
+    ) -> "Expression":
+        return self._binary(operator.ge, arg0, arg1)
+
+    @remote_method
+    def less_than(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.lt, arg0, arg1)
+
+    @remote_method
+    def less_than_or_equal(
+        self, arg0: "Expression", arg1: "Expression"
+    ) -> "Expression":
+        return self._binary(operator.le, arg0, arg1)
+
+    @remote_method
+    def and_(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(lambda a, b: bool(a and b), arg0, arg1)
+
+    @remote_method
+    def or_(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(lambda a, b: bool(a or b), arg0, arg1)
+
+    @remote_method
+    def not_(self, arg: "Expression") -> "Expression":
+        return self._unary(operator.not_, arg)
+
+    @remote_method
+    def add(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.add, arg0, arg1)
+
+    @remote_method
+    def subtract(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.sub, arg0, arg1)
+
+    @remote_method
+    def multiply(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.mul, arg0, arg1)
+
+    @remote_method
+    def divide(self, arg0: "Expression", arg1: "Expression") -> "Expression":
+        return self._binary(operator.truediv, arg0, arg1)
+
+    @remote_method
+    def cast(self, arg: "Expression", type: Type) -> "Expression":
+        return self._unary(type.convert, arg)
+
+    @remote_method
+    def get(self, arg: "Expression", index: "Expression") -> "Expression":
+        return self._binary(operator.getitem, arg, index)
+
+    @remote_method
+    def count(self, arg: "Expression") -> "Expression":
+        return self._unary(len, arg)
+
+    @remote_method
+    def sum(self, arg: "Expression") -> "Expression":
+        return self._unary(sum, arg)
+
+    @remote_method
+    def to_list(self, arg: "Expression") -> "Expression":
+        return self._unary(list, arg)
+
+
+class Event(object):
+    """Event triggered once when its expression becomes true
+
+    Mirrors krpc.event.Event: wait() must be called while holding
+    condition, and callbacks take no argument.
+    """
+
+    def __init__(self, client, expression: Expression):
+        self._client = client
+        self._expression = expression
+        self._callbacks: List[Callable[[], None]] = []
+        self.condition = threading.Condition()
+        self.started = False
+        self.fired = False
+        self.removed = False
+
+    @property
+    def stream(self) -> "Event":
+        return self
+
+    def start(self):
+        self.started = True
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait until the event fires, call while holding condition"""
+        self.start()
+        if not self.fired:
+            self.condition.wait(timeout)
+
+    def add_callback(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[], None]):
+        self._callbacks.remove(callback)
+
+    def remove(self):
+        self.removed = True
+        self._client.remove_event(self)
+
+    def check(self) -> List[Callable[[], None]]:
+        """Evaluate the expression, simulation lock held
+
+        Returns:
+            return callbacks to call when the event fires, else empty list
+        """
+        if not self.started or self.fired or self.removed:
+            return []
+        if not self._expression.evaluate():
+            return []
+        self.fired = True
+        with self.condition:
+            self.condition.notify_all()
+        return list(self._callbacks)
+
+
+class KRPC(RemoteObject):
+    """KRPC service, as conn.krpc"""
+
+    _service = "KRPC"
+
+    def __init__(self, client):
+        super().__init__(client)
+        self.Expression = Expression(client)
+        self.Type = Type(client)
+
+    def _key(self):
+        return "krpc"
+
+    @remote_method
+    def get_status(self) -> Status:
+        return Status(VERSION)
+
+    @remote_method
+    def add_event(self, expression: Expression) -> Event:
+        event = Event(self._client, expression)
+        self._client.add_event(event)
+        return event
@@ -0,0 +1,690 @@
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scripts.sim.bodies import BodySpec
+from scripts.utils.kepler import KeplerOrbit
+from scripts.utils.orbital_frame import orbital_frames
+from scripts.utils.vessel_design import (
+    G0,
+    RESOURCE_DENSITY,
+    StageSpec,
+    VesselDesign,
+)
+
+
+# share of liquid propellant mass flow, as LV-T45 mixture ratio
+LIQUID_FUEL_RATIO = 0.45
+
+NORTH = np.array((0.0, 1.0, 0.0))
+
+
+class NodeState(object):
+    """Maneuver node, burn vector is fixed in the body non-rotating frame"""
+
+    def __init__(
+        self, ut: float, prograde: float, normal: float, radial: float
+    ):
+        self.ut = ut
+        self.prograde = prograde
+        self.normal = normal
+        self.radial = radial
+        self.burn_vector = np.zeros(3)
+        self.applied = np.zeros(3)
+        self.removed = False
+
+    @property
+    def remaining_vector(self) -> np.ndarray:
+        return self.burn_vector - self.applied
+
+
+class StageState(object):
+    def __init__(self, spec: StageSpec):
+        self.spec = spec
+        self.resources = {
+            "LiquidFuel": spec.liquid_fuel,
+            "Oxidizer": spec.oxidizer,
+            "SolidFuel": spec.solid_fuel,
+        }
+        self.decoupled = False
+
+    @property
+    def mass(self) -> float:
+        return self.spec.dry_mass + sum(
+            amount * RESOURCE_DENSITY[name]
+            for name, amount in self.resources.items()
+        )
+
+    @property
+    def is_solid(self) -> bool:
+        return self.spec.solid_fuel > 0
+
+    @property
+    def has_fuel(self) -> bool:
+        if self.is_solid:
+            return self.resources["SolidFuel"] > 0
+        return (
+            self.resources["LiquidFuel"] > 0 and self.resources["Oxidizer"] > 0
+        )
+
+    def burn(self, propellant_mass: float):
+        if self.is_solid:
+            names = [("SolidFuel", 1.0)]
+        else:
+            names = [
+                ("LiquidFuel", LIQUID_FUEL_RATIO),
+                ("Oxidizer", 1 - LIQUID_FUEL_RATIO),
+            ]
+        for name, ratio in names:
+            units = propellant_mass * ratio / RESOURCE_DENSITY[name]
+            self.resources[name] = max(0.0, self.resources[name] - units)
+
+
+class Transform(NamedTuple):
+    """Reference frame at an instant, relative to the simulation frame
+
+    axes rows are the frame axes in the non-rotating frame of the body the
+    vessel orbits, angular_speed is the rotation about the north axis.
+    """
+
+    origin: np.ndarray
+    axes: np.ndarray
+    origin_velocity: np.ndarray
+    angular_speed: float = 0.0
+
+    def position(self, position: np.ndarray) -> np.ndarray:
+        return self.axes @ (np.asarray(position) - self.origin)
+
+    def direction(self, direction: np.ndarray) -> np.ndarray:
+        return self.axes @ np.asarray(direction)
+
+    def velocity(self, position: np.ndarray, velocity: np.ndarray):
+        r = np.asarray(position) - self.origin
+        rotation = self.angular_speed * np.array((-r[2], 0.0, r[0]))
+        return self.axes @ (
+            np.asarray(velocity) - self.origin_velocity - rotation
+        )
+
+    def from_position(self, position: np.ndarray) -> np.ndarray:
+        return self.axes.T @ np.asarray(position) + self.origin
+
+    def from_direction(self, direction: np.ndarray) -> np.ndarray:
+        return self.axes.T @ np.asarray(direction)
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return np.asarray(vector, dtype=float)
+    return vector / norm
+
+
+def _axes_from_forward(forward: np.ndarray, up: np.ndarray) -> np.ndarray:
+    """axes with y along forward, x toward up, as kRPC vessel frames"""
+    y = _unit(forward)
+    x = up - y * np.dot(up, y)
+    if np.linalg.norm(x) < 1e-9:
+        x = NORTH - y * np.dot(NORTH, y)
+    x = _unit(x)
+    z = np.cross(x, y)
+    return np.array((x, y, z))
+
+
+def _slerp(current: np.ndarray, target: np.ndarray, max_angle: float):
+    cos_angle = np.clip(np.dot(current, target), -1.0, 1.0)
+    angle = math.acos(cos_angle)
+    if angle <= max_angle:
+        return target
+    axis = target - current * cos_angle
+    if np.linalg.norm(axis) < 1e-9:
+        axis = NORTH - current * np.dot(NORTH, current)
+    axis = _unit(axis)
+    return _unit(current * math.cos(max_angle) + axis * math.sin(max_angle))
+
+
+class Simulator(object):
+    """Two-body plus thrust simulation of one vessel
+
+    The vessel moves under the gravity of one body (no sphere of influence
+    changes), the thrust of its active engines and the drag of an
+    exponential atmosphere. While coasting outside the atmosphere the
+    vessel is on rails and propagated exactly with KeplerOrbit, like KSP.
+    Vectors are in the non-rotating reference frame of the body, with kRPC
+    axes (y to the north pole).
+    Attitude slews toward the SAS or autopilot target at turn_rate.
+    All methods are thread safe.
+    """
+
+    def __init__(
+        self,
+        bodies: Dict[str, BodySpec],
+        body: str,
+        design: VesselDesign,
+        position: np.ndarray,
+        velocity: np.ndarray,
+        ut: float = 0.0,
+        direction: Optional[np.ndarray] = None,
+        current_stage: Optional[int] = None,
+        landed: bool = False,
+        physics_step: float = 0.02,
+    ):
+        self.lock = threading.RLock()
+        self.bodies = bodies
+        self.body = bodies[body]
+        self.design = design
+        self.physics_step = physics_step
+        self.ut = ut
+
+        self.position = np.asarray(position, dtype=float)
+        self.velocity = np.asarray(velocity, dtype=float)
+        up = _unit(self.position)
+        self.direction = _unit(
+            np.asarray(direction, dtype=float) if direction is not None else up
+        )
+
+        self.stages = [StageState(spec) for spec in design.stages]
+        if current_stage is None:
+            current_stage = max(s.activate_stage for s in design.stages) + 1
+        self.current_stage = current_stage
+
+        self.throttle = 0.0
+        self.sas = False
+        self.sas_mode = "stability_assist"
+        self.speed_mode = "orbit"
+        self.rcs = False
+        self.autopilot_engaged = False
+        self.autopilot_target: Optional[tuple] = None
+        self.legs_deployed = [False] * design.legs
+        self.panels_deployed = [True] * (design.solar_panels + design.radiators)
+        self.nodes: List[NodeState] = []
+        self.rails_warp_factor = 0
+
+        self.landed = False
+        self.pre_launch = landed
+        self.crashed = False
+        self.touchdown_speed: Optional[float] = None
+        self._surface_position = None
+        self._rails_orbit: Optional[KeplerOrbit] = None
+        if landed:
+            self._land()
+
+    # body geometry
+
+    def rotation_angle(self, body: BodySpec = None, ut: float = None):
+        body = body or self.body
+        return body.rotation_angle_at(self.ut if ut is None else ut)
+
+    def body_axes(self, body: BodySpec = None, ut: float = None) -> np.ndarray:
+        """axes of the rotating frame of body in its non-rotating frame"""
+        angle = self.rotation_angle(body, ut)
+        c = math.cos(angle)
+        s = math.sin(angle)
+        return np.array(((c, 0.0, s), (0.0, 1.0, 0.0), (-s, 0.0, c)))
+
+    def body_kepler_orbit(self, body: BodySpec) -> Optional[KeplerOrbit]:
+        if body.parent is None:
+            return None
+        return KeplerOrbit(
+            self.bodies[body.parent].gravitational_parameter,
+            body.semi_major_axis,
+            body.eccentricity,
+            body.inclination,
+            body.longitude_of_ascending_node,
+            body.argument_of_periapsis,
+            body.mean_anomaly_at_epoch,
+            body.epoch,
+        )
+
+    def _absolute_state(self, body: BodySpec, ut: float):
+        if body.parent is None:
+            return np.zeros(3), np.zeros(3)
+        position, velocity = self.body_kepler_orbit(body).state_at(ut)
+        parent_position, parent_velocity = self._absolute_state(
+            self.bodies[body.parent], ut
+        )
+        return position + parent_position, velocity + parent_velocity
+
+    def body_state(self, body: BodySpec, ut: float = None):
+        """position and velocity of body relative to the simulated body"""
+        ut = self.ut if ut is None else ut
+        position, velocity = self._absolute_state(body, ut)
+        origin, origin_velocity = self._absolute_state(self.body, ut)
+        return position - origin, velocity - origin_velocity
+
+    def latlon(self, position: np.ndarray, body: BodySpec = None):
+        """latitude and longitude in degree of a position above body"""
+        body = body or self.body
+        body_position = self.body_axes(body) @ position
+        r = np.linalg.norm(body_position)
+        latitude = math.degrees(math.asin(body_position[1] / r))
+        longitude = math.degrees(math.atan2(body_position[2], body_position[0]))
+        return latitude, longitude
+
+    def surface_position(
+        self, latitude: float, longitude: float, body: BodySpec = None
+    ) -> np.ndarray:
+        """position of a surface point in the non-rotating frame of body"""
+        body = body or self.body
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+        radius = body.equatorial_radius + body.surface_height(
+            latitude, longitude
+        )
+        body_position = radius * np.array(
+            (
+                math.cos(lat) * math.cos(lon),
+                math.sin(lat),
+                math.cos(lat) * math.sin(lon),
+            )
+        )
+        return self.body_axes(body).T @ body_position
+
+    def surface_velocity_at(self, position: np.ndarray) -> np.ndarray:
+        """velocity of the rotating surface frame at position"""
+        return self.body.rotational_speed * np.array(
+            (-position[2], 0.0, position[0])
+        )
+
+    # vessel state
+
+    @property
+    def up(self) -> np.ndarray:
+        return _unit(self.position)
+
+    @property
+    def north(self) -> np.ndarray:
+        up = self.up
+        north = NORTH - up * np.dot(NORTH, up)
+        if np.linalg.norm(north) < 1e-9:
+            return np.array((1.0, 0.0, 0.0))
+        return _unit(north)
+
+    @property
+    def east(self) -> np.ndarray:
+        return _unit(np.array((-self.position[2], 0.0, self.position[0])))
+
+    @property
+    def surface_velocity(self) -> np.ndarray:
+        return self.velocity - self.surface_velocity_at(self.position)
+
+    @property
+    def mean_altitude(self) -> float:
+        return np.linalg.norm(self.position) - self.body.equatorial_radius
+
+    @property
+    def terrain_height(self) -> float:
+        return self.body.surface_height(*self.latlon(self.position))
+
+    @property
+    def surface_altitude(self) -> float:
+        return self.mean_altitude - self.terrain_height
+
+    @property
+    def lower_bound(self) -> float:
+        """lowest point of the vessel along up, relative to its center"""
+        cos_up = abs(np.dot(self.direction, self.up))
+        sin_up = math.sqrt(max(0.0, 1 - cos_up * cos_up))
+        return -(
+            self.design.height / 2 * cos_up + self.design.width / 2 * sin_up
+        )
+
+    @property
+    def active_stages(self) -> List[StageState]:
+        return [s for s in self.stages if not s.decoupled]
+
+    @property
+    def mass(self) -> float:
+        return sum(s.mass for s in self.active_stages)
+
+    def _burning_stages(self) -> List[StageState]:
+        return [
+            s
+            for s in self.active_stages
+            if s.spec.thrust > 0
+            and self.current_stage <= s.spec.activate_stage
+            and s.has_fuel
+        ]
+
+    @property
+    def available_thrust(self) -> float:
+        return sum(s.spec.thrust for s in self._burning_stages())
+
+    @property
+    def specific_impulse(self) -> float:
+        stages = self._burning_stages()
+        flow = sum(s.spec.thrust / s.spec.specific_impulse for s in stages)
+        if flow == 0:
+            return 0.0
+        return sum(s.spec.thrust for s in stages) / flow
+
+    def _thrust(self) -> Tuple[float, List[Tuple[StageState, float]]]:
+        """current thrust, and propellant mass flow of each stage"""
+        thrust = 0.0
+        flows = []
+        for stage in self._burning_stages():
+            throttle = 1.0 if stage.is_solid else self.throttle
+            stage_thrust = stage.spec.thrust * throttle
+            if stage_thrust > 0:
+                thrust += stage_thrust
+                flows.append(
+                    (stage, stage_thrust / (stage.spec.specific_impulse * G0))
+                )
+        return thrust, flows
+
+    @property
+    def thrust(self) -> float:
+        return self._thrust()[0]
+
+    def kepler_orbit(self) -> KeplerOrbit:
+        """orbit of the vessel at the current state"""
+        if self._rails_orbit is not None:
+            return self._rails_orbit
+        return KeplerOrbit.from_state_vectors(
+            self.body.gravitational_parameter,
+            self.position,
+            self.velocity,
+            self.ut,
+        )
+
+    @property
+    def situation(self) -> str:
+        if self.landed:
+            return "pre_launch" if self.pre_launch else "landed"
+        if self.mean_altitude < self.body.atmosphere_depth:
+            return "flying"
+        orbit = self.kepler_orbit()
+        if orbit.is_hyperbolic:
+            return "escaping"
+        if orbit.periapsis < (
+            self.body.equatorial_radius + self.body.atmosphere_depth
+        ):
+            return "sub_orbital"
+        return "orbiting"
+
+    # attitude
+
+    def pitch_heading_direction(self, pitch: float, heading: float):
+        p = math.radians(pitch)
+        h = math.radians(heading)
+        return _unit(
+            self.up * math.sin(p)
+            + math.cos(p) * (self.north * math.cos(h) + self.east * math.sin(h))
+        )
+
+    def _sas_target(self) -> Optional[np.ndarray]:
+        mode = self.sas_mode
+        if mode in ("prograde", "retrograde"):
+            if self.speed_mode == "surface":
+                velocity = self.surface_velocity
+            else:
+                velocity = self.velocity
+            if np.linalg.norm(velocity) < 1e-3:
+                return None
+            sign = 1 if mode == "prograde" else -1
+            return sign * _unit(velocity)
+        if mode in ("radial", "anti_radial"):
+            sign = 1 if mode == "radial" else -1
+            if self.speed_mode == "surface":
+                return sign * self.up
+            prograde = _unit(self.velocity)
+            return sign * _unit(self.up - prograde * np.dot(self.up, prograde))
+        if mode in ("normal", "anti_normal"):
+            sign = 1 if mode == "normal" else -1
+            prograde = _unit(self.velocity)
+            radial = _unit(self.up - prograde * np.dot(self.up, prograde))
+            return sign * _unit(np.cross(prograde, radial))
+        if mode == "maneuver":
+            nodes = [n for n in self.nodes if not n.removed]
+            if nodes and np.linalg.norm(nodes[0].remaining_vector) > 0:
+                return _unit(nodes[0].remaining_vector)
+        return None
+
+    def target_direction(self) -> Optional[np.ndarray]:
+        """direction the attitude control steers to, None to hold"""
+        if self.autopilot_engaged and self.autopilot_target:
+            kind = self.autopilot_target[0]
+            if kind == "pitch_heading":
+                return self.pitch_heading_direction(*self.autopilot_target[1:])
+            if kind == "direction":
+                vector, transform = self.autopilot_target[1:]
+                return _unit(transform().from_direction(vector))
+        if self.sas:
+            return self._sas_target()
+        return None
+
+    def pointing_error(self) -> float:
+        """angle between direction and target direction in degree"""
+        target = self.target_direction()
+        if target is None:
+            return 0.0
+        cos_angle = np.clip(np.dot(self.direction, target), -1.0, 1.0)
+        return math.degrees(math.acos(cos_angle))
+
+    # nodes
+
+    def add_node(
+        self, ut: float, prograde: float, normal: float, radial: float
+    ) -> NodeState:
+        node = NodeState(ut, prograde, normal, radial)
+        self.update_node(node)
+        self.nodes.append(node)
+        return node
+
+    def update_node(self, node: NodeState):
+        frames = orbital_frames(self.kepler_orbit(), node.ut)
+        node.burn_vector = (
+            node.prograde * frames.prograde
+            + node.normal * frames.normal
+            + node.radial * frames.anti_radial
+        )
+
+    def node_axes(self, node: NodeState) -> np.ndarray:
+        burn = node.remaining_vector
+        if np.linalg.norm(burn) < 1e-9:
+            burn = node.burn_vector
+        if np.linalg.norm(burn) < 1e-9:
+            burn = self.velocity
+        return _axes_from_forward(burn, self.up)
+
+    # staging
+
+    def activate_next_stage(self):
+        if self.current_stage <= 0:
+            return
+        self.current_stage -= 1
+        for stage in self.stages:
+            if stage.spec.decouple_stage >= self.current_stage:
+                stage.decoupled = True
+        self.pre_launch = False
+
+    # integration
+
+    def _acceleration(
+        self,
+        position: np.ndarray,
+        velocity: np.ndarray,
+        thrust_acceleration: np.ndarray,
+        mass: float,
+    ) -> np.ndarray:
+        r = np.linalg.norm(position)
+        acceleration = (
+            -self.body.gravitational_parameter * position / r ** 3
+            + thrust_acceleration
+        )
+        altitude = r - self.body.equatorial_radius
+        density = self.body.density_at(altitude)
+        if density > 0:
+            air_velocity = velocity - self.surface_velocity_at(position)
+            acceleration -= (
+                0.5
+                * density
+                * np.linalg.norm(air_velocity)
+                * air_velocity
+                * self.design.drag_area
+                / mass
+            )
+        return acceleration
+
+    def _on_rails(self, thrust: float) -> bool:
+        return (
+            thrust == 0
+            and not self.landed
+            and self.mean_altitude > self.body.atmosphere_depth
+        )
+
+    def step(self, dt: float):
+        """Advance the simulation by dt seconds"""
+        with self.lock:
+            target = self.target_direction()
+            if target is not None:
+                self.direction = _slerp(
+                    self.direction, target, self.design.turn_rate * dt
+                )
+
+            thrust, flows = self._thrust()
+            mass = self.mass
+
+            if self.landed:
+                if thrust / mass > self.body.surface_gravity * 1.01 and (
+                    np.dot(self.direction, self.up) > 0
+                ):
+                    self.landed = False
+                    self.pre_launch = False
+                    self._surface_position = None
+                else:
+                    self.ut += dt
+                    self._burn(flows, dt)
+                    self._follow_surface()
+                    return
+
+            if self._on_rails(thrust):
+                if self._rails_orbit is None:
+                    self._rails_orbit = self.kepler_orbit()
+                self.ut += dt
+                self.position, self.velocity = self._rails_orbit.state_at(
+                    self.ut
+                )
+            else:
+                self._rails_orbit = None
+                thrust_acceleration = self.direction * thrust / mass
+                self._integrate(thrust_acceleration, mass, dt)
+                self.ut += dt
+                for node in self.nodes:
+                    node.applied = node.applied + thrust_acceleration * dt
+                self._burn(flows, dt)
+
+            self._check_ground()
+
+    def _integrate(self, thrust_acceleration, mass: float, dt: float):
+        p = self.position
+        v = self.velocity
+
+        def derivative(position, velocity):
+            return velocity, self._acceleration(
+                position, velocity, thrust_acceleration, mass
+            )
+
+        k1p, k1v = derivative(p, v)
+        k2p, k2v = derivative(p + k1p * dt / 2, v + k1v * dt / 2)
+        k3p, k3v = derivative(p + k2p * dt / 2, v + k2v * dt / 2)
+        k4p, k4v = derivative(p + k3p * dt, v + k3v * dt)
+        self.position = p + (k1p + 2 * k2p + 2 * k3p + k4p) * dt / 6
+        self.velocity = v + (k1v + 2 * k2v + 2 * k3v + k4v) * dt / 6
+
+    def _burn(self, flows, dt: float):
+        for stage, flow in flows:
+            stage.burn(flow * dt)
+
+    def _check_ground(self):
+        if self.surface_altitude + self.lower_bound > 0:
+            return
+        self.touchdown_speed = float(np.linalg.norm(self.surface_velocity))
+        legs_down = not self.legs_deployed or all(self.legs_deployed)
+        self.crashed = (
+            self.touchdown_speed > self.design.crash_speed or not legs_down
+        )
+        self._land()
+
+    def _land(self):
+        self.landed = True
+        self._rails_orbit = None
+        radius = (
+            self.body.equatorial_radius + self.terrain_height - self.lower_bound
+        )
+        self.position = self.up * radius
+        self._surface_position = self.body_axes() @ self.position
+        self.velocity = self.surface_velocity_at(self.position)
+
+    def _follow_surface(self):
+        self.position = self.body_axes().T @ self._surface_position
+        self.velocity = self.surface_velocity_at(self.position)
+
+    def _rails_step(self, remaining: float) -> float:
+        """longest step on rails that cannot skip over the ground"""
+        orbit = self._rails_orbit or self.kepler_orbit()
+        clearance = (
+            self.body.equatorial_radius + 2.5 * self.body.terrain_amplitude
+        )
+        if orbit.periapsis > clearance:
+            return remaining
+        speed = max(1.0, np.linalg.norm(self.velocity))
+        margin = self.surface_altitude + self.lower_bound
+        return max(self.physics_step, min(remaining, 0.5 * margin / speed))
+
+    def advance(self, ut: float, max_steps: Optional[int] = None) -> float:
+        """Advance the simulation to ut
+
+        On rails the vessel is moved in long steps, otherwise in physics
+        steps.
+
+        Args:
+            ut: universal time to advance to
+            max_steps: max number of physics steps, None for no limit
+
+        Returns:
+            return ut reached
+        """
+        steps = 0
+        with self.lock:
+            while self.ut < ut - 1e-9:
+                remaining = ut - self.ut
+                if self._on_rails(self.thrust):
+                    dt = self._rails_step(remaining)
+                else:
+                    dt = min(self.physics_step, remaining)
+                    steps += 1
+                self.step(dt)
+                if max_steps is not None and steps >= max_steps:
+                    break
+            return self.ut
+
+    # frames
+
+    def body_transform(self, body: BodySpec, rotating: bool) -> Transform:
+        position, velocity = self.body_state(body)
+        if rotating:
+            return Transform(
+                position, self.body_axes(body), velocity, body.rotational_speed
+            )
+        return Transform(position, np.eye(3), velocity)
+
+    def surface_transform(self) -> Transform:
+        axes = np.array((self.up, self.north, self.east))
+        return Transform(
+            self.position, axes, self.velocity, self.body.rotational_speed
+        )
+
+    def surface_velocity_transform(self) -> Transform:
+        velocity = self.surface_velocity
+        if np.linalg.norm(velocity) < 1e-6:
+            velocity = self.north
+        axes = _axes_from_forward(velocity, self.up)
+        return Transform(self.position, axes, self.velocity)
+
+    def vessel_transform(self) -> Transform:
+        axes = _axes_from_forward(self.direction, self.up)
+        return Transform(self.position, axes, self.velocity)
+
+    def node_transform(self, node: NodeState) -> Transform:
+        return Transform(self.position, self.node_axes(node), self.velocity)
@@ -0,0 +1,130 @@
+import inspect
+from typing import Any, Callable, Dict, Tuple
+
+
+# handlers of every remote procedure, by (service, procedure name)
+PROCEDURES: Dict[Tuple[str, str], Callable] = {}
+
+
+class RemoteObject(object):
+    """Base of simulated kRPC remote objects
+
+    Attributes declared with remote_property and methods declared with
+    remote_method are remote procedures: calling them goes through
+    client._invoke, which applies the latency model and which RPC counters
+    and profilers wrap, as with the kRPC client.
+    """
+
+    _service = "SpaceCenter"
+
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    def _sim(self):
+        return self._client.sim
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash((type(self), self._key()))
+
+    def _key(self) -> Any:
+        return id(self)
+
+
+def blocking(func: Callable) -> Callable:
+    """Mark a procedure that waits for the simulation
+
+    The client runs blocking procedures without holding the simulation lock,
+    so that the simulation keeps running while they wait.
+    """
+    func.blocking = True
+    return func
+
+
+def _procedure_name(owner: type, kind: str, name: str) -> str:
+    if kind:
+        return f"{owner.__name__}_{kind}_{name}"
+    return f"{owner.__name__}_{name}"
+
+
+class remote_property(object):
+    """Property of a remote object, read and written through RPCs"""
+
+    def __init__(self, fget: Callable, fset: Callable = None):
+        self.fget = fget
+        self.fset = fset
+        self.__doc__ = fget.__doc__
+
+    def __set_name__(self, owner: type, name: str):
+        self.service = owner._service
+        self.getter = _procedure_name(owner, "get", name)
+        PROCEDURES[(self.service, self.getter)] = self.fget
+        if self.fset:
+            self.setter_name = _procedure_name(owner, "set", name)
+            PROCEDURES[(self.service, self.setter_name)] = self.fset
+
+    def setter(self, fset: Callable) -> "remote_property":
+        return remote_property(self.fget, fset)
+
+    def __get__(self, obj: RemoteObject, owner: type = None):
+        if obj is None:
+            return self
+        return obj._client._invoke(self.service, self.getter, [obj])
+
+    def __set__(self, obj: RemoteObject, value: Any):
+        if not self.fset:
+            raise AttributeError("can't set attribute")
+        obj._client._invoke(self.service, self.setter_name, [obj, value])
+
+
+class RemoteMethod(object):
+    """Method bound to a remote object, as given to add_stream/get_call"""
+
+    def __init__(self, obj: RemoteObject, method: "remote_method"):
+        self.obj = obj
+        self.method = method
+        self.__name__ = method.func.__name__
+        self.__qualname__ = method.func.__qualname__
+
+    def __eq__(self, other) -> bool:
+        return (
+            type(other) is RemoteMethod
+            and self.obj == other.obj
+            and self.method is other.method
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.obj, self.method.name))
+
+    def bind(self, *args, **kwargs) -> list:
+        """Return all arguments as a list, with defaults applied"""
+        bound = self.method.signature.bind(self.obj, *args, **kwargs)
+        bound.apply_defaults()
+        return list(bound.args)
+
+    def __call__(self, *args, **kwargs):
+        return self.obj._client._invoke(
+            self.method.service, self.method.name, self.bind(*args, **kwargs)
+        )
+
+
+class remote_method(object):
+    """Method of a remote object, called through an RPC"""
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self.signature = inspect.signature(func)
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner: type, name: str):
+        self.service = owner._service
+        self.name = _procedure_name(owner, "", name)
+        PROCEDURES[(self.service, self.name)] = self.func
+
+    def __get__(self, obj: RemoteObject, owner: type = None):
+        if obj is None:
+            return self
+        return RemoteMethod(obj, self)
@@ -0,0 +1,326 @@
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from scripts.sim.bodies import STOCK_BODIES
+from scripts.sim.client import Client, LatencyModel
+from scripts.sim.physics import Simulator, StageSpec, VesselDesign
+from scripts.sim.remote import PROCEDURES, RemoteObject
+from scripts.utils.telemetry_recorder import (
+    TIME_CHANNEL,
+    UT_CHANNEL,
+    Recording,
+    flight_channels,
+    load_recording,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# channels of flight_channels() the vessel state is rebuilt from, in the
+# body reference frame
+POSITION_CHANNEL = "Vessel.position"
+VELOCITY_CHANNEL = "Vessel.velocity"
+DIRECTION_CHANNEL = "Vessel.direction"
+SITUATION_CHANNEL = "Vessel.situation"
+
+# vessel of unknown design, recorded channels give its mass and thrust
+REPLAY_DESIGN = VesselDesign(
+    name="Replay",
+    stages=(StageSpec(activate_stage=0, decouple_stage=-1, dry_mass=1000.0),),
+)
+
+# methods sent as commands, besides property setters
+COMMAND_CLASSES = ("Control", "AutoPilot")
+COMMAND_PROCEDURES = ("Node_remove", "SpaceCenter_warp_to")
+
+
+class ReplayFinished(RuntimeError):
+    """Raised by RPCs once the end of the recording is reached"""
+
+
+class Command(NamedTuple):
+    """Command sent by a procedure during a replay"""
+
+    time: float
+    ut: float
+    procedure: str
+    args: tuple
+
+
+class ReplaySimulator(Simulator):
+    """Simulator whose vessel state is read from a recording
+
+    The vessel does not move by itself: seek() sets its position, velocity
+    and direction from a record, and recorded() gives the recorded value
+    of a channel at that record. Bodies and frames are simulated as with
+    Simulator, from STOCK_BODIES.
+    """
+
+    def __init__(
+        self,
+        recording: Recording,
+        body: str,
+        design: VesselDesign = REPLAY_DESIGN,
+    ):
+        for name in (TIME_CHANNEL, UT_CHANNEL, POSITION_CHANNEL):
+            if name not in recording.channels:
+                raise ValueError(f"recording has no {name} channel")
+        if not len(recording):
+            raise ValueError("recording is empty")
+        self.recording = recording
+        self.times = np.asarray(recording[TIME_CHANNEL])
+        self.uts = np.asarray(recording[UT_CHANNEL])
+        self.index = 0
+        self.replay_time = float(self.times[0])
+        self.finished = False
+        self._landed_situations = set()
+        situations = recording.enum_names(SITUATION_CHANNEL) or {}
+        for value, name in situations.items():
+            if name in ("pre_launch", "landed", "splashed"):
+                self._landed_situations.add(value)
+        position = recording[POSITION_CHANNEL][0]
+        super().__init__(
+            STOCK_BODIES,
+            body,
+            design,
+            position=position,
+            velocity=np.zeros(3),
+            ut=float(self.uts[0]),
+        )
+        self.seek(0)
+
+    def recorded(self, name: str) -> Any:
+        """Return the value of a channel at the current record"""
+        value = self.recording[name][self.index]
+        if np.ndim(value):
+            return tuple(float(v) for v in value)
+        return value.item()
+
+    def seek(self, index: int):
+        """Set the vessel state from the record at index"""
+        with self.lock:
+            self.index = index
+            self.ut = float(self.uts[index])
+            axes = self.body_axes()
+            position = np.asarray(self.recording[POSITION_CHANNEL][index])
+            self.position = axes.T @ position
+            if VELOCITY_CHANNEL in self.recording.channels:
+                velocity = self.recording[VELOCITY_CHANNEL][index]
+                self.velocity = axes.T @ velocity + self.surface_velocity_at(
+                    self.position
+                )
+            if DIRECTION_CHANNEL in self.recording.channels:
+                self.direction = (
+                    axes.T @ self.recording[DIRECTION_CHANNEL][index]
+                )
+            if SITUATION_CHANNEL in self.recording.channels:
+                situation = int(self.recording[SITUATION_CHANNEL][index])
+                self.landed = situation in self._landed_situations
+                self._surface_position = position if self.landed else None
+
+    def seek_time(self, replay_time: float):
+        """Seek to the last record at or before replay_time"""
+        with self.lock:
+            self.replay_time = replay_time
+            if replay_time > self.times[-1]:
+                self.finished = True
+            index = int(np.searchsorted(self.times, replay_time, "right")) - 1
+            self.seek(min(max(index, 0), len(self.times) - 1))
+
+    def step(self, dt: float):
+        pass
+
+    def advance(self, ut: float, max_steps: Optional[int] = None) -> float:
+        """Skip to the first record at or after ut, as warping
+
+        Returns:
+            return ut reached
+        """
+        with self.lock:
+            index = int(np.searchsorted(self.uts, ut, "left"))
+            if index >= len(self.uts):
+                self.finished = True
+                index = len(self.uts) - 1
+            self.replay_time = float(self.times[index])
+            self.seek(index)
+            return self.ut
+
+
+class ReplayClient(Client):
+    """Client serving recorded telemetry to procedures
+
+    Replays a TelemetryRecorder recording at speed times its original pace,
+    for procedures written against krpc.client.Client. Properties recorded
+    as a "<class>.<attribute>" channel, streamed or read with an RPC, give
+    the recorded value when read on the object flight_channels() records
+    them on: the active vessel, its orbit and control, and its flight in
+    the hybrid frame of flight_channels(). The same properties of any other
+    object (e.g. a flight in another frame, or the orbit of a body) and
+    everything else are computed by ReplaySimulator from the recorded
+    vessel state, so flight_channels() recordings are enough to rerun
+    vertical_landing, launch_into_orbit or execute_next_node.
+
+    The replay is open loop: commands sent by the procedure are accepted,
+    logged into commands and have no effect on the recorded flight.
+    SpaceCenter.warp_to skips ahead in the recording, AutoPilot.wait
+    returns at once. Once past the last record, every RPC raises
+    ReplayFinished, event waits return and finished is set.
+
+    Usage:
+        with ReplayClient("logs/landing", speed=4.0) as conn:
+            try:
+                vertical_landing(conn)
+            except ReplayFinished:
+                pass
+            print(conn.commands[-1])
+
+    Attributes:
+        recording: replayed recording
+        speed: replay speed relative to the recording
+        commands: commands sent, in order
+        finished: set at the end of the recording
+    """
+
+    def __init__(
+        self,
+        recording: Union[str, Recording],
+        body: Optional[str] = None,
+        speed: float = 1.0,
+        start: float = 0.0,
+        latency: LatencyModel = LatencyModel(),
+        tick: float = 0.01,
+    ):
+        """
+        Args:
+            recording: Recording, or its directory
+            body: name of the body orbited, from the recording metadata if
+                None
+            speed: replay speed relative to the recording
+            start: seconds into the recording to start at
+            latency: RPC latency model
+            tick: replay thread period in seconds
+        """
+        if isinstance(recording, str):
+            recording = load_recording(recording)
+        if body is None:
+            body = recording.index.get("metadata", {}).get("body")
+            if body is None:
+                raise ValueError("recording has no body, pass it explicitly")
+        self.recording = recording
+        self.speed = speed
+        self.commands: List[Command] = []
+        self.finished = threading.Event()
+        self._getters: Dict[str, Tuple[str, RemoteObject]] = {}
+        self._handlers: Dict[str, Callable] = {}
+        sim = ReplaySimulator(recording, body)
+        sim.seek_time(sim.replay_time + start)
+        super().__init__(sim, latency, time_scale=speed, tick=tick)
+
+        receivers = self._recorded_receivers()
+        for name in recording.channels:
+            class_name, _, attribute = name.partition(".")
+            procedure = f"{class_name}_get_{attribute}"
+            if ("SpaceCenter", procedure) in PROCEDURES:
+                if class_name in receivers:
+                    self._getters[procedure] = (name, receivers[class_name])
+
+    def _recorded_receivers(self) -> Dict[str, RemoteObject]:
+        """Return objects recorded by flight_channels(), by class name"""
+        receivers = {"SpaceCenter": self.space_center}
+        for spec in flight_channels(self).values():
+            if spec[0] is getattr:
+                receivers[type(spec[1]).__name__] = spec[1]
+        return receivers
+
+    def _invoke(
+        self,
+        service: str,
+        procedure: str,
+        args: Optional[list] = None,
+        *rest,
+    ) -> Any:
+        if self.sim.finished:
+            raise ReplayFinished(f"{procedure}: end of recording")
+        class_name = procedure.partition("_")[0]
+        if "_set_" in procedure or (
+            "_get_" not in procedure
+            and (
+                class_name in COMMAND_CLASSES or procedure in COMMAND_PROCEDURES
+            )
+        ):
+            command = Command(
+                self.sim.replay_time,
+                self.sim.ut,
+                procedure,
+                tuple((args or [])[1:]),
+            )
+            logger.debug("%s", command)
+            self.commands.append(command)
+        return super()._invoke(service, procedure, args, *rest)
+
+    def _handler(self, service: str, procedure: str) -> Callable:
+        if procedure == "AutoPilot_wait":
+            return _ignore
+        recorded = (
+            self._getters.get(procedure) if service == "SpaceCenter" else None
+        )
+        if recorded is None:
+            return super()._handler(service, procedure)
+        handler = self._handlers.get(procedure)
+        if handler is None:
+            handler = self._recorded_getter(
+                *recorded, super()._handler(service, procedure)
+            )
+            self._handlers[procedure] = handler
+        return handler
+
+    def _recorded_getter(
+        self, name: str, receiver: RemoteObject, getter: Callable
+    ) -> Callable:
+        names = self.recording.enum_names(name)
+        enum_types = []
+
+        def handler(obj):
+            if obj != receiver:
+                # not the recorded object or frame, simulate it
+                return getter(obj)
+            value = self.sim.recorded(name)
+            if names is None:
+                return value
+            if not enum_types:
+                enum_types.append(type(getter(obj)))
+            return enum_types[0][names[value]]
+
+        return handler
+
+    def _run_simulation(self):
+        last = time.monotonic()
+        while not self._closed.wait(self.tick):
+            now = time.monotonic()
+            self.sim.seek_time(self.sim.replay_time + (now - last) * self.speed)
+            last = now
+            self.update_streams()
+            if self.sim.finished:
+                self.finished.set()
+                # wake procedures waiting for events the recording never
+                # fires, their next RPC raises ReplayFinished
+                for event in list(self._events):
+                    with event.condition:
+                        event.condition.notify_all()
+                return
+
+
+def _ignore(*args):
+    return None
@@ -0,0 +1,193 @@
+import math
+from typing import Callable, Dict
+
+import numpy as np
+from scripts.sim.bodies import STOCK_BODIES
+from scripts.sim.client import Client, LatencyModel
+from scripts.sim.physics import Simulator, StageSpec, VesselDesign
+
+
+LANDER = VesselDesign(
+    name="Sim Lander",
+    stages=(
+        StageSpec(
+            activate_stage=0,
+            decouple_stage=-1,
+            dry_mass=1500.0,
+            thrust=60000.0,
+            specific_impulse=345.0,
+            liquid_fuel=180.0,
+            oxidizer=220.0,
+        ),
+    ),
+    height=3.0,
+    width=3.0,
+    drag_area=4.0,
+    legs=4,
+    solar_panels=2,
+)
+
+ROCKET = VesselDesign(
+    name="Sim Rocket",
+    stages=(
+        StageSpec(
+            activate_stage=2,
+            decouple_stage=1,
+            dry_mass=4000.0,
+            thrust=650000.0,
+            specific_impulse=300.0,
+            liquid_fuel=1440.0,
+            oxidizer=1760.0,
+        ),
+        StageSpec(
+            activate_stage=1,
+            decouple_stage=0,
+            dry_mass=1500.0,
+            thrust=60000.0,
+            specific_impulse=345.0,
+            liquid_fuel=360.0,
+            oxidizer=440.0,
+        ),
+        StageSpec(activate_stage=0, decouple_stage=-1, dry_mass=1000.0),
+    ),
+    height=20.0,
+    drag_area=2.0,
+    solar_panels=2,
+)
+
+# upper stage and payload of ROCKET, as left in orbit
+ORBITER = ROCKET._replace(name="Sim Orbiter", stages=ROCKET.stages[1:])
+
+
+def _orbiting(
+    body: str,
+    altitude: float,
+    design: VesselDesign,
+    apoapsis_altitude: float = None,
+    **kwargs,
+):
+    """Simulator with the vessel at periapsis of an equatorial orbit
+
+    The orbit is circular when apoapsis_altitude is None.
+    """
+    spec = STOCK_BODIES[body]
+    radius = spec.equatorial_radius + altitude
+    if apoapsis_altitude is None:
+        semi_major_axis = radius
+    else:
+        semi_major_axis = (
+            radius + spec.equatorial_radius + apoapsis_altitude
+        ) / 2
+    speed = math.sqrt(
+        spec.gravitational_parameter * (2 / radius - 1 / semi_major_axis)
+    )
+    return Simulator(
+        STOCK_BODIES,
+        body,
+        design,
+        position=(radius, 0.0, 0.0),
+        velocity=(0.0, 0.0, speed),
+        direction=(0.0, 0.0, 1.0),
+        **kwargs,
+    )
+
+
+def _landed(body: str, latitude: float, longitude: float, design: VesselDesign):
+    """Simulator with the vessel landed, pointing up"""
+    spec = STOCK_BODIES[body]
+    probe = Simulator(
+        STOCK_BODIES, body, design, (spec.equatorial_radius, 0.0, 0.0), 0.0
+    )
+    position = probe.surface_position(latitude, longitude)
+    return Simulator(
+        STOCK_BODIES,
+        body,
+        design,
+        position=position,
+        velocity=np.zeros(3),
+        landed=True,
+    )
+
+
+def kerbin_launchpad() -> Simulator:
+    """ROCKET on the launch pad, before the first stage"""
+    return _landed("Kerbin", -0.0972, -74.5577, ROCKET)
+
+
+def kerbin_orbit() -> Simulator:
+    """ORBITER in a 100 km orbit of Kerbin, engine active"""
+    return _orbiting("Kerbin", 100000.0, ORBITER, current_stage=1)
+
+
+def kerbin_elliptic_orbit() -> Simulator:
+    """ORBITER at periapsis of a 100 km x 250 km orbit of Kerbin"""
+    return _orbiting(
+        "Kerbin", 100000.0, ORBITER, apoapsis_altitude=250000.0, current_stage=1
+    )
+
+
+def mun_orbit() -> Simulator:
+    """LANDER in a 30 km orbit of the Mun, engine active"""
+    return _orbiting("Mun", 30000.0, LANDER, current_stage=0)
+
+
+def mun_descent() -> Simulator:
+    """LANDER at 8 km above the Mun, falling on a suborbital trajectory"""
+    spec = STOCK_BODIES["Mun"]
+    radius = spec.equatorial_radius + 8000.0
+    return Simulator(
+        STOCK_BODIES,
+        "Mun",
+        LANDER,
+        position=(radius, 0.0, 0.0),
+        velocity=(-60.0, 0.0, 250.0),
+        direction=(0.0, 0.0, -1.0),
+        current_stage=0,
+    )
+
+
+def kerbin_reentry() -> Simulator:
+    """LANDER at 30 km above Kerbin, falling through the atmosphere"""
+    spec = STOCK_BODIES["Kerbin"]
+    radius = spec.equatorial_radius + 30000.0
+    return Simulator(
+        STOCK_BODIES,
+        "Kerbin",
+        LANDER,
+        position=(radius, 0.0, 0.0),
+        velocity=(-150.0, 0.0, 1400.0),
+        direction=(0.0, 0.0, -1.0),
+        current_stage=0,
+    )
+
+
+SCENARIOS: Dict[str, Callable[[], Simulator]] = {
+    "kerbin_launchpad": kerbin_launchpad,
+    "kerbin_orbit": kerbin_orbit,
+    "kerbin_elliptic_orbit": kerbin_elliptic_orbit,
+    "mun_orbit": mun_orbit,
+    "mun_descent": mun_descent,
+    "kerbin_reentry": kerbin_reentry,
+}
+
+
+def connect(
+    name: str = None,
+    scenario: str = "mun_orbit",
+    latency: LatencyModel = LatencyModel(),
+    time_scale: float = 1.0,
+    **kwargs,
+) -> Client:
+    """Connect to a simulated scenario, in place of krpc.connect
+
+    Args:
+        name: client name, ignored
+        scenario: key of SCENARIOS
+        latency: RPC latency model
+        time_scale: simulation speed relative to real time
+        kwargs: krpc.connect address and ports, ignored
+
+    Returns:
+        return Client
+    """
+    return Client(SCENARIOS[scenario](), latency, time_scale)
@@ -0,0 +1,1246 @@
+import math
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scripts.sim.bodies import BodySpec
+from scripts.sim.physics import NodeState, StageState, Transform
+from scripts.sim.remote import (
+    RemoteObject,
+    blocking,
+    remote_method,
+    remote_property,
+)
+from scripts.utils.kepler import KeplerOrbit
+
+
+# rails warp rate of each rails_warp_factor
+RAILS_WARP_RATES = (1, 5, 10, 50, 100, 1000, 10000, 100000)
+
+
+class VesselSituation(Enum):
+    pre_launch = 0
+    orbiting = 1
+    sub_orbital = 2
+    escaping = 3
+    flying = 4
+    landed = 5
+    splashed = 6
+    docked = 7
+
+
+class SASMode(Enum):
+    stability_assist = 0
+    maneuver = 1
+    prograde = 2
+    retrograde = 3
+    normal = 4
+    anti_normal = 5
+    radial = 6
+    anti_radial = 7
+    target = 8
+    anti_target = 9
+
+
+class SpeedMode(Enum):
+    orbit = 0
+    surface = 1
+    target = 2
+
+
+class GameMode(Enum):
+    sandbox = 0
+    career = 1
+    science = 2
+
+
+class ReferenceFrame(RemoteObject):
+    """Reference frame, evaluated against the simulation when used"""
+
+    def __init__(self, client, key: tuple, transform: Callable[[], Transform]):
+        super().__init__(client)
+        self._frame_key = key
+        self.transform = transform
+
+    def _key(self):
+        return self._frame_key
+
+
+class ReferenceFrameStatics(RemoteObject):
+    """Static methods of ReferenceFrame, as space_center.ReferenceFrame"""
+
+    @remote_method
+    def create_hybrid(
+        self,
+        position: ReferenceFrame,
+        rotation: ReferenceFrame = None,
+        velocity: ReferenceFrame = None,
+        angular_velocity: ReferenceFrame = None,
+    ) -> ReferenceFrame:
+        rotation = rotation or position
+        velocity = velocity or position
+        angular_velocity = angular_velocity or rotation
+
+        def transform() -> Transform:
+            return Transform(
+                position.transform().origin,
+                rotation.transform().axes,
+                velocity.transform().origin_velocity,
+                angular_velocity.transform().angular_speed,
+            )
+
+        key = (
+            "hybrid",
+            position._key(),
+            rotation._key(),
+            velocity._key(),
+            angular_velocity._key(),
+        )
+        return ReferenceFrame(self._client, key, transform)
+
+
+def _to_tuple(vector: np.ndarray) -> Tuple[float, float, float]:
+    return tuple(float(x) for x in vector)
+
+
+class CelestialBody(RemoteObject):
+    def __init__(self, client, spec: BodySpec):
+        super().__init__(client)
+        self.spec = spec
+
+    def _key(self):
+        return self.spec.name
+
+    def _transform(self, rotating: bool) -> Transform:
+        return self._sim.body_transform(self.spec, rotating)
+
+    @remote_property
+    def name(self) -> str:
+        return self.spec.name
+
+    @remote_property
+    def gravitational_parameter(self) -> float:
+        return self.spec.gravitational_parameter
+
+    @remote_property
+    def equatorial_radius(self) -> float:
+        return self.spec.equatorial_radius
+
+    @remote_property
+    def surface_gravity(self) -> float:
+        return self.spec.surface_gravity
+
+    @remote_property
+    def rotational_period(self) -> float:
+        return self.spec.rotational_period
+
+    @remote_property
+    def rotational_speed(self) -> float:
+        return self.spec.rotational_speed
+
+    @remote_property
+    def initial_rotation(self) -> float:
+        return self.spec.initial_rotation
+
+    @remote_property
+    def rotation_angle(self) -> float:
+        return self._sim.rotation_angle(self.spec)
+
+    @remote_property
+    def sphere_of_influence(self) -> float:
+        return self.spec.sphere_of_influence
+
+    @remote_property
+    def has_atmosphere(self) -> bool:
+        return self.spec.has_atmosphere
+
+    @remote_property
+    def atmosphere_depth(self) -> float:
+        return self.spec.atmosphere_depth
+
+    @remote_property
+    def orbit(self) -> Optional["Orbit"]:
+        if self.spec.parent is None:
+            return None
+        return Orbit(self._client, self)
+
+    @remote_property
+    def satellites(self) -> List["CelestialBody"]:
+        return [
+            self._client.space_center._body(b.name)
+            for b in self._sim.bodies.values()
+            if b.parent == self.spec.name
+        ]
+
+    @remote_property
+    def reference_frame(self) -> ReferenceFrame:
+        return ReferenceFrame(
+            self._client,
+            ("body", self.spec.name),
+            lambda: self._transform(True),
+        )
+
+    @remote_property
+    def non_rotating_reference_frame(self) -> ReferenceFrame:
+        return ReferenceFrame(
+            self._client,
+            ("body_non_rotating", self.spec.name),
+            lambda: self._transform(False),
+        )
+
+    @remote_method
+    def surface_height(self, latitude: float, longitude: float) -> float:
+        return self.spec.surface_height(latitude, longitude)
+
+    @remote_method
+    def bedrock_height(self, latitude: float, longitude: float) -> float:
+        return self.spec.surface_height(latitude, longitude)
+
+    @remote_method
+    def surface_position(
+        self, latitude: float, longitude: float, reference_frame: ReferenceFrame
+    ):
+        body_transform = self._transform(False)
+        position = body_transform.from_position(
+            self._sim.surface_position(latitude, longitude, self.spec)
+        )
+        return _to_tuple(reference_frame.transform().position(position))
+
+    @remote_method
+    def position(self, reference_frame: ReferenceFrame):
+        origin = self._transform(False).origin
+        return _to_tuple(reference_frame.transform().position(origin))
+
+    @remote_method
+    def velocity(self, reference_frame: ReferenceFrame):
+        transform = self._transform(False)
+        return _to_tuple(
+            reference_frame.transform().velocity(
+                transform.origin, transform.origin_velocity
+            )
+        )
+
+    @remote_method
+    def density_at(self, altitude: float) -> float:
+        return self.spec.density_at(altitude)
+
+    @remote_method
+    def latitude_at_position(self, position, reference_frame: ReferenceFrame):
+        return self._latlon(position, reference_frame)[0]
+
+    @remote_method
+    def longitude_at_position(self, position, reference_frame: ReferenceFrame):
+        return self._latlon(position, reference_frame)[1]
+
+    @remote_method
+    def altitude_at_position(self, position, reference_frame: ReferenceFrame):
+        relative = self._relative_position(position, reference_frame)
+        return float(np.linalg.norm(relative)) - self.spec.equatorial_radius
+
+    def _relative_position(self, position, reference_frame: ReferenceFrame):
+        sim_position = reference_frame.transform().from_position(position)
+        return sim_position - self._transform(False).origin
+
+    def _latlon(self, position, reference_frame: ReferenceFrame):
+        relative = self._relative_position(position, reference_frame)
+        return self._sim.latlon(relative, self.spec)
+
+
+class Orbit(RemoteObject):
+    """Orbit of the vessel or of a celestial body"""
+
+    def __init__(self, client, owner: RemoteObject):
+        super().__init__(client)
+        self._owner = owner
+
+    def _key(self):
+        return ("orbit", self._owner._key())
+
+    def _kepler(self) -> KeplerOrbit:
+        if isinstance(self._owner, CelestialBody):
+            return self._sim.body_kepler_orbit(self._owner.spec)
+        return self._sim.kepler_orbit()
+
+    def _body_spec(self) -> BodySpec:
+        if isinstance(self._owner, CelestialBody):
+            return self._sim.bodies[self._owner.spec.parent]
+        return self._sim.body
+
+    def _time_to_true_anomaly(self, true_anomaly: float) -> float:
+        return self._ut_at_true_anomaly(true_anomaly) - self._sim.ut
+
+    def _ut_at_true_anomaly(self, true_anomaly: float) -> float:
+        orbit = self._kepler()
+        e = orbit.eccentricity
+        if e < 1:
+            E = 2 * math.atan2(
+                math.sqrt(1 - e) * math.sin(true_anomaly / 2),
+                math.sqrt(1 + e) * math.cos(true_anomaly / 2),
+            )
+            M = E - e * math.sin(E)
+        else:
+            H = 2 * math.atanh(
+                math.sqrt((e - 1) / (e + 1)) * math.tan(true_anomaly / 2)
+            )
+            M = e * math.sinh(H) - H
+        dt = (M - float(orbit.mean_anomaly_at(self._sim.ut))) / (
+            orbit.mean_motion
+        )
+        if e < 1:
+            dt %= orbit.period
+        return self._sim.ut + dt
+
+    def _normal(self) -> np.ndarray:
+        orbit = self._kepler()
+        return np.cross(orbit._p_vector, orbit._q_vector)
+
+    @remote_property
+    def body(self) -> CelestialBody:
+        return self._client.space_center._body(self._body_spec().name)
+
+    @remote_property
+    def apoapsis(self) -> float:
+        return self._kepler().apoapsis
+
+    @remote_property
+    def periapsis(self) -> float:
+        return self._kepler().periapsis
+
+    @remote_property
+    def apoapsis_altitude(self) -> float:
+        return self._kepler().apoapsis - self._body_spec().equatorial_radius
+
+    @remote_property
+    def periapsis_altitude(self) -> float:
+        return self._kepler().periapsis - self._body_spec().equatorial_radius
+
+    @remote_property
+    def semi_major_axis(self) -> float:
+        return self._kepler().semi_major_axis
+
+    @remote_property
+    def eccentricity(self) -> float:
+        return self._kepler().eccentricity
+
+    @remote_property
+    def inclination(self) -> float:
+        return self._kepler().inclination
+
+    @remote_property
+    def longitude_of_ascending_node(self) -> float:
+        return self._kepler().longitude_of_ascending_node
+
+    @remote_property
+    def argument_of_periapsis(self) -> float:
+        return self._kepler().argument_of_periapsis
+
+    @remote_property
+    def mean_anomaly_at_epoch(self) -> float:
+        return self._kepler().mean_anomaly_at_epoch
+
+    @remote_property
+    def epoch(self) -> float:
+        return self._kepler().epoch
+
+    @remote_property
+    def period(self) -> float:
+        return self._kepler().period
+
+    @remote_property
+    def radius(self) -> float:
+        return float(self._kepler().radius_at(self._sim.ut))
+
+    @remote_property
+    def speed(self) -> float:
+        return float(np.linalg.norm(self._kepler().velocity_at(self._sim.ut)))
+
+    @remote_property
+    def mean_anomaly(self) -> float:
+        return self._mean_anomaly_at_ut(self._sim.ut)
+
+    @remote_property
+    def true_anomaly(self) -> float:
+        return float(self._kepler().true_anomaly_at(self._sim.ut))
+
+    @remote_property
+    def time_to_apoapsis(self) -> float:
+        if self._kepler().is_hyperbolic:
+            return math.inf
+        return self._time_to_true_anomaly(math.pi)
+
+    @remote_property
+    def time_to_periapsis(self) -> float:
+        return self._time_to_true_anomaly(0.0)
+
+    @remote_property
+    def time_to_soi_change(self) -> float:
+        return math.nan
+
+    @remote_property
+    def next_orbit(self) -> Optional["Orbit"]:
+        return None
+
+    def _mean_anomaly_at_ut(self, ut: float) -> float:
+        orbit = self._kepler()
+        mean_anomaly = float(orbit.mean_anomaly_at(ut))
+        if orbit.is_hyperbolic:
+            return mean_anomaly
+        return mean_anomaly % (2 * math.pi)
+
+    @remote_method
+    def mean_anomaly_at_ut(self, ut: float) -> float:
+        return self._mean_anomaly_at_ut(ut)
+
+    @remote_method
+    def true_anomaly_at_ut(self, ut: float) -> float:
+        return float(self._kepler().true_anomaly_at(ut))
+
+    @remote_method
+    def radius_at(self, ut: float) -> float:
+        return float(self._kepler().radius_at(ut))
+
+    @remote_method
+    def radius_at_true_anomaly(self, true_anomaly: float) -> float:
+        orbit = self._kepler()
+        return orbit.semi_latus_rectum / (
+            1 + orbit.eccentricity * math.cos(true_anomaly)
+        )
+
+    @remote_method
+    def position_at(self, ut: float, reference_frame: ReferenceFrame):
+        body_transform = self._sim.body_transform(self._body_spec(), False)
+        position = body_transform.from_position(self._kepler().position_at(ut))
+        return _to_tuple(reference_frame.transform().position(position))
+
+    @remote_method
+    def orbital_speed_at(self, time: float) -> float:
+        orbit = self._kepler()
+        r = float(orbit.radius_at(time))
+        return math.sqrt(
+            orbit.gravitational_parameter * (2 / r - 1 / orbit.semi_major_axis)
+        )
+
+    @remote_method
+    def true_anomaly_at_radius(self, radius: float) -> float:
+        orbit = self._kepler()
+        cos_nu = (orbit.semi_latus_rectum / radius - 1) / orbit.eccentricity
+        return math.acos(max(-1.0, min(1.0, cos_nu)))
+
+    @remote_method
+    def ut_at_true_anomaly(self, true_anomaly: float) -> float:
+        return self._ut_at_true_anomaly(true_anomaly)
+
+    @remote_method
+    def relative_inclination(self, target: "Orbit") -> float:
+        cos_angle = np.dot(self._normal(), target._normal())
+        return math.acos(max(-1.0, min(1.0, cos_angle)))
+
+    @remote_method
+    def true_anomaly_at_an(self, target: "Orbit") -> float:
+        orbit = self._kepler()
+        node = np.cross(target._normal(), self._normal())
+        return math.atan2(
+            np.dot(node, orbit._q_vector), np.dot(node, orbit._p_vector)
+        ) % (2 * math.pi)
+
+    @remote_method
+    def true_anomaly_at_dn(self, target: "Orbit") -> float:
+        return (self.true_anomaly_at_an.method.func(self, target) + math.pi) % (
+            2 * math.pi
+        )
+
+
+class Node(RemoteObject):
+    def __init__(self, client, state: NodeState):
+        super().__init__(client)
+        self.state = state
+
+    def _key(self):
+        return id(self.state)
+
+    def _set(self, name: str, value: float):
+        setattr(self.state, name, value)
+        self._sim.update_node(self.state)
+
+    @remote_property
+    def ut(self) -> float:
+        return self.state.ut
+
+    @ut.setter
+    def ut(self, value: float):
+        self._set("ut", value)
+
+    @remote_property
+    def prograde(self) -> float:
+        return self.state.prograde
+
+    @prograde.setter
+    def prograde(self, value: float):
+        self._set("prograde", value)
+
+    @remote_property
+    def normal(self) -> float:
+        return self.state.normal
+
+    @normal.setter
+    def normal(self, value: float):
+        self._set("normal", value)
+
+    @remote_property
+    def radial(self) -> float:
+        return self.state.radial
+
+    @radial.setter
+    def radial(self, value: float):
+        self._set("radial", value)
+
+    @remote_property
+    def delta_v(self) -> float:
+        return float(np.linalg.norm(self.state.burn_vector))
+
+    @remote_property
+    def remaining_delta_v(self) -> float:
+        return float(np.linalg.norm(self.state.remaining_vector))
+
+    @remote_property
+    def time_to(self) -> float:
+        return self.state.ut - self._sim.ut
+
+    @remote_property
+    def reference_frame(self) -> ReferenceFrame:
+        return ReferenceFrame(
+            self._client,
+            ("node", id(self.state)),
+            lambda: self._sim.node_transform(self.state),
+        )
+
+    @remote_method
+    def burn_vector(self, reference_frame: ReferenceFrame = None):
+        return self._vector(self.state.burn_vector, reference_frame)
+
+    @remote_method
+    def remaining_burn_vector(self, reference_frame: ReferenceFrame = None):
+        return self._vector(self.state.remaining_vector, reference_frame)
+
+    @remote_method
+    def direction(self, reference_frame: ReferenceFrame):
+        axes = self._sim.node_axes(self.state)
+        return _to_tuple(reference_frame.transform().direction(axes[1]))
+
+    def _vector(self, vector, reference_frame: Optional[ReferenceFrame]):
+        if reference_frame is None:
+            reference_frame = Node.reference_frame.fget(self)
+        return _to_tuple(reference_frame.transform().direction(vector))
+
+    @remote_method
+    def remove(self):
+        self.state.removed = True
+        if self.state in self._sim.nodes:
+            self._sim.nodes.remove(self.state)
+
+
+class Resources(RemoteObject):
+    def __init__(self, client, stages: Callable[[], List[StageState]]):
+        super().__init__(client)
+        self._stages = stages
+
+    def _amounts(self) -> Dict[str, float]:
+        amounts: Dict[str, float] = {}
+        for stage in self._stages():
+            for name, amount in stage.resources.items():
+                if getattr(stage.spec, _RESOURCE_FIELDS[name]) > 0:
+                    amounts[name] = amounts.get(name, 0.0) + amount
+        return amounts
+
+    @remote_property
+    def names(self) -> List[str]:
+        return sorted(self._amounts())
+
+    @remote_method
+    def has_resource(self, name: str) -> bool:
+        return name in self._amounts()
+
+    @remote_method
+    def amount(self, name: str) -> float:
+        return self._amounts().get(name, 0.0)
+
+    @remote_method
+    def max(self, name: str) -> float:
+        return sum(
+            getattr(stage.spec, _RESOURCE_FIELDS[name])
+            for stage in self._stages()
+        )
+
+
+_RESOURCE_FIELDS = {
+    "LiquidFuel": "liquid_fuel",
+    "Oxidizer": "oxidizer",
+    "SolidFuel": "solid_fuel",
+}
+
+
+class Part(RemoteObject):
+    def __init__(self, client, stage: StageState, name: str):
+        super().__init__(client)
+        self._stage = stage
+        self._name = name
+
+    def _key(self):
+        return (id(self._stage), self._name)
+
+    @remote_property
+    def name(self) -> str:
+        return self._name
+
+    @remote_property
+    def stage(self) -> int:
+        return self._stage.spec.activate_stage
+
+    @remote_property
+    def decouple_stage(self) -> int:
+        return self._stage.spec.decouple_stage
+
+    @remote_property
+    def mass(self) -> float:
+        return self._stage.mass
+
+    @remote_property
+    def dry_mass(self) -> float:
+        return self._stage.spec.dry_mass
+
+    @remote_property
+    def resources(self) -> Resources:
+        return Resources(self._client, lambda: [self._stage])
+
+
+class Engine(RemoteObject):
+    def __init__(self, client, stage: StageState):
+        super().__init__(client)
+        self._stage = stage
+
+    def _key(self):
+        return id(self._stage)
+
+    def _burning(self) -> bool:
+        return self._stage in self._sim._burning_stages()
+
+    @remote_property
+    def part(self) -> Part:
+        return Part(self._client, self._stage, "engine")
+
+    @remote_property
+    def active(self) -> bool:
+        return self._sim.current_stage <= self._stage.spec.activate_stage
+
+    @remote_property
+    def has_fuel(self) -> bool:
+        return self._stage.has_fuel
+
+    @remote_property
+    def thrust(self) -> float:
+        if not self._burning():
+            return 0.0
+        if self._stage.is_solid:
+            return self._stage.spec.thrust
+        return self._stage.spec.thrust * self._sim.throttle
+
+    @remote_property
+    def available_thrust(self) -> float:
+        return self._stage.spec.thrust if self._burning() else 0.0
+
+    @remote_property
+    def max_thrust(self) -> float:
+        return self._stage.spec.thrust
+
+    @remote_property
+    def specific_impulse(self) -> float:
+        return self._stage.spec.specific_impulse
+
+    @remote_property
+    def max_vacuum_thrust(self) -> float:
+        return self._stage.spec.thrust
+
+    @remote_property
+    def vacuum_specific_impulse(self) -> float:
+        return self._stage.spec.specific_impulse
+
+    @remote_property
+    def kerbin_sea_level_specific_impulse(self) -> float:
+        spec = self._stage.spec
+        return spec.sea_level_specific_impulse or spec.specific_impulse
+
+
+class _Deployable(RemoteObject):
+    _deployed_attribute = ""
+
+    def __init__(self, client, index: int):
+        super().__init__(client)
+        self._index = index
+
+    def _key(self):
+        return self._index
+
+    def _states(self) -> List[bool]:
+        return getattr(self._sim, self._deployed_attribute)
+
+    @remote_property
+    def deployable(self) -> bool:
+        return True
+
+    @remote_property
+    def deployed(self) -> bool:
+        return self._states()[self._index]
+
+    @deployed.setter
+    def deployed(self, value: bool):
+        self._states()[self._index] = bool(value)
+
+
+class Leg(_Deployable):
+    _deployed_attribute = "legs_deployed"
+
+    @remote_property
+    def is_grounded(self) -> bool:
+        return self._sim.landed and self._states()[self._index]
+
+
+class SolarPanel(_Deployable):
+    _deployed_attribute = "panels_deployed"
+
+
+class Radiator(_Deployable):
+    _deployed_attribute = "panels_deployed"
+
+
+class Parts(RemoteObject):
+    @remote_property
+    def all(self) -> List[Part]:
+        """one part per stage still attached"""
+        return [
+            Part(self._client, stage, f"stage {stage.spec.activate_stage}")
+            for stage in self._sim.active_stages
+        ]
+
+    @remote_property
+    def legs(self) -> List[Leg]:
+        return [Leg(self._client, i) for i in range(self._sim.design.legs)]
+
+    @remote_property
+    def solar_panels(self) -> List[SolarPanel]:
+        return [
+            SolarPanel(self._client, i)
+            for i in range(self._sim.design.solar_panels)
+        ]
+
+    @remote_property
+    def radiators(self) -> List[Radiator]:
+        offset = self._sim.design.solar_panels
+        return [
+            Radiator(self._client, offset + i)
+            for i in range(self._sim.design.radiators)
+        ]
+
+    @remote_property
+    def engines(self) -> List[Engine]:
+        return [
+            Engine(self._client, stage)
+            for stage in self._sim.active_stages
+            if stage.spec.thrust > 0
+        ]
+
+    @remote_property
+    def parachutes(self) -> list:
+        return []
+
+
+class Control(RemoteObject):
+    @remote_property
+    def throttle(self) -> float:
+        return self._sim.throttle
+
+    @throttle.setter
+    def throttle(self, value: float):
+        self._sim.throttle = max(0.0, min(1.0, float(value)))
+
+    @remote_property
+    def sas(self) -> bool:
+        return self._sim.sas
+
+    @sas.setter
+    def sas(self, value: bool):
+        self._sim.sas = bool(value)
+
+    @remote_property
+    def sas_mode(self) -> SASMode:
+        return SASMode[self._sim.sas_mode]
+
+    @sas_mode.setter
+    def sas_mode(self, value: SASMode):
+        self._sim.sas_mode = value.name
+
+    @remote_property
+    def speed_mode(self) -> SpeedMode:
+        return SpeedMode[self._sim.speed_mode]
+
+    @speed_mode.setter
+    def speed_mode(self, value: SpeedMode):
+        self._sim.speed_mode = value.name
+
+    @remote_property
+    def rcs(self) -> bool:
+        return self._sim.rcs
+
+    @rcs.setter
+    def rcs(self, value: bool):
+        self._sim.rcs = bool(value)
+
+    @remote_property
+    def current_stage(self) -> int:
+        return self._sim.current_stage
+
+    @remote_property
+    def nodes(self) -> List[Node]:
+        return [Node(self._client, node) for node in self._sim.nodes]
+
+    @remote_method
+    def activate_next_stage(self) -> list:
+        self._sim.activate_next_stage()
+        return []
+
+    @remote_method
+    def add_node(
+        self,
+        ut: float,
+        prograde: float = 0.0,
+        normal: float = 0.0,
+        radial: float = 0.0,
+    ) -> Node:
+        state = self._sim.add_node(ut, prograde, normal, radial)
+        return Node(self._client, state)
+
+    @remote_method
+    def remove_nodes(self):
+        self._sim.nodes.clear()
+
+
+class AutoPilot(RemoteObject):
+    def __init__(self, client, vessel: "Vessel"):
+        super().__init__(client)
+        self._vessel = vessel
+        self._reference_frame = None
+        self._target_pitch = 0.0
+        self._target_heading = 0.0
+
+    def _frame(self) -> ReferenceFrame:
+        if self._reference_frame is None:
+            return Vessel.surface_reference_frame.fget(self._vessel)
+        return self._reference_frame
+
+    def _error(self) -> float:
+        return self._sim.pointing_error()
+
+    @remote_method
+    def engage(self):
+        self._sim.autopilot_engaged = True
+
+    @remote_method
+    def disengage(self):
+        self._sim.autopilot_engaged = False
+
+    @remote_method
+    @blocking
+    def wait(self):
+        self._client.wait_for(lambda: self._error() < 1.0, timeout=60.0)
+
+    @remote_method
+    def target_pitch_and_heading(self, pitch: float, heading: float):
+        self._target_pitch = pitch
+        self._target_heading = heading
+        self._sim.autopilot_target = ("pitch_heading", pitch, heading)
+
+    @remote_property
+    def target_pitch(self) -> float:
+        return self._target_pitch
+
+    @target_pitch.setter
+    def target_pitch(self, value: float):
+        self.target_pitch_and_heading.method.func(
+            self, value, self._target_heading
+        )
+
+    @remote_property
+    def target_heading(self) -> float:
+        return self._target_heading
+
+    @target_heading.setter
+    def target_heading(self, value: float):
+        self.target_pitch_and_heading.method.func(
+            self, self._target_pitch, value
+        )
+
+    @remote_property
+    def target_direction(self):
+        target = self._sim.target_direction()
+        if target is None:
+            target = self._sim.direction
+        return _to_tuple(self._frame().transform().direction(target))
+
+    @target_direction.setter
+    def target_direction(self, value):
+        frame = self._frame()
+        self._sim.autopilot_target = (
+            "direction",
+            np.asarray(value, dtype=float),
+            frame.transform,
+        )
+
+    @remote_property
+    def reference_frame(self) -> ReferenceFrame:
+        return self._frame()
+
+    @reference_frame.setter
+    def reference_frame(self, value: ReferenceFrame):
+        self._reference_frame = value
+
+    @remote_property
+    def error(self) -> float:
+        return self._error()
+
+    @remote_property
+    def heading_error(self) -> float:
+        return self._error()
+
+    @remote_property
+    def pitch_error(self) -> float:
+        return self._error()
+
+
+class Flight(RemoteObject):
+    def __init__(self, client, vessel: "Vessel", frame: ReferenceFrame):
+        super().__init__(client)
+        self._vessel = vessel
+        self._frame = frame
+
+    def _key(self):
+        return ("flight", self._frame._key())
+
+    def _velocity(self) -> np.ndarray:
+        """velocity relative to the frame, in the simulation frame"""
+        sim = self._sim
+        transform = self._frame.transform()
+        return transform.axes.T @ transform.velocity(sim.position, sim.velocity)
+
+    @remote_property
+    def mean_altitude(self) -> float:
+        return self._sim.mean_altitude
+
+    @remote_property
+    def surface_altitude(self) -> float:
+        return self._sim.surface_altitude
+
+    @remote_property
+    def bedrock_altitude(self) -> float:
+        return self._sim.surface_altitude
+
+    @remote_property
+    def elevation(self) -> float:
+        return self._sim.terrain_height
+
+    @remote_property
+    def latitude(self) -> float:
+        return self._sim.latlon(self._sim.position)[0]
+
+    @remote_property
+    def longitude(self) -> float:
+        return self._sim.latlon(self._sim.position)[1]
+
+    @remote_property
+    def velocity(self):
+        transform = self._frame.transform()
+        return _to_tuple(transform.direction(self._velocity()))
+
+    @remote_property
+    def speed(self) -> float:
+        return float(np.linalg.norm(self._velocity()))
+
+    @remote_property
+    def vertical_speed(self) -> float:
+        return float(np.dot(self._velocity(), self._sim.up))
+
+    @remote_property
+    def horizontal_speed(self) -> float:
+        velocity = self._velocity()
+        vertical = np.dot(velocity, self._sim.up) * self._sim.up
+        return float(np.linalg.norm(velocity - vertical))
+
+    @remote_property
+    def direction(self):
+        transform = self._frame.transform()
+        return _to_tuple(transform.direction(self._sim.direction))
+
+    @remote_property
+    def pitch(self) -> float:
+        return math.degrees(
+            math.asin(np.clip(np.dot(self._sim.direction, self._sim.up), -1, 1))
+        )
+
+    @remote_property
+    def heading(self) -> float:
+        sim = self._sim
+        return (
+            math.degrees(
+                math.atan2(
+                    np.dot(sim.direction, sim.east),
+                    np.dot(sim.direction, sim.north),
+                )
+            )
+            % 360
+        )
+
+    @remote_property
+    def roll(self) -> float:
+        return 0.0
+
+    @remote_property
+    def g_force(self) -> float:
+        sim = self._sim
+        return sim.thrust / sim.mass / 9.81
+
+    @remote_property
+    def atmosphere_density(self) -> float:
+        return self._sim.body.density_at(self._sim.mean_altitude)
+
+    @remote_property
+    def dynamic_pressure(self) -> float:
+        sim = self._sim
+        speed = np.linalg.norm(sim.surface_velocity)
+        return 0.5 * sim.body.density_at(sim.mean_altitude) * speed ** 2
+
+
+class Vessel(RemoteObject):
+    def _key(self):
+        return "vessel"
+
+    def _frame(self, key: str, transform: Callable[[], Transform]):
+        return ReferenceFrame(self._client, (key,), transform)
+
+    @remote_property
+    def name(self) -> str:
+        return self._sim.design.name
+
+    @remote_property
+    def situation(self) -> VesselSituation:
+        return VesselSituation[self._sim.situation]
+
+    @remote_property
+    def mass(self) -> float:
+        return self._sim.mass
+
+    @remote_property
+    def available_thrust(self) -> float:
+        return self._sim.available_thrust
+
+    @remote_property
+    def thrust(self) -> float:
+        return self._sim.thrust
+
+    @remote_property
+    def max_thrust(self) -> float:
+        return self._sim.available_thrust
+
+    @remote_property
+    def specific_impulse(self) -> float:
+        return self._sim.specific_impulse
+
+    @remote_property
+    def orbit(self) -> Orbit:
+        return Orbit(self._client, self)
+
+    @remote_property
+    def control(self) -> Control:
+        return self._client.space_center._control
+
+    @remote_property
+    def auto_pilot(self) -> AutoPilot:
+        return self._client.space_center._auto_pilot
+
+    @remote_property
+    def parts(self) -> Parts:
+        return Parts(self._client)
+
+    @remote_property
+    def resources(self) -> Resources:
+        return Resources(self._client, lambda: self._sim.active_stages)
+
+    @remote_property
+    def reference_frame(self) -> ReferenceFrame:
+        return self._frame("vessel", self._sim.vessel_transform)
+
+    @remote_property
+    def surface_reference_frame(self) -> ReferenceFrame:
+        return self._frame("vessel_surface", self._sim.surface_transform)
+
+    @remote_property
+    def surface_velocity_reference_frame(self) -> ReferenceFrame:
+        return self._frame(
+            "vessel_surface_velocity", self._sim.surface_velocity_transform
+        )
+
+    @remote_method
+    def flight(self, reference_frame: ReferenceFrame = None) -> Flight:
+        if reference_frame is None:
+            reference_frame = Vessel.surface_reference_frame.fget(self)
+        return Flight(self._client, self, reference_frame)
+
+    @remote_method
+    def position(self, reference_frame: ReferenceFrame):
+        transform = reference_frame.transform()
+        return _to_tuple(transform.position(self._sim.position))
+
+    @remote_method
+    def velocity(self, reference_frame: ReferenceFrame):
+        transform = reference_frame.transform()
+        return _to_tuple(
+            transform.velocity(self._sim.position, self._sim.velocity)
+        )
+
+    @remote_method
+    def direction(self, reference_frame: ReferenceFrame):
+        transform = reference_frame.transform()
+        return _to_tuple(transform.direction(self._sim.direction))
+
+    @remote_method
+    def bounding_box(self, reference_frame: ReferenceFrame):
+        sim = self._sim
+        axes = sim.vessel_transform().axes
+        half = np.array(
+            (sim.design.width / 2, sim.design.height / 2, sim.design.width / 2)
+        )
+        corners = [
+            sim.position + axes.T @ (half * np.array(signs))
+            for signs in np.array(np.meshgrid(*[(-1, 1)] * 3)).T.reshape(-1, 3)
+        ]
+        transform = reference_frame.transform()
+        points = np.array([transform.position(c) for c in corners])
+        return _to_tuple(points.min(axis=0)), _to_tuple(points.max(axis=0))
+
+    @remote_method
+    def resources_in_decouple_stage(
+        self, stage: int, cumulative: bool = True
+    ) -> Resources:
+        def stages() -> List[StageState]:
+            return [
+                s
+                for s in self._sim.active_stages
+                if s.spec.decouple_stage == stage
+                or (cumulative and s.spec.decouple_stage > stage)
+            ]
+
+        return Resources(self._client, stages)
+
+
+class SpaceCenter(RemoteObject):
+    VesselSituation = VesselSituation
+    SASMode = SASMode
+    SpeedMode = SpeedMode
+    GameMode = GameMode
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._vessel = Vessel(client)
+        self._control = Control(client)
+        self._auto_pilot = AutoPilot(client, self._vessel)
+        self._bodies = {
+            name: CelestialBody(client, spec)
+            for name, spec in client.sim.bodies.items()
+        }
+        self._target_body = None
+        self.ReferenceFrame = ReferenceFrameStatics(client)
+
+    def _key(self):
+        return "space_center"
+
+    def _body(self, name: str) -> CelestialBody:
+        return self._bodies[name]
+
+    @remote_property
+    def ut(self) -> float:
+        return self._sim.ut
+
+    @remote_property
+    def active_vessel(self) -> Vessel:
+        return self._vessel
+
+    @remote_property
+    def vessels(self) -> List[Vessel]:
+        return [self._vessel]
+
+    @remote_property
+    def bodies(self) -> Dict[str, CelestialBody]:
+        return dict(self._bodies)
+
+    @remote_property
+    def game_mode(self) -> GameMode:
+        return GameMode.sandbox
+
+    @remote_property
+    def target_body(self) -> Optional[CelestialBody]:
+        return self._target_body
+
+    @target_body.setter
+    def target_body(self, value: Optional[CelestialBody]):
+        self._target_body = value
+
+    @remote_property
+    def target_vessel(self) -> Optional[Vessel]:
+        return None
+
+    @target_vessel.setter
+    def target_vessel(self, value: Optional[Vessel]):
+        pass
+
+    @remote_property
+    def rails_warp_factor(self) -> int:
+        return self._sim.rails_warp_factor
+
+    @rails_warp_factor.setter
+    def rails_warp_factor(self, value: int):
+        self._sim.rails_warp_factor = max(
+            0, min(int(value), len(RAILS_WARP_RATES) - 1)
+        )
+
+    @remote_property
+    def maximum_rails_warp_factor(self) -> int:
+        sim = self._sim
+        if sim.landed or sim.mean_altitude < sim.body.atmosphere_depth:
+            return 0
+        return len(RAILS_WARP_RATES) - 1
+
+    @remote_property
+    def warp_rate(self) -> float:
+        return RAILS_WARP_RATES[self._sim.rails_warp_factor]
+
+    @remote_method
+    def warp_to(
+        self,
+        ut: float,
+        max_rails_rate: float = 100000.0,
+        max_physics_rate: float = 2.0,
+    ):
+        """Warp to ut, instantly advancing the simulation"""
+        self._sim.advance(ut)
+        self._client.update_streams()
+
+    @remote_method
+    def transform_position(
+        self, position, from_frame: ReferenceFrame, to_frame: ReferenceFrame
+    ):
+        sim_position = from_frame.transform().from_position(position)
+        return _to_tuple(to_frame.transform().position(sim_position))
+
+    @remote_method
+    def transform_direction(
+        self, direction, from_frame: ReferenceFrame, to_frame: ReferenceFrame
+    ):
+        sim_direction = from_frame.transform().from_direction(direction)
+        return _to_tuple(to_frame.transform().direction(sim_direction))
@@ -0,0 +1,496 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, NewType, Optional, Sequence
+
+import numpy as np
+from krpc.client import Client
+from scripts.utils.body_catalog import BodyInfo, body_catalog
+from scripts.utils.trajectory import AtmosphereTable, atmosphere_table
+from scripts.utils.utils import cache_path
+from scripts.utils.vessel_design import (
+    G0,
+    RESOURCE_DENSITY,
+    StageSpec,
+    VesselDesign,
+)
+from scripts.utils.vessel_geometry import vessel_geometry
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Vessel = NewType("Vessel", object)
+
+# bump when the ascent model changes, so stale results are not read
+ASCENT_VERSION = 4
+
+# integration step and flight time limit of simulated ascents, seconds
+ASCENT_STEP = 0.2
+MAX_ASCENT_TIME = 1200.0
+
+# the gravity turn starts no lower, and at no lower surface speed, so that
+# the vessel clears the pad and is stable before pitching over
+MIN_TURN_START_ALT = 250.0
+MIN_TURN_SPEED = 50.0
+
+# density of 1 atm at Kerbin sea level in kg/m^3, pressure of the engine
+# model is taken as density relative to it
+SEA_LEVEL_DENSITY = 1.225
+
+# drag coefficient of a rocket flying nose first, on the cross section of
+# the cylinder fitting its bounding box
+DRAG_COEFFICIENT = 0.3
+
+
+class AscentResult(NamedTuple):
+    """Simulated ascent with a gravity turn profile
+
+    delta_v is the delta-v spent on the ascent plus the circularization
+    burn at apoapsis, inf when the profile does not reach target_alt. The
+    ascent delta-v is counted at vacuum isp, i.e. in fuel spent, so that
+    thrust lost to pressure counts against a profile. on_grid_edge is set
+    when the best profile lies on the edge of the searched grid (other
+    than the lowest allowed turn start), where the optimum may be outside
+    of it.
+    """
+
+    turn_start_alt: float
+    turn_end_alt: float
+    reached: bool
+    delta_v: float
+    ascent_delta_v: float
+    circularization_delta_v: float
+    flight_time: float
+    on_grid_edge: bool = False
+
+
+def design_from_vessel(
+    conn: Client, vessel: Optional[Vessel] = None, drag_area: float = None
+) -> VesselDesign:
+    """Return VesselDesign of a vessel, as flown by simulate_ascents
+
+    Parts are grouped into one StageSpec per decouple stage, holding their
+    dry mass and resources, and the engines of the group at full vacuum
+    thrust with their combined vacuum and sea level specific impulses.
+    Engines of a group ignite together, at the highest stage of them.
+
+    Args:
+        conn: kRPC connection
+        vessel: vessel, the active vessel if None
+        drag_area: drag coefficient times reference area in m^2, e.g. from
+            trajectory.estimate_drag_area, estimated with DRAG_COEFFICIENT
+            from the bounding box if None
+
+    Returns:
+        return VesselDesign
+    """
+    if vessel is None:
+        vessel = conn.space_center.active_vessel
+    geometry = vessel_geometry(conn, vessel)
+
+    dry_masses = defaultdict(float)
+    for part in geometry.parts:
+        dry_masses[part.decouple_stage] += part.dry_mass
+    engines = defaultdict(list)
+    for engine in geometry.engines:
+        part = engine.part
+        engines[part.decouple_stage].append(
+            (
+                part.stage,
+                engine.max_vacuum_thrust,
+                engine.vacuum_specific_impulse,
+                engine.kerbin_sea_level_specific_impulse,
+            )
+        )
+
+    stages = []
+    for decouple_stage in sorted(dry_masses, reverse=True):
+        group = engines[decouple_stage]
+        thrust = sum(t for _, t, _, _ in group)
+        # engines share the mass flow, isp of the group is thrust per flow
+        flow = sum(t / isp for _, t, isp, _ in group if isp > 0)
+        sea_level_thrust = sum(
+            t * sea_isp / isp for _, t, isp, sea_isp in group if isp > 0
+        )
+        resources = vessel.resources_in_decouple_stage(
+            decouple_stage, cumulative=False
+        )
+        stages.append(
+            StageSpec(
+                activate_stage=max(
+                    (s for s, _, _, _ in group), default=decouple_stage + 1
+                ),
+                decouple_stage=decouple_stage,
+                dry_mass=dry_masses[decouple_stage],
+                thrust=thrust,
+                specific_impulse=thrust / flow if flow else 0.0,
+                liquid_fuel=resources.amount("LiquidFuel"),
+                oxidizer=resources.amount("Oxidizer"),
+                solid_fuel=resources.amount("SolidFuel"),
+                sea_level_specific_impulse=sea_level_thrust / flow
+                if flow
+                else 0.0,
+            )
+        )
+
+    (x_min, y_min, z_min), (x_max, y_max, z_max) = geometry.bounding_box
+    width = max(x_max - x_min, z_max - z_min)
+    if drag_area is None:
+        drag_area = DRAG_COEFFICIENT * math.pi * width * width / 4
+    return VesselDesign(
+        name=vessel.name,
+        stages=tuple(stages),
+        height=y_max - y_min,
+        width=width,
+        drag_area=drag_area,
+    )
+
+
+def simulate_ascents(
+    design: VesselDesign,
+    body: BodyInfo,
+    atmosphere: Optional[AtmosphereTable],
+    target_alt: float,
+    turn_start_alts: np.ndarray,
+    turn_end_alts: np.ndarray,
+) -> np.ndarray:
+    """Simulate ascents of a vessel for arrays of gravity turn profiles
+
+    A planar ascent eastward from the equator, flown like launch_into_orbit:
+    full throttle, pitching from 90 degree at turn_start_alt to 0 degree at
+    turn_end_alt while the apoapsis is below 90 % of target_alt, then at
+    0 degree up to target_alt, then coasting out of the atmosphere. The
+    turn waits for MIN_TURN_SPEED, and the attitude turns at most
+    design.turn_rate. Stages are dropped when they run out of fuel,
+    as with autostaging. Thrust, falling from vacuum with the isp as
+    pressure rises, mass flow per stage, drag against the rotating
+    atmosphere and gravity are modelled, every profile stepping together
+    in arrays.
+
+    Args:
+        design: vessel, stages activated from the highest activate_stage
+        body: body launched from
+        atmosphere: atmosphere of the body, None if it has none
+        target_alt: target apoapsis altitude
+        turn_start_alts: (N,) altitudes where the gravity turn starts
+        turn_end_alts: (N,) altitudes where the gravity turn ends
+
+    Returns:
+        return (N, 4) array of (reached, ascent delta-v, circularization
+        delta-v, flight time)
+    """
+    turn_start = np.maximum(
+        np.asarray(turn_start_alts, dtype=float), MIN_TURN_START_ALT
+    )
+    turn_end = np.asarray(turn_end_alts, dtype=float)
+    n = len(turn_start)
+    mu = body.gravitational_parameter
+    radius = body.equatorial_radius
+    w = body.rotational_speed
+    target_radius = radius + target_alt
+    dt = ASCENT_STEP
+
+    stages = design.stages
+    dry = np.array([s.dry_mass for s in stages])
+    isp = np.array([s.specific_impulse for s in stages])
+    sea_level_isp = np.array(
+        [s.sea_level_specific_impulse or s.specific_impulse for s in stages]
+    )
+    flow = np.array(
+        [
+            s.thrust / (s.specific_impulse * G0) if s.thrust > 0 else 0.0
+            for s in stages
+        ]
+    )
+    solid = np.array([s.solid_fuel > 0 for s in stages])
+    activate = np.array([s.activate_stage for s in stages])
+    decouple = np.array([s.decouple_stage for s in stages])
+    fuel = np.tile(
+        [
+            s.liquid_fuel * RESOURCE_DENSITY["LiquidFuel"]
+            + s.oxidizer * RESOURCE_DENSITY["Oxidizer"]
+            + s.solid_fuel * RESOURCE_DENSITY["SolidFuel"]
+            for s in stages
+        ],
+        (n, 1),
+    )
+    current = np.full(n, activate.max())
+
+    # planar state around the body center, launch site on +y
+    x = np.zeros(n)
+    y = np.full(n, radius)
+    vx = np.full(n, -w * radius)
+    vy = np.zeros(n)
+    pitch = np.full(n, math.pi / 2)
+
+    active = np.ones(n, dtype=bool)
+    reached = np.zeros(n, dtype=bool)
+    ascent_dv = np.zeros(n)
+    circularization_dv = np.full(n, np.inf)
+    flight_time = np.full(n, np.nan)
+    elapsed = 0.0
+    while active.any() and elapsed < MAX_ASCENT_TIME:
+        r = np.sqrt(x * x + y * y)
+        altitude = r - radius
+        v2 = vx * vx + vy * vy
+        energy = v2 / 2 - mu / r
+        h = x * vy - y * vx
+        with np.errstate(invalid="ignore", divide="ignore"):
+            a = -mu / (2 * energy)
+            e = np.sqrt(np.maximum(0.0, 1 + 2 * energy * h * h / (mu * mu)))
+            apoapsis = np.where(energy < 0, a * (1 + e), np.inf)
+
+        done = active & (apoapsis >= target_radius)
+        out = done & (altitude >= body.atmosphere_depth)
+        if out.any():
+            # circularize at apoapsis, in this planar orbit
+            apo = np.minimum(apoapsis[out], 1e12)
+            circularization_dv[out] = np.sqrt(mu / apo) - np.abs(h[out]) / apo
+            reached[out] = True
+            flight_time[out] = elapsed
+            active &= ~out
+        crashed = active & (altitude < -1.0)
+        active &= ~crashed
+
+        # stage when the engines of the current stage are out of fuel
+        attached = decouple[np.newaxis, :] < current[:, np.newaxis]
+        burning = (
+            attached
+            & (activate[np.newaxis, :] >= current[:, np.newaxis])
+            & (flow > 0)
+            & (fuel > 0)
+        )
+        flameout = active & ~done & ~burning.any(axis=1)
+        if flameout.any():
+            staging = flameout & (current > activate.min())
+            active &= ~(flameout & ~staging)
+            current = np.where(staging, current - 1, current)
+            attached = decouple[np.newaxis, :] < current[:, np.newaxis]
+            burning = (
+                attached
+                & (activate[np.newaxis, :] >= current[:, np.newaxis])
+                & (flow > 0)
+                & (fuel > 0)
+            )
+
+        throttle = np.where(done | ~active, 0.0, 1.0)
+        stage_throttle = np.where(solid, 1.0, throttle[:, np.newaxis])
+        stage_throttle = np.where(active[:, np.newaxis], stage_throttle, 0.0)
+        burn = burning * stage_throttle
+        mass = np.sum(attached * (dry + fuel), axis=1)
+        density = atmosphere.densities(altitude) if atmosphere else np.zeros(n)
+        # isp, and thrust at constant flow, linear in pressure
+        pressure = density[:, np.newaxis] / SEA_LEVEL_DENSITY
+        stage_isp = np.maximum(0.0, isp + (sea_level_isp - isp) * pressure)
+        force = np.sum(burn * flow * stage_isp * G0, axis=1)
+        fuel = np.maximum(0.0, fuel - burn * flow * dt)
+
+        up_x = x / r
+        up_y = y / r
+        air_x = vx + w * y
+        air_y = vy - w * x
+        air_speed = np.sqrt(air_x * air_x + air_y * air_y)
+
+        # pitch program of launch_into_orbit, once fast enough to turn
+        fraction = np.clip(
+            (altitude - turn_start) / (turn_end - turn_start), 0.0, 1.0
+        )
+        fraction = np.where(
+            apoapsis - radius <= 0.9 * target_alt, fraction, 1.0
+        )
+        turning = air_speed >= MIN_TURN_SPEED
+        target_pitch = np.where(turning, 1 - fraction, 1.0) * (math.pi / 2)
+        # turned no faster than the vessel can
+        max_turn = design.turn_rate * dt
+        pitch += np.clip(target_pitch - pitch, -max_turn, max_turn)
+        # eastward, the body turning counterclockwise
+        heading_x = np.cos(pitch) * -up_y + np.sin(pitch) * up_x
+        heading_y = np.cos(pitch) * up_x + np.sin(pitch) * up_y
+
+        thrust_acceleration = force / mass
+        ascent_dv += np.sum(burn * flow * isp * G0, axis=1) / mass * dt
+        gravity = -mu / (r * r * r)
+        drag = 0.5 * density * air_speed * design.drag_area / mass
+        ax = gravity * x + thrust_acceleration * heading_x - drag * air_x
+        ay = gravity * y + thrust_acceleration * heading_y - drag * air_y
+        # still on the pad until thrust lifts the vessel
+        grounded = active & (altitude <= 0) & (ax * up_x + ay * up_y <= 0)
+        ax = np.where(active & ~grounded, ax, 0.0)
+        ay = np.where(active & ~grounded, ay, 0.0)
+        vx = np.where(grounded, -w * y, vx + ax * dt)
+        vy = np.where(grounded, w * x, vy + ay * dt)
+        x = np.where(active, x + vx * dt, x)
+        y = np.where(active, y + vy * dt, y)
+        elapsed += dt
+
+    return np.stack(
+        (reached, ascent_dv, circularization_dv, flight_time), axis=-1
+    )
+
+
+def _simulate_chunk(args) -> np.ndarray:
+    return simulate_ascents(*args)
+
+
+def _cache_key(
+    design, body, atmosphere, target_alt, turn_start_alts, turn_end_alts
+):
+    source = json.dumps(
+        [
+            ASCENT_VERSION,
+            design,
+            body,
+            atmosphere
+            and [atmosphere.depth, atmosphere.log_densities.tolist()],
+            target_alt,
+            list(turn_start_alts),
+            list(turn_end_alts),
+        ]
+    )
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def optimize_ascent(
+    design: VesselDesign,
+    body: BodyInfo,
+    atmosphere: Optional[AtmosphereTable],
+    target_alt: float,
+    turn_start_alts: Optional[Sequence[float]] = None,
+    turn_end_alts: Optional[Sequence[float]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 250,
+    refresh: bool = False,
+) -> AscentResult:
+    """Find the gravity turn profile reaching orbit with the least delta-v
+
+    Every pair of turn_start_alts x turn_end_alts is simulated with
+    simulate_ascents, in chunks spread over a process pool. The result is
+    cached in the local cache directory, keyed by a hash of the design,
+    the body, the target and the grid, so that repeat launches of the
+    same vessel reuse it.
+
+    Usage:
+        best = optimize_ascent(design, kerbin, kerbin_atmosphere, 100000)
+        launch_into_orbit(conn, 100000, 90, best.turn_start_alt, best.turn_end_alt)
+
+    Args:
+        design: vessel, see design_from_vessel
+        body: body launched from, from body_catalog
+        atmosphere: atmosphere of the body, from atmosphere_table
+        target_alt: target apoapsis altitude
+        turn_start_alts: candidate altitudes of the turn start
+        turn_end_alts: candidate altitudes of the turn end
+        workers: number of processes, os.cpu_count() if None, 1 simulates
+            in this process
+        chunk_size: profiles per chunk
+        refresh: ignore the cached result
+
+    Returns:
+        return AscentResult of the best profile, reached False if none
+        reaches target_alt
+    """
+    if turn_start_alts is None:
+        turn_start_alts = np.linspace(MIN_TURN_START_ALT, 20000.0, 41)
+    if turn_end_alts is None:
+        turn_end_alts = np.geomspace(5000.0, 600000.0, 50)
+    turn_start_alts = [float(a) for a in turn_start_alts]
+    turn_end_alts = [float(a) for a in turn_end_alts]
+
+    key = _cache_key(
+        design, body, atmosphere, target_alt, turn_start_alts, turn_end_alts
+    )
+    path = cache_path("ascent", f"{key}.json")
+    if not refresh:
+        try:
+            with open(path) as f:
+                return AscentResult(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            pass
+
+    starts, ends = np.meshgrid(turn_start_alts, turn_end_alts, indexing="ij")
+    valid = starts < ends
+    starts = starts[valid]
+    ends = ends[valid]
+    chunks = [
+        (design, body, atmosphere, target_alt, s, e)
+        for s, e in zip(
+            np.array_split(starts, max(1, math.ceil(len(starts) / chunk_size))),
+            np.array_split(ends, max(1, math.ceil(len(ends) / chunk_size))),
+        )
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        results = [_simulate_chunk(chunk) for chunk in chunks]
+    else:
+        # spawn workers, a fork would copy the kRPC socket and the stream
+        # threads of the connected caller
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            results = list(executor.map(_simulate_chunk, chunks))
+    results = np.concatenate(results)
+
+    reached = results[:, 0] > 0
+    delta_v = np.where(reached, results[:, 1] + results[:, 2], np.inf)
+    best = int(np.argmin(delta_v))
+    start_edges = {max(turn_start_alts)}
+    if min(turn_start_alts) > MIN_TURN_START_ALT:
+        start_edges.add(min(turn_start_alts))
+    on_grid_edge = starts[best] in start_edges or ends[best] in (
+        min(turn_end_alts),
+        max(turn_end_alts),
+    )
+    result = AscentResult(
+        float(starts[best]),
+        float(ends[best]),
+        bool(reached[best]),
+        float(delta_v[best]),
+        float(results[best, 1]),
+        float(results[best, 2]),
+        float(results[best, 3]),
+        bool(on_grid_edge),
+    )
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result._asdict(), f, indent=1)
+    os.replace(tmp_path, path)
+    return result
+
+
+def optimize_launch(
+    conn: Client, target_alt: float, vessel: Optional[Vessel] = None, **kwargs
+) -> AscentResult:
+    """optimize_ascent of a vessel on the launch pad, read over kRPC
+
+    Args:
+        conn: kRPC connection
+        target_alt: target apoapsis altitude
+        vessel: vessel, the active vessel if None
+        kwargs: other arguments of optimize_ascent
+
+    Returns:
+        return AscentResult of the best profile
+    """
+    if vessel is None:
+        vessel = conn.space_center.active_vessel
+    body = body_catalog(conn)[vessel.orbit.body.name]
+    return optimize_ascent(
+        design_from_vessel(conn, vessel),
+        body,
+        atmosphere_table(conn, body.name),
+        target_alt,
+        **kwargs,
+    )
+
+
+if __name__ == "__main__":
+    import krpc
+
+    krpc_address = os.environ["KRPC_ADDRESS"]
+    conn = krpc.connect(name="ascent optimizer", address=krpc_address)
+    print(optimize_launch(conn, 100000))
@@ -1,9 +1,21 @@
+import threading
+from typing import NewType, Optional
+
 from krpc.client import Client
+from scripts.utils.rpc_profiler import profile_from_env, set_phase
 from scripts.utils.status_dialog import StatusDialog
+from scripts.utils.vessel_geometry import vessel_geometry
+
 
+# TODO: type hint for kRPC remote objects may need to be separated
+Vessel = NewType("Vessel", object)
 
-is_autostaging = True
-staging_event = None
+# autostaging state of each vessel, so that procedures flying different
+# vessels on one connection do not cancel each other's staging
+is_autostaging = {}
+staging_events = {}
+# guards the dicts above, staging callbacks run on the stream thread
+autostaging_lock = threading.RLock()
 
 
 def set_autostaging(
@@ -13,6 +25,7 @@ def set_autostaging(
     solid_fuel: bool = True,
     threashold: float = 0,
     stop_stage: int = 0,
+    vessel: Optional[Vessel] = None,
 ) -> None:
     """set next autostagin on resource is under certin level
 
@@ -20,17 +33,39 @@ def set_autostaging(
 
     Args:
         conn: kRPC connection
+        vessel: vessel to stage, the active vessel if None
 
     Returns:
         return nothing, return when procedure finished
 
     """
-    # TODO: global without lock
-    global is_autostaging
-    is_autostaging = True
+    if vessel is None:
+        vessel = conn.space_center.active_vessel
+    with autostaging_lock:
+        _set_autostaging(
+            conn,
+            vessel,
+            liquid_fuel,
+            oxidizer,
+            solid_fuel,
+            threashold,
+            stop_stage,
+        )
+
+
+def _set_autostaging(
+    conn: Client,
+    vessel: Vessel,
+    liquid_fuel: bool,
+    oxidizer: bool,
+    solid_fuel: bool,
+    threashold: float,
+    stop_stage: int,
+) -> None:
+    is_autostaging[vessel] = True
+    remove_staging_events(vessel)
 
     dialog = StatusDialog(conn)
-    vessel = conn.space_center.active_vessel
 
     current_stage = vessel.control.current_stage
     if current_stage <= stop_stage:
@@ -54,9 +89,10 @@ def set_autostaging(
         "SolidFuel"
     ):
         # check solid fuel only if there's active srbs decoupled next
+        engines = vessel_geometry(conn, vessel, current_stage).engines
         srbs_next_decoupled = [
             e
-            for e in vessel.parts.engines
+            for e in engines
             if e.part.resources.has_resource("SolidFuel")
             and e.part.decouple_stage == (current_stage - 1)
         ]
@@ -73,8 +109,14 @@ def set_autostaging(
     if len(resource_types_for_stage) == 0:
         # if current stage has empty resource (fairing etc.) just stage
         vessel.control.activate_next_stage()
-        set_autostaging(
-            conn, liquid_fuel, oxidizer, solid_fuel, threashold, stop_stage
+        _set_autostaging(
+            conn,
+            vessel,
+            liquid_fuel,
+            oxidizer,
+            solid_fuel,
+            threashold,
+            stop_stage,
         )
         return
 
@@ -99,39 +141,54 @@ def set_autostaging(
         )
         staging_condition = expression.or_(staging_condition, cond)
 
-    global staging_event
-    staging_event = conn.krpc.add_event(staging_condition)
+    event = conn.krpc.add_event(staging_condition)
+    staging_events[vessel] = event
 
     def auto_staging():
-        global is_autostaging
-        remove_staging_events()
-        if not is_autostaging:
-            return
-        dialog.status_update(f"Staging: stage {current_stage - 1}")
-
-        # check if stage triggered by somewhere else
-        if current_stage == vessel.control.current_stage:
-            vessel.control.activate_next_stage()
-        set_autostaging(
-            conn, liquid_fuel, oxidizer, solid_fuel, threashold, stop_stage
-        )
+        set_phase(conn, "autostage")
+        with autostaging_lock:
+            # ignore events replaced or removed by another procedure
+            if staging_events.get(vessel) is not event:
+                return
+            if not is_autostaging.get(vessel):
+                return
+            remove_staging_events(vessel)
+            dialog.status_update(f"Staging: stage {current_stage - 1}")
+
+            # check if stage triggered by somewhere else
+            if current_stage == vessel.control.current_stage:
+                vessel.control.activate_next_stage()
+            _set_autostaging(
+                conn,
+                vessel,
+                liquid_fuel,
+                oxidizer,
+                solid_fuel,
+                threashold,
+                stop_stage,
+            )
 
-    staging_event.add_callback(auto_staging)
-    staging_event.start()
+    event.add_callback(auto_staging)
+    event.start()
 
 
-def remove_staging_events():
-    global staging_event
-    if staging_event:
-        staging_event.remove()
-        staging_event = None
+def remove_staging_events(vessel: Optional[Vessel] = None):
+    """remove staging events of the vessel, of every vessel if None"""
+    with autostaging_lock:
+        vessels = list(staging_events) if vessel is None else [vessel]
+        for v in vessels:
+            event = staging_events.pop(v, None)
+            if event:
+                event.remove()
 
 
-# TODO: global without lock
-def unset_autostaging():
-    global is_autostaging
-    is_autostaging = False
-    remove_staging_events()
+def unset_autostaging(vessel: Optional[Vessel] = None):
+    """stop autostaging of the vessel, of every vessel if None"""
+    with autostaging_lock:
+        vessels = list(is_autostaging) if vessel is None else [vessel]
+        for v in vessels:
+            is_autostaging.pop(v, None)
+        remove_staging_events(vessel)
 
 
 if __name__ == "__main__":
@@ -140,6 +197,7 @@ if __name__ == "__main__":
 
     krpc_address = os.environ["KRPC_ADDRESS"]
     conn = krpc.connect(name="autostage", address=krpc_address)
+    profile_from_env(conn)
     set_autostaging(conn)
 
     print("start sleeping")
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import weakref
+from types import MappingProxyType
+from typing import Dict, List, NamedTuple, NewType, Optional
+
+from krpc.client import Client
+from scripts.utils.kepler import KeplerOrbit
+from scripts.utils.utils import cache_path
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Body = NewType("Body", object)
+
+CATALOG_VERSION = 1
+
+
+class BodyInfo(NamedTuple):
+    """Constants of a celestial body
+
+    Orbital elements are None for the root body (the Sun in stock).
+    """
+
+    name: str
+    parent: Optional[str]
+    satellites: List[str]
+    gravitational_parameter: float
+    equatorial_radius: float
+    surface_gravity: float
+    rotational_period: float
+    rotational_speed: float
+    initial_rotation: float
+    sphere_of_influence: float
+    has_atmosphere: bool
+    atmosphere_depth: float
+    semi_major_axis: Optional[float] = None
+    eccentricity: Optional[float] = None
+    inclination: Optional[float] = None
+    longitude_of_ascending_node: Optional[float] = None
+    argument_of_periapsis: Optional[float] = None
+    mean_anomaly_at_epoch: Optional[float] = None
+    epoch: Optional[float] = None
+
+    def rotation_angle_at(self, ut: float) -> float:
+        """rotation angle of the body at ut in radian, as body.rotation_angle"""
+        return (self.initial_rotation + self.rotational_speed * ut) % (
+            2 * math.pi
+        )
+
+
+class BodyCatalog(object):
+    """Read-only catalog of celestial bodies, safe to share between threads"""
+
+    def __init__(self, fingerprint: str, bodies: Dict[str, BodyInfo]):
+        self.fingerprint = fingerprint
+        self.bodies = MappingProxyType(dict(bodies))
+
+    def __getitem__(self, name: str) -> BodyInfo:
+        return self.bodies[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.bodies
+
+    def __iter__(self):
+        return iter(self.bodies.values())
+
+    def kepler_orbit(self, name: str) -> Optional[KeplerOrbit]:
+        """Return KeplerOrbit of the body around its parent
+
+        Args:
+            name: name of the body
+
+        Returns:
+            return KeplerOrbit, None for the root body
+        """
+        body = self.bodies[name]
+        if body.parent is None:
+            return None
+        return KeplerOrbit(
+            self.bodies[body.parent].gravitational_parameter,
+            body.semi_major_axis,
+            body.eccentricity,
+            body.inclination,
+            body.longitude_of_ascending_node,
+            body.argument_of_periapsis,
+            body.mean_anomaly_at_epoch,
+            body.epoch,
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "version": CATALOG_VERSION,
+            "fingerprint": self.fingerprint,
+            "bodies": {name: b._asdict() for name, b in self.bodies.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "BodyCatalog":
+        bodies = {
+            name: BodyInfo(**body) for name, body in data["bodies"].items()
+        }
+        return cls(data["fingerprint"], bodies)
+
+
+_catalogs = {}
+_fingerprints = weakref.WeakKeyDictionary()
+_catalogs_lock = threading.Lock()
+
+
+def game_fingerprint(conn: Client) -> str:
+    """Return fingerprint of the running game
+
+    The fingerprint changes when kRPC server, game mode or set of bodies
+    (e.g. planet pack mods) changes, and costs three RPCs. Mods changing
+    the constants of bodies without renaming them (e.g. rescale mods) keep
+    the fingerprint, refresh the catalog after installing them.
+
+    Args:
+        conn: kRPC connection
+
+    Returns:
+        return hex digest
+    """
+    version = conn.krpc.get_status().version
+    game_mode = conn.space_center.game_mode
+    names = sorted(conn.space_center.bodies.keys())
+    source = json.dumps([version, str(game_mode), names])
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def _root_body(conn: Client) -> Body:
+    """Return the body every other body orbits, whatever its name"""
+    body = next(iter(conn.space_center.bodies.values()))
+    orbit = body.orbit
+    while orbit is not None:
+        body = orbit.body
+        orbit = body.orbit
+    return body
+
+
+def _read_body(
+    bodies: Dict[str, BodyInfo], parent: Optional[str], krpc_body: Body
+):
+    name = krpc_body.name
+    satellites = krpc_body.satellites
+    has_atmosphere = krpc_body.has_atmosphere
+
+    elements = {}
+    if parent is not None:
+        orbit = krpc_body.orbit
+        elements = dict(
+            semi_major_axis=orbit.semi_major_axis,
+            eccentricity=orbit.eccentricity,
+            inclination=orbit.inclination,
+            longitude_of_ascending_node=orbit.longitude_of_ascending_node,
+            argument_of_periapsis=orbit.argument_of_periapsis,
+            mean_anomaly_at_epoch=orbit.mean_anomaly_at_epoch,
+            epoch=orbit.epoch,
+        )
+
+    bodies[name] = BodyInfo(
+        name=name,
+        parent=parent,
+        satellites=[s.name for s in satellites],
+        gravitational_parameter=krpc_body.gravitational_parameter,
+        equatorial_radius=krpc_body.equatorial_radius,
+        surface_gravity=krpc_body.surface_gravity,
+        rotational_period=krpc_body.rotational_period,
+        rotational_speed=krpc_body.rotational_speed,
+        initial_rotation=krpc_body.initial_rotation,
+        sphere_of_influence=krpc_body.sphere_of_influence,
+        has_atmosphere=has_atmosphere,
+        atmosphere_depth=krpc_body.atmosphere_depth if has_atmosphere else 0,
+        **elements,
+    )
+    for satellite in satellites:
+        _read_body(bodies, name, satellite)
+
+
+def _load_catalog_file(path: str, fingerprint: str) -> Optional[BodyCatalog]:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        data.get("version") != CATALOG_VERSION
+        or data.get("fingerprint") != fingerprint
+    ):
+        return None
+    return BodyCatalog.from_json(data)
+
+
+def _save_catalog_file(path: str, catalog: BodyCatalog):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(catalog.to_json(), f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def body_catalog(conn: Client, refresh: bool = False) -> BodyCatalog:
+    """Return catalog of celestial bodies in the game
+
+    The catalog is cached in memory and in a local cache file keyed by the
+    game fingerprint, so the tree of bodies is walked over kRPC only once
+    per game, and repeated calls on a connection make no RPC.
+
+    Args:
+        conn: kRPC connection
+        refresh: ignore cache and read bodies from kRPC
+
+    Returns:
+        return BodyCatalog
+    """
+    with _catalogs_lock:
+        fingerprint = _fingerprints.get(conn)
+        if not fingerprint or refresh:
+            fingerprint = game_fingerprint(conn)
+            _fingerprints[conn] = fingerprint
+
+        catalog = _catalogs.get(fingerprint)
+        if catalog and not refresh:
+            return catalog
+
+        path = cache_path("bodies", f"{fingerprint}.json")
+        if not refresh:
+            catalog = _load_catalog_file(path, fingerprint)
+
+        if refresh or not catalog:
+            bodies = {}
+            _read_body(bodies, None, _root_body(conn))
+            catalog = BodyCatalog(fingerprint, bodies)
+            _save_catalog_file(path, catalog)
+
+        _catalogs[fingerprint] = catalog
+        return catalog
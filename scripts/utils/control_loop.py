@@ -0,0 +1,169 @@
+import contextlib
+import math
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+from krpc.client import Client
+from scripts.utils.rpc_counter import rpc_counter
+
+
+class LoopStats(NamedTuple):
+    """Statistics of a FixedRateLoop, times in seconds
+
+    latency is the time spent in a tick, jitter is the standard deviation
+    of tick start times from their schedule, and an overrun is a tick whose
+    latency exceeds the period.
+    """
+
+    name: str
+    rate: float
+    ticks: int
+    overruns: int
+    mean_latency: float
+    max_latency: float
+    jitter: float
+    mean_rpcs: float
+    max_rpcs: int
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}: {self.ticks} ticks at {self.rate:g} Hz, "
+            f"latency mean {self.mean_latency * 1000:.1f} ms "
+            f"max {self.max_latency * 1000:.1f} ms, "
+            f"jitter {self.jitter * 1000:.1f} ms, "
+            f"overruns {self.overruns}, "
+            f"RPCs/tick mean {self.mean_rpcs:.1f} max {self.max_rpcs}"
+        )
+
+
+class FixedRateLoop(object):
+    """Scheduler running a control loop at a fixed rate
+
+    Iterate ticks() and break out when done, or pass a callback to run().
+    Each tick starts on a fixed schedule; a tick overrunning its period
+    delays the next one instead of running ticks back-to-back to catch up,
+    so CPU and network load stay bounded by the rate.
+
+    Usage:
+        loop = FixedRateLoop(conn, 50, "descent")
+        for _ in loop.ticks():
+            if landed():
+                break
+            if far_from_burn():
+                with loop.paused():
+                    warp_to(conn, burn_ut)
+        dialog.status_update(loop.stats.summary())
+    """
+
+    def __init__(self, conn: Client, rate: float, name: str = "loop"):
+        self.name = name
+        self.rate = rate
+        self._rpc_counter = rpc_counter(conn)
+        self._reset()
+
+    def _reset(self):
+        self._ticks = 0
+        self._overruns = 0
+        self._latency_sum = 0.0
+        self._max_latency = 0.0
+        self._lateness_sum = 0.0
+        self._lateness_square_sum = 0.0
+        self._rpc_sum = 0
+        self._max_rpcs = 0
+        self._paused_time = 0.0
+        self._paused_rpcs = 0
+
+    @property
+    def period(self) -> float:
+        return 1 / self.rate
+
+    def ticks(self) -> Iterator[int]:
+        """Yield tick numbers at the loop rate
+
+        Statistics are reset when iteration starts, and the tick in which
+        the caller breaks out is not counted.
+        """
+        self._reset()
+        next_start = time.monotonic()
+        tick = 0
+        while True:
+            start = time.monotonic()
+            lateness = start - next_start
+            rpcs_before = self._rpc_counter.count
+            self._paused_time = 0.0
+            self._paused_rpcs = 0
+
+            yield tick
+
+            end = time.monotonic()
+            self._record(
+                end - start - self._paused_time,
+                lateness,
+                self._rpc_counter.count - rpcs_before - self._paused_rpcs,
+            )
+            tick += 1
+
+            next_start += self.period
+            if next_start < end or self._paused_time:
+                # a paused tick restarts the schedule, without lateness
+                next_start = end
+            else:
+                time.sleep(next_start - end)
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Leave a long wait inside a tick (e.g. a warp) out of the timing
+
+        Time and RPCs spent in the with block count neither as latency of
+        the tick nor as lateness of the next one, which starts right after
+        the tick.
+        """
+        start = time.monotonic()
+        rpcs_before = self._rpc_counter.count
+        try:
+            yield
+        finally:
+            self._paused_time += time.monotonic() - start
+            self._paused_rpcs += self._rpc_counter.count - rpcs_before
+
+    def run(self, callback: Callable[[], Optional[bool]]) -> "LoopStats":
+        """Call callback every tick until it returns True
+
+        Args:
+            callback: control function, return True to stop the loop
+
+        Returns:
+            return LoopStats
+        """
+        for _ in self.ticks():
+            if callback():
+                break
+        return self.stats
+
+    def _record(self, latency: float, lateness: float, rpcs: int):
+        self._ticks += 1
+        self._latency_sum += latency
+        self._max_latency = max(self._max_latency, latency)
+        if latency > self.period:
+            self._overruns += 1
+        self._lateness_sum += lateness
+        self._lateness_square_sum += lateness * lateness
+        self._rpc_sum += rpcs
+        self._max_rpcs = max(self._max_rpcs, rpcs)
+
+    @property
+    def stats(self) -> LoopStats:
+        n = max(1, self._ticks)
+        mean_lateness = self._lateness_sum / n
+        variance = self._lateness_square_sum / n - mean_lateness ** 2
+        return LoopStats(
+            name=self.name,
+            rate=self.rate,
+            ticks=self._ticks,
+            overruns=self._overruns,
+            mean_latency=self._latency_sum / n,
+            max_latency=self._max_latency,
+            jitter=math.sqrt(max(0.0, variance)),
+            mean_rpcs=self._rpc_sum / n,
+            max_rpcs=self._max_rpcs,
+        )
@@ -1,16 +1,22 @@
 import math
 import time
-from typing import Callable, NewType, Optional
+from typing import Callable, NewType, Optional, Union
 
-import numpy as np
 from krpc.client import Client
 from scripts.utils.autostage import set_autostaging, unset_autostaging
+from scripts.utils.body_catalog import BodyInfo, body_catalog
+from scripts.utils.control_loop import FixedRateLoop
+from scripts.utils.impact_predictor import ImpactPredictor, retrograde_heading
+from scripts.utils.kepler import KeplerOrbit
+from scripts.utils.rpc_profiler import profile_from_env, set_phase
 from scripts.utils.status_dialog import StatusDialog
-from scripts.utils.utils import (
-    angle_between,
-    bearing_between_coords,
-    clamp_2pi,
-    latlon,
+from scripts.utils.telemetry import Telemetry
+from scripts.utils.terrain_cache import terrain_cache
+from scripts.utils.vessel_geometry import vessel_geometry
+from scripts.utils.wait import (
+    touchdown_event,
+    wait_until_pointing_error_below,
+    warp_to,
 )
 
 
@@ -20,6 +26,10 @@ Body = NewType("Body", object)
 Orbit = NewType("Orbit", object)
 Node = NewType("Node", object)
 
+# control loop and telemetry rates (Hz) while coasting and during burns
+COASTING_RATE = 5
+TERMINAL_RATE = 50
+
 
 def vertical_landing(
     conn: Client,
@@ -54,6 +64,7 @@ def vertical_landing(
     Returns:
         return nothing, return when procedure finished
     """
+    set_phase(conn, "vertical_landing: setup")
     vessel = conn.space_center.active_vessel
     body = vessel.orbit.body
 
@@ -70,105 +81,167 @@ def vertical_landing(
 
     # Set up dialog and stream
     dialog = StatusDialog(conn)
-    surface_gravity = body.surface_gravity
-    equatorial_radius = body.equatorial_radius
-    has_atmosphere = body.has_atmosphere
-    atmosphere_depth = body.atmosphere_depth
+    body_info = body_catalog(conn)[body.name]
+    surface_gravity = body_info.surface_gravity
+    equatorial_radius = body_info.equatorial_radius
+    has_atmosphere = body_info.has_atmosphere
+    atmosphere_depth = body_info.atmosphere_depth
+
+    def current_orbit(t) -> KeplerOrbit:
+        return KeplerOrbit.from_surface_state(
+            body_info.gravitational_parameter,
+            body_info.rotational_speed,
+            t.position,
+            t.velocity,
+            t.ut,
+        )
 
     ref_frame = conn.space_center.ReferenceFrame.create_hybrid(
         position=body.reference_frame, rotation=vessel.surface_reference_frame
     )
     flight = vessel.flight(ref_frame)
 
-    ut = conn.add_stream(getattr, conn.space_center, "ut")
-    mass = conn.add_stream(getattr, vessel, "mass")
-    available_thrust = conn.add_stream(getattr, vessel, "available_thrust")
-    radius = conn.add_stream(getattr, vessel.orbit, "radius")
-    altitude = conn.add_stream(getattr, flight, "surface_altitude")
-    mean_altitude = conn.add_stream(getattr, flight, "mean_altitude")
-    speed = conn.add_stream(getattr, flight, "speed")
-    vertical_speed = conn.add_stream(getattr, flight, "vertical_speed")
-    horizontal_speed = conn.add_stream(getattr, flight, "horizontal_speed")
+    telemetry = Telemetry(
+        conn,
+        rate=COASTING_RATE,
+        ut=(getattr, conn.space_center, "ut"),
+        mass=(getattr, vessel, "mass"),
+        available_thrust=(getattr, vessel, "available_thrust"),
+        radius=(getattr, vessel.orbit, "radius"),
+        altitude=(getattr, flight, "surface_altitude"),
+        mean_altitude=(getattr, flight, "mean_altitude"),
+        speed=(getattr, flight, "speed"),
+        vertical_speed=(getattr, flight, "vertical_speed"),
+        horizontal_speed=(getattr, flight, "horizontal_speed"),
+        direction=(getattr, flight, "direction"),
+        position=(vessel.position, body.reference_frame),
+        velocity=(vessel.velocity, body.reference_frame),
+    )
 
     vessel.control.sas = True
     vessel.control.speed_mode = vessel.control.speed_mode.surface
 
     # set staging
     if auto_stage:
-        set_autostaging(conn, stop_stage=stop_stage)
+        set_autostaging(conn, stop_stage=stop_stage, vessel=vessel)
 
     # check unguided or guided
     guided_landing = True
     if target_lat is None or target_lon is None:
         guided_landing = False
 
+    # terrain height at the target never changes, look it up once
+    target_height = 0.0
+    if guided_landing:
+        target_height = body.surface_height(target_lat, target_lon)
+
     if not guided_landing:
         kill_horizontal_velocity(conn, use_sas)
 
     ####
     # pre-entry phase
+    set_phase(conn, "vertical_landing: pre-entry")
     vessel.control.rcs = use_rcs_on_entry
 
     # pre-entry guidance
     if guided_landing:
         vessel.auto_pilot.reference_frame = ref_frame
         vessel.auto_pilot.engage()
-
-        last_ut = ut()
-        bearing, distance, landing_position_error = landing_target_steering(
-            vessel, target_lat, target_lon, ut()
+        # sample the terrain around the target once, predictions then land
+        # on it without RPC as the impact point closes in
+        terrain = terrain_cache(conn, body_info.name)
+        terrain.prefetch(target_lat, target_lon)
+        predictor = ImpactPredictor(
+            body_info, target_lat, target_lon, target_height, terrain=terrain
         )
+
+        t = telemetry.snapshot()
+        last_ut = t.ut
+        landing_position_error = predictor.predict(
+            t.position, t.velocity, t.ut
+        ).error
         last_landing_position_error = landing_position_error
         last_throttle = 0
-
-        while True:
-            a100 = available_thrust() / mass()
-            bounding_box = vessel.bounding_box(vessel.surface_reference_frame)
-            lower_bound = bounding_box[0][0]
+        # the orbit only changes with burns, refresh it after them
+        orbit = current_orbit(t)
+
+        telemetry.rate = TERMINAL_RATE
+        guidance_loop = FixedRateLoop(conn, TERMINAL_RATE, "pre-entry guidance")
+        # the heading search is too slow for every tick, hold its result
+        heading_search_ticks = TERMINAL_RATE // COASTING_RATE
+        for tick in guidance_loop.ticks():
+            t = telemetry.snapshot()
+            a100 = t.available_thrust / t.mass
+            geometry = vessel_geometry(conn, vessel)
+            lower_bound = geometry.lower_bound(t.direction[0])
+            if last_throttle:
+                orbit = current_orbit(t)
 
             landing_radius = equatorial_radius + lower_bound
             if guided_landing:
                 landing_radius = max(
-                    landing_radius,
-                    landing_radius
-                    + body.surface_height(target_lat, target_lon),
+                    landing_radius, landing_radius + target_height
                 )
 
-            bearing, distance, landing_position_error = landing_target_steering(
-                vessel, target_lat, target_lon, ut()
+            prediction = predictor.predict(
+                t.position, t.velocity, t.ut, landing_radius
             )
+            distance = prediction.distance
+            landing_position_error = prediction.error
+            # burn in the direction that best reduces the error until the
+            # next search, or retrograde to lower the orbit until it lands
+            if tick % heading_search_ticks == 0:
+                best = None
+                if prediction.ut is not None:
+                    best = predictor.best_heading(
+                        t.position,
+                        t.velocity,
+                        t.ut,
+                        a100 / COASTING_RATE,
+                        landing_radius=landing_radius,
+                        max_time=min(3600.0, 2 * (prediction.ut - t.ut)),
+                    )
+                if best is None:
+                    bearing = retrograde_heading(t.position, t.velocity)
+                else:
+                    bearing, _ = best
 
             if has_atmosphere:
                 atmosphere_radius = equatorial_radius + atmosphere_depth
-                if atmosphere_depth > altitude() and vertical_speed() < 0:
+                if atmosphere_depth > t.altitude and t.vertical_speed < 0:
                     break
 
                 entry_ut, entry_speed = time_to_radius(
-                    vessel.orbit, atmosphere_radius, ut()
+                    orbit, atmosphere_radius, t.ut
                 )
                 if entry_ut is None:
                     break
-                entry_lead_time = entry_ut - ut()
+                entry_lead_time = entry_ut - t.ut
 
                 if landing_position_error / distance < 0.05:
                     if entry_lead_time > 120:
-                        conn.space_center.warp_to(entry_ut - 60)
+                        with guidance_loop.paused():
+                            warp_to(conn, entry_ut - 60)
                     else:
                         break
             else:
                 impact_ut, terminal_speed = time_to_radius(
-                    vessel.orbit, landing_radius, ut()
+                    orbit, landing_radius, t.ut
                 )
-                burn_time = burn_prediction(terminal_speed, a100)
-                burn_ut = impact_ut - burn_time
-                burn_lead_time = burn_ut - ut()
-                if burn_lead_time < 30:
-                    break
-                if landing_position_error / distance < 0.05:
-                    if burn_lead_time > 10:
-                        conn.space_center.warp_to(burn_ut - 60)
-                    else:
+                # an orbit missing the surface has no burn to wait for, keep
+                # burning on bearing until it lands
+                if impact_ut is not None:
+                    burn_time = burn_prediction(terminal_speed, a100)
+                    burn_ut = impact_ut - burn_time
+                    burn_lead_time = burn_ut - t.ut
+                    if burn_lead_time < 30:
                         break
+                    if landing_position_error / distance < 0.05:
+                        if burn_lead_time > 10:
+                            with guidance_loop.paused():
+                                warp_to(conn, burn_ut - 60)
+                        else:
+                            break
 
             vessel.auto_pilot.target_pitch_and_heading(0, bearing)
 
@@ -177,7 +250,7 @@ def vertical_landing(
                     landing_pos_corrected = (
                         last_landing_position_error - landing_position_error
                     )
-                    dt = ut() - last_ut
+                    dt = t.ut - last_ut
                     instant_rate_per_throttle = (
                         landing_pos_corrected / dt / last_throttle
                     )
@@ -197,18 +270,21 @@ def vertical_landing(
                 vessel.control.throttle = 0
 
             dialog.status_update(
-                f"landing_position error: {landing_position_error: 5.3f}, bearing: {bearing: 5.3f}"
+                f"landing_position error: {landing_position_error: 5.3f}, bearing: {bearing: 5.3f}, slope: {prediction.slope: 5.1f}"
             )
 
-            last_ut = ut()
+            last_ut = t.ut
             last_landing_position_error = landing_position_error
             last_throttle = vessel.control.throttle
 
         vessel.control.throttle = 0
         vessel.auto_pilot.disengage()
+        telemetry.rate = COASTING_RATE
+        dialog.status_update(guidance_loop.stats.summary())
 
     ####
     # entry
+    set_phase(conn, "vertical_landing: entry")
     vessel.control.sas = True
     vessel.control.sas_mode = vessel.control.sas_mode.retrograde
 
@@ -219,17 +295,18 @@ def vertical_landing(
         retract_panels(conn)
 
     # wait for entry
-    if has_atmosphere and atmosphere_depth < altitude():
+    t = telemetry.snapshot()
+    if has_atmosphere and atmosphere_depth < t.altitude:
         warp_to_radius = atmosphere_depth + equatorial_radius
         entry_ut, terminal_speed = time_to_radius(
-            vessel.orbit, warp_to_radius, ut()
+            current_orbit(t), warp_to_radius, t.ut
         )
-        sec_until_entry = entry_ut - ut()
+        sec_until_entry = entry_ut - t.ut
         if sec_until_entry > 30:
             dialog.status_update(
                 f"Warp for entry - 5sec: {sec_until_entry: 5.3f}"
             )
-            conn.space_center.warp_to(entry_ut - 5)
+            warp_to(conn, entry_ut - 5)
             time.sleep(5)
 
     ####
@@ -237,49 +314,61 @@ def vertical_landing(
     vessel.control.rcs = use_rcs_on_landing
 
     # warp for burn
-    last_ut = ut()
-    while True:
-        a100 = available_thrust() / mass()
-        lower_bound = vessel.bounding_box(vessel.surface_reference_frame)[0][0]
+    set_phase(conn, "vertical_landing: burn wait")
+    last_ut = telemetry.snapshot().ut
+    burn_wait_loop = FixedRateLoop(conn, COASTING_RATE, "burn wait")
+    for _ in burn_wait_loop.ticks():
+        t = telemetry.snapshot()
+        a100 = t.available_thrust / t.mass
+        geometry = vessel_geometry(conn, vessel)
+        lower_bound = geometry.lower_bound(t.direction[0])
 
         landing_radius = equatorial_radius + lower_bound
-        landing_altitude = altitude() + lower_bound
+        landing_altitude = t.altitude + lower_bound
         if guided_landing:
-            landing_radius = max(
-                landing_radius,
-                landing_radius + body.surface_height(target_lat, target_lon),
-            )
+            landing_radius = max(landing_radius, landing_radius + target_height)
             landing_altitude = max(
-                landing_altitude,
-                landing_altitude + body.surface_height(target_lat, target_lon),
+                landing_altitude, landing_altitude + target_height
             )
 
         impact_ut, terminal_speed = impact_prediction(
-            radius(),
+            t.radius,
             landing_altitude,
-            vertical_speed(),
-            horizontal_speed(),
+            t.vertical_speed,
+            t.horizontal_speed,
             surface_gravity,
-            ut(),
+            t.ut,
         )
+        if impact_ut is None and not has_atmosphere:
+            # skimming the ground at orbital speed, a flat fall never lands
+            # but the orbit does
+            impact_ut, terminal_speed = time_to_radius(
+                current_orbit(t), landing_radius, t.ut
+            )
+        if impact_ut is None:
+            dialog.status_update("Wait for the fall: no impact predicted")
+            last_ut = t.ut
+            continue
         burn_time = burn_prediction(terminal_speed, a100)
-        burn_lead_time = impact_ut - burn_time - ut()
+        burn_lead_time = impact_ut - burn_time - t.ut
 
-        if burn_lead_time and burn_lead_time > (ut() - last_ut) * 1.5 + 2:
+        if burn_lead_time and burn_lead_time > (t.ut - last_ut) * 1.5 + 2:
             if not has_atmosphere and burn_lead_time > 30:
                 dialog.status_update(
                     f"Warp for decereration burn - 30sec: {burn_lead_time: 5.3f}"
                 )
-                conn.space_center.warp_to(ut() + burn_lead_time - 30)
-                time.sleep(5)
+                # the warp is not a tick overrun of the loop
+                with burn_wait_loop.paused():
+                    warp_to(conn, t.ut + burn_lead_time - 30)
+                    time.sleep(5)
             else:
                 dialog.status_update(
-                    f"Wait for decereration burn: {burn_lead_time: 5.3f} sec; ut: {ut(): 5.3f}"
+                    f"Wait for decereration burn: {burn_lead_time: 5.3f} sec; ut: {t.ut: 5.3f}"
                 )
         else:
             break
-        last_ut = ut()
-        time.sleep(0.1)
+        last_ut = t.ut
+    dialog.status_update(burn_wait_loop.stats.summary())
 
     # on decent: deploy leg, retract panel
     if deploy_legs_on_decent:
@@ -292,33 +381,46 @@ def vertical_landing(
         kill_horizontal_velocity(conn, use_sas)
 
     # Main decent loop
+    set_phase(conn, "vertical_landing: descent")
+    telemetry.rate = TERMINAL_RATE
     last_sas_mode = vessel.control.sas_mode
-    while True:
-        a100 = available_thrust() / mass()
-        bounding_box = vessel.bounding_box(vessel.surface_reference_frame)
-        lower_bound = bounding_box[0][0]
-
-        landing_radius = mean_altitude() + lower_bound
-        landing_altitude = altitude() + lower_bound
+    # the server fires the touchdown event, its callback cuts the throttle
+    # on the stream thread
+    touchdown = touchdown_event(
+        conn, vessel, vessel_geometry(conn, vessel).legs
+    )
+    touchdown.add_callback(lambda: setattr(vessel.control, "throttle", 0))
+    descent_loop = FixedRateLoop(conn, TERMINAL_RATE, "descent")
+    for _ in descent_loop.ticks():
+        t = telemetry.snapshot()
+        a100 = t.available_thrust / t.mass
+        geometry = vessel_geometry(conn, vessel)
+        lower_bound = geometry.lower_bound(t.direction[0])
+
+        landing_radius = t.mean_altitude + lower_bound
+        landing_altitude = t.altitude + lower_bound
         impact_ut, terminal_speed = impact_prediction(
-            radius(),
+            t.radius,
             landing_altitude,
-            vertical_speed(),
-            horizontal_speed(),
+            t.vertical_speed,
+            t.horizontal_speed,
             surface_gravity,
-            ut(),
+            t.ut,
         )
-        burn_time = burn_prediction(terminal_speed, a100)
-        burn_lead_time = impact_ut - burn_time - ut()
+        # no impact on the ground or while still skimming it, show NaN
+        landing_in = burn_lead_time = math.nan
+        if impact_ut is not None:
+            landing_in = impact_ut - t.ut
+            burn_lead_time = landing_in - burn_prediction(terminal_speed, a100)
 
         dialog.status_update(
-            f"Alt: {altitude(): 5.3f}, Speed {speed(): 5.3f} m/s (H: {horizontal_speed(): 5.3f}, V: {vertical_speed(): 5.3f}), "
+            f"Alt: {t.altitude: 5.3f}, Speed {t.speed: 5.3f} m/s (H: {t.horizontal_speed: 5.3f}, V: {t.vertical_speed: 5.3f}), "
             f"a: {a100: 5.3f}, g: {surface_gravity: 5.3f}, "
-            f"landing in: {impact_ut - ut(): 5.3f} sec, burn lead time: {burn_lead_time: 5.3f} sec"
+            f"landing in: {landing_in: 5.3f} sec, burn lead time: {burn_lead_time: 5.3f} sec"
         )
 
         if use_sas:
-            if horizontal_speed() > 0.5 and speed() > 1.0:
+            if t.horizontal_speed > 0.5 and t.speed > 1.0:
                 if last_sas_mode != vessel.control.sas_mode.retrograde:
                     vessel.control.sas_mode = vessel.control.sas_mode.retrograde
                     last_sas_mode = vessel.control.sas_mode.retrograde
@@ -333,18 +435,23 @@ def vertical_landing(
             0,
             min(
                 1.0,
-                (-vertical_speed() + surface_gravity - landing_speed) / a100,
+                (-t.vertical_speed + surface_gravity - landing_speed) / a100,
             ),
         )
-        vessel.control.throttle = throttle
-
-        if is_grounded(vessel):
+        if touchdown.is_set():
             vessel.control.sas_mode.radial
             vessel.control.throttle = 0
             break
+        vessel.control.throttle = throttle
+        # the callback may have run before this write, cut the throttle again
+        if touchdown.is_set():
+            vessel.control.throttle = 0
+            break
 
-        last_ut = ut()
+        last_ut = t.ut
 
+    touchdown.remove()
+    dialog.status_update(descent_loop.stats.summary())
     dialog.status_update("Landed")
 
     # keep sas on for a bit to maintain landing stability
@@ -356,8 +463,9 @@ def vertical_landing(
         vessel.auto_pilot.disengage()
 
     if auto_stage:
-        unset_autostaging()
+        unset_autostaging(vessel)
 
+    telemetry.close()
     return
 
 
@@ -372,41 +480,27 @@ def speed_prediction(
     )
 
 
-def time_to_radius(orbit: Orbit, radius: float, ut: float):
+def time_to_radius(orbit: Union[Orbit, KeplerOrbit], radius: float, ut: float):
     """time to radius
 
-    Extended description of function.
+    Solved locally by KeplerOrbit.time_to_radius, a kRPC orbit costs one
+    read of its elements.
 
     Args:
-        orbit: current orbit
+        orbit: current orbit, KeplerOrbit or kRPC orbit
         radius: target radius
+        ut: current ut
 
     Returns:
-        return None if not impact
+        return (None, None) if not impact
         return (time_ut, orbital speed at radius)
     """
-
-    # radius is not achived
-    if radius < orbit.periapsis or (
-        orbit.eccentricity < 1 and radius > orbit.apoapsis
-    ):
+    if not isinstance(orbit, KeplerOrbit):
+        orbit = KeplerOrbit.from_krpc_orbit(orbit)
+    time_ut, speed = orbit.time_to_radius(radius, ut)
+    if math.isnan(time_ut):
         return None, None
-
-    true_anomary1 = orbit.true_anomaly_at_radius(radius)
-    true_anomary2 = 2 * math.pi - true_anomary1
-    time1 = orbit.ut_at_true_anomaly(true_anomary1)
-    time2 = orbit.ut_at_true_anomaly(true_anomary2)
-
-    # KSP GetUTforTrueAnomaly may have a bug?
-    while time1 - orbit.period > ut:
-        time1 = time1 - orbit.period
-    while time2 - orbit.period > ut:
-        time2 = time2 - orbit.period
-
-    if time2 < time1:
-        return time2, orbit.orbital_speed_at(time2 - ut)
-    else:
-        return time1, orbit.orbital_speed_at(time1 - ut)
+    return time_ut, speed
 
 
 def impact_prediction(
@@ -474,30 +568,55 @@ def burn_prediction(delta_v: float, acceleration: float):
 
 
 def landing_target_steering(
-    vessel: Vessel, target_lat: float, target_lon: float, ut: float
+    vessel: Vessel,
+    target_lat: float,
+    target_lon: float,
+    ut: float,
+    body_info: Optional[BodyInfo] = None,
+    target_height: float = 0.0,
 ) -> (float, float, float):
-    br = vessel.orbit.body.equatorial_radius
-    bref = vessel.orbit.body.reference_frame
-    brotate = vessel.orbit.body.rotational_speed
-
-    current_pos = vessel.position(bref)
-    target_pos = vessel.orbit.body.surface_position(
-        target_lat, target_lon, bref
-    )
+    """Steering toward a landing target
 
-    landing_time, terminal_speed = time_to_radius(vessel.orbit, br, ut)
-    landing_pos = vessel.orbit.position_at(landing_time, bref)
-    land_lat, land_lon = latlon(landing_pos)
-    land_lon = clamp_2pi(land_lon + brotate * (landing_time - ut)) - math.pi
+    Reads the state vectors of the vessel once, and predicts the landing
+    locally, see ImpactPredictor.
 
-    bearing = bearing_between_coords(land_lat, land_lon, target_lat, target_lon)
-    distance = np.linalg.norm(np.subtract(current_pos, landing_pos))
-    error = np.linalg.norm(np.subtract(target_pos, landing_pos))
+    Args:
+        vessel: vessel
+        target_lat: latitude of the target
+        target_lon: longitude of the target
+        ut: current ut
+        body_info: catalog entry of the body, saves reading its constants
+            over RPC on every call
+        target_height: terrain height at the target
 
-    return bearing, distance, error
+    Returns:
+        return (bearing to target, distance to landing, landing error)
+    """
+    body = vessel.orbit.body
+    if body_info is None:
+        body_info = BodyInfo(
+            body.name,
+            None,
+            [],
+            body.gravitational_parameter,
+            body.equatorial_radius,
+            body.surface_gravity,
+            body.rotational_period,
+            body.rotational_speed,
+            body.initial_rotation,
+            body.sphere_of_influence,
+            body.has_atmosphere,
+            body.atmosphere_depth,
+        )
+    bref = body.reference_frame
+    prediction = ImpactPredictor(
+        body_info, target_lat, target_lon, target_height
+    ).predict(vessel.position(bref), vessel.velocity(bref), ut)
+    return prediction.bearing, prediction.distance, prediction.error
 
 
 def kill_horizontal_velocity(conn: Client, use_sas: bool = True):
+    set_phase(conn, "kill_horizontal_velocity")
     vessel = conn.space_center.active_vessel
 
     # Set up dialog and stream
@@ -507,54 +626,63 @@ def kill_horizontal_velocity(conn: Client, use_sas: bool = True):
         rotation=vessel.surface_reference_frame,
     )
     flight = vessel.flight(ref_frame)
-    mass = conn.add_stream(getattr, vessel, "mass")
-    available_thrust = conn.add_stream(getattr, vessel, "available_thrust")
-    altitude = conn.add_stream(getattr, flight, "surface_altitude")
-    speed = conn.add_stream(getattr, flight, "speed")
-    vertical_speed = conn.add_stream(getattr, flight, "vertical_speed")
-    horizontal_speed = conn.add_stream(getattr, flight, "horizontal_speed")
+    telemetry = Telemetry(
+        conn,
+        rate=TERMINAL_RATE,
+        mass=(getattr, vessel, "mass"),
+        available_thrust=(getattr, vessel, "available_thrust"),
+        altitude=(getattr, flight, "surface_altitude"),
+        speed=(getattr, flight, "speed"),
+        vertical_speed=(getattr, flight, "vertical_speed"),
+        horizontal_speed=(getattr, flight, "horizontal_speed"),
+    )
 
     dialog.status_update("kill horizontal velocity")
 
     if use_sas:
         vessel.control.sas = True
         vessel.control.sas_mode = vessel.control.sas_mode.retrograde
-        while (
-            angle_between(
-                vessel.flight(
-                    vessel.surface_velocity_reference_frame
-                ).direction,
-                (0, -1, 0),
-            )
-            > 5 / 180 * math.pi
-        ):
-            time.sleep(0.1)
+        wait_until_pointing_error_below(
+            conn,
+            vessel.flight(vessel.surface_velocity_reference_frame),
+            (0, -1, 0),
+            5 / 180 * math.pi,
+        )
     else:
         vessel.auto_pilot.engage()
         vessel.auto_pilot.reference_frame = (
             vessel.surface_velocity_reference_frame
         )
         vessel.auto_pilot.target_direction = (0, -1, 0)
-        vessel.auto_pilot.wait()
+        wait_until_pointing_error_below(
+            conn,
+            vessel.flight(vessel.surface_velocity_reference_frame),
+            (0, -1, 0),
+            5 / 180 * math.pi,
+        )
 
-    while True:
-        a100 = available_thrust() / mass()
+    for _ in FixedRateLoop(conn, TERMINAL_RATE, "kill horizontal").ticks():
+        t = telemetry.snapshot()
+        a100 = t.available_thrust / t.mass
         dialog.status_update(
-            f"kill horizontal velocity: Alt: {altitude(): 5.3f}, Speed {speed(): 5.3f} m/s (H: {horizontal_speed(): 5.3f}, V: {vertical_speed(): 5.3f})"
+            f"kill horizontal velocity: Alt: {t.altitude: 5.3f}, Speed {t.speed: 5.3f} m/s (H: {t.horizontal_speed: 5.3f}, V: {t.vertical_speed: 5.3f})"
         )
-        if horizontal_speed() > 0.1:
-            vessel.control.throttle = max(0, min(1.0, speed() / a100))
+        if t.horizontal_speed > 0.1:
+            vessel.control.throttle = max(0, min(1.0, t.speed / a100))
         else:
             vessel.control.throttle = 0
             break
 
+    telemetry.close()
+
 
 def retract_panels(conn: Client):
     vessel = conn.space_center.active_vessel
     dialog = StatusDialog(conn)
 
     dialog.status_update("Retract solar/radiator panels")
-    for panel in vessel.parts.solar_panels + vessel.parts.radiators:
+    geometry = vessel_geometry(conn, vessel)
+    for panel in geometry.solar_panels + geometry.radiators:
         if panel.deployable:
             panel.deployed = False
 
@@ -564,13 +692,15 @@ def deploy_legs(conn: Client):
     dialog = StatusDialog(conn)
 
     dialog.status_update("Deploy legs")
-    for leg in vessel.parts.legs:
+    for leg in vessel_geometry(conn, vessel).legs:
         if leg.deployable:
             leg.deployed = True
 
 
-def is_grounded(vessel: Vessel):
-    return max([False] + [l.is_grounded for l in vessel.parts.legs])
+def is_grounded(vessel: Vessel, legs: Optional[list] = None):
+    if legs is None:
+        legs = vessel.parts.legs
+    return max([False] + [l.is_grounded for l in legs])
 
 
 if __name__ == "__main__":
@@ -579,6 +709,7 @@ if __name__ == "__main__":
 
     krpc_address = os.environ["KRPC_ADDRESS"]
     con = krpc.connect(name="Landing", address=krpc_address)
+    profile_from_env(con)
     vertical_landing(
         con, target_lat=-0.09, target_lon=-75.557, use_rcs_on_entry=True
     )
@@ -3,13 +3,25 @@ import time
 
 from krpc.client import Client
 from scripts.utils.autostage import set_autostaging, unset_autostaging
+from scripts.utils.control_loop import FixedRateLoop
+from scripts.utils.rpc_profiler import profile_from_env, set_phase
 from scripts.utils.status_dialog import StatusDialog
-from scripts.utils.utils import angle_between
+from scripts.utils.stream_registry import StreamScope
+from scripts.utils.wait import (
+    wait_until_pointing_error_below,
+    wait_until_ut,
+    warp_to,
+)
+
+
+# burn control loop rate (Hz)
+BURN_RATE = 50
 
 
 def execute_next_node(
     conn: Client, auto_stage: bool = True, stop_stage: int = 0
 ) -> None:
+    set_phase(conn, "execute_next_node: setup")
     vessel = conn.space_center.active_vessel
     nodes = vessel.control.nodes
 
@@ -29,14 +41,12 @@ def execute_next_node(
 
     # setup dialog and streams
     dialog = StatusDialog(conn)
-    ut = conn.add_stream(getattr, conn.space_center, "ut")
-    direction = conn.add_stream(
-        getattr, vessel.flight(node.reference_frame), "direction"
-    )
+    streams = StreamScope(conn)
+    node_flight = vessel.flight(node.reference_frame)
 
     # setup autostaging
     if auto_stage:
-        set_autostaging(conn, stop_stage=stop_stage)
+        set_autostaging(conn, stop_stage=stop_stage, vessel=vessel)
 
     # Calculate burn time (using rocket equation)
     F = vessel.available_thrust
@@ -47,42 +57,49 @@ def execute_next_node(
     burn_time = (m0 - m1) / flow_rate
 
     # Orientate ship
+    set_phase(conn, "execute_next_node: orientate")
     dialog.status_update("Orientating ship for next burn")
     if use_sas:
         vessel.control.sas = True
         vessel.control.sas_mode = vessel.control.sas_mode.maneuver
-        while angle_between(direction(), (0, 1, 0)) > 0.5 / 180 * math.pi:
-            time.sleep(0.1)
+        wait_until_pointing_error_below(
+            conn, node_flight, (0, 1, 0), 0.5 / 180 * math.pi
+        )
     else:
         vessel.auto_pilot.engage()
         vessel.auto_pilot.reference_frame = node.reference_frame
         vessel.auto_pilot.target_direction = (0, 1, 0)
-        while angle_between(direction(), (0, 1, 0)) > 1 / 180 * math.pi:
-            time.sleep(0.1)
+        wait_until_pointing_error_below(
+            conn, node_flight, (0, 1, 0), 1 / 180 * math.pi
+        )
 
     # Wait until burn
+    set_phase(conn, "execute_next_node: wait")
     dialog.status_update("Waiting until burn time")
     burn_ut = node.ut - (burn_time / 2.0)
     lead_time = 5
-    conn.space_center.warp_to(burn_ut - lead_time)
+    warp_to(conn, burn_ut - lead_time)
 
     # Execute burn
+    set_phase(conn, "execute_next_node: burn")
     dialog.status_update("Ready to execute burn")
-    while burn_ut - ut() > 0:
-        pass
+    wait_until_ut(conn, burn_ut)
     dialog.status_update("Executing burn")
     vessel.control.throttle = 1.0
 
-    remaining_delta_v = conn.add_stream(getattr, node, "remaining_delta_v")
+    remaining_delta_v = streams.add_stream(getattr, node, "remaining_delta_v")
+    remaining_delta_v.rate = BURN_RATE
     min_delta_v = remaining_delta_v()
 
     state_fine_tuning = False
     point_passed = False
-    while remaining_delta_v() > 0.1 and not point_passed:
+    burn_loop = FixedRateLoop(conn, BURN_RATE, "burn")
+    for _ in burn_loop.ticks():
+        if remaining_delta_v() <= 0.1 or point_passed:
+            break
         a100 = vessel.available_thrust / vessel.mass
         if a100 == 0:
             if auto_stage:
-                time.sleep(0.05)
                 continue
             else:
                 break
@@ -98,10 +115,11 @@ def execute_next_node(
             min_delta_v = remaining_delta_v()
         pass
     vessel.control.throttle = 0.0
-    remaining_delta_v.remove()
+    streams.close()
+    dialog.status_update(burn_loop.stats.summary())
     node.remove()
     if auto_stage:
-        unset_autostaging()
+        unset_autostaging(vessel)
 
     vessel.control.sas = True
     time.sleep(1)
@@ -117,4 +135,5 @@ if __name__ == "__main__":
 
     krpc_address = os.environ["KRPC_ADDRESS"]
     conn = krpc.connect(name="execute node", address=krpc_address)
+    profile_from_env(conn)
     execute_next_node(conn)
@@ -1,9 +1,13 @@
-import math
 from math import pi
 from typing import NewType, Union
 
+import numpy as np
 from krpc.client import Client
+from scripts.utils.body_catalog import body_catalog
 from scripts.utils.execute_node import execute_next_node
+from scripts.utils.kepler import ArrayLike, KeplerOrbit
+from scripts.utils.lambert import transfer_porkchop
+from scripts.utils.rpc_profiler import profile_from_env, set_phase
 from scripts.utils.status_dialog import StatusDialog
 from scripts.utils.utils import clamp_2pi
 
@@ -45,83 +49,137 @@ def orbital_progress(vessel: Vessel, ut: float) -> float:
     return clamp_2pi(lan + arg_p + ma_ut)
 
 
+def _wrap_pi(angle: ArrayLike) -> ArrayLike:
+    """wrap radians into [-pi, pi)"""
+    return np.mod(angle + pi, 2 * pi) - pi
+
+
 def time_to_hohmann_transfer_at_phase_angle(
     vessel: Vessel, target: Union[Vessel, Body], ut: float, phase_angle: float
 ) -> float:
     """
-    Performs an iterative search for the next time vessel and target have the given relative phase_angle after ut
+    Returns the next time after ut at which a hohmann transfer with the given phase_angle starts
 
-    Extended description of function.
+    The target must lead the vessel by pi - phase_angle at departure, so
+    that it has moved by phase_angle when the vessel arrives half an orbit
+    later. The relative phase changes at the difference of the mean
+    motions, which gives the time in closed form for circular orbits.
+    Use transfer_windows for eccentric orbits.
 
     Args:
         vessel: vessel
         target: target vessel or target body
         ut: search start from this ut
-        phase_angle: resulting phase angle after hohmann transfer
+        phase_angle: angle the target moves during the transfer, see get_phase_angle
 
     Returns:
-        return time required for hohmann transfer
+        return ut of the transfer burn
     """
+    vo = KeplerOrbit.from_krpc_orbit(vessel.orbit)
+    to = KeplerOrbit.from_krpc_orbit(target.orbit)
+    error = (
+        to.true_longitude_at(ut) - vo.true_longitude_at(ut) - (pi - phase_angle)
+    )
+    rate = to.mean_motion - vo.mean_motion
+    if rate < 0:
+        return ut + float(np.mod(error, 2 * pi)) / -rate
+    return ut + float(np.mod(-error, 2 * pi)) / rate
 
-    # search near close phase_angle
-    min_time = ut
-    max_time = min_time + 1.5 * min(vessel.orbit.period, target.orbit.period)
-
-    num_divisions = 30
-    dt = (max_time - min_time) / num_divisions
-
-    v_pos = orbital_progress(vessel, ut)
-    t_pos = orbital_progress(target, ut)
-    angle_error = abs(t_pos - (v_pos - pi) - phase_angle)
-
-    last_angle_error = angle_error
-    min_abs_angle_error = abs(angle_error)
-    last_angle_error_t_sign = None
-
-    for i in range(1, num_divisions):
-        t = min_time + dt * i
 
-        v_pos = orbital_progress(vessel, ut)
-        t_pos = orbital_progress(target, ut)
-        angle_error = abs(t_pos - (v_pos - pi) - phase_angle)
+def transfer_time(
+    vessel_orbit: KeplerOrbit, target_orbit: KeplerOrbit, ut: ArrayLike
+) -> ArrayLike:
+    """
+    Returns time of flight of hohmann transfers starting at ut
 
-        angle_error_t_sign = math.copysign(1, angle_error - last_angle_error)
-        last_angle_error = angle_error
+    The transfer orbit reaches from the vessel radius at ut to the radius
+    of the target orbit on the opposite side, orbits taken as coplanar.
 
-        abs_angle_error = abs(angle_error)
+    Args:
+        vessel_orbit: orbit of the vessel
+        target_orbit: orbit of the target, around the same body
+        ut: departure ut, scalar or array
 
-        if (
-            abs_angle_error < pi / 2
-            and last_angle_error_t_sign
-            and last_angle_error_t_sign != angle_error_t_sign
-        ):
-            angle_error_t_sign = last_angle_error_t_sign
-            break
+    Returns:
+        return half period of the transfer orbits
+    """
+    r1 = vessel_orbit.radius_at(ut)
+    r2 = target_orbit.radius_at_true_longitude(
+        vessel_orbit.true_longitude_at(ut) + pi
+    )
+    semi_major_axis = (r1 + r2) / 2
+    return pi * np.sqrt(
+        semi_major_axis ** 3 / vessel_orbit.gravitational_parameter
+    )
 
-        if abs_angle_error < min_abs_angle_error:
-            min_abs_angle_error = abs_angle_error
 
-            min_time = t - dt
-            max_time = t + dt
+def _window_error(
+    vessel_orbit: KeplerOrbit, target_orbit: KeplerOrbit, ut: ArrayLike
+) -> ArrayLike:
+    """angle from the transfer arrival point to the target at arrival"""
+    arrival = ut + transfer_time(vessel_orbit, target_orbit, ut)
+    return _wrap_pi(
+        target_orbit.true_longitude_at(arrival)
+        - vessel_orbit.true_longitude_at(ut)
+        - pi
+    )
 
-        last_angle_error_t_sign = angle_error_t_sign
 
-    while max_time - min_time > 0.01:
-        t = (max_time + min_time) / 2
+def transfer_windows(
+    vessel_orbit: KeplerOrbit,
+    target_orbit: KeplerOrbit,
+    ut: float,
+    count: int = 1,
+    samples: int = 64,
+) -> np.ndarray:
+    """
+    Returns the next hohmann transfer windows after ut
 
-        v_pos = orbital_progress(vessel, ut)
-        t_pos = orbital_progress(target, ut)
-        angle_error = abs(t_pos - (v_pos - pi) - phase_angle)
+    A window opens when the target reaches the arrival point, half a
+    transfer orbit ahead of the vessel, at the end of the transfer. True
+    longitudes and the transfer time are evaluated for every departure
+    time of a grid at once, spanning count + 1 synodic periods with
+    samples points per period of the faster motion, then each bracketed
+    window is refined by bisection. Eccentric orbits are supported, the
+    orbits being taken as coplanar.
 
-        if math.copysign(1, angle_error) == angle_error_t_sign:
-            max_time = t
-        else:
-            min_time = t
+    Args:
+        vessel_orbit: orbit of the vessel
+        target_orbit: orbit of the target, around the same body
+        ut: search start from this ut
+        count: number of windows
+        samples: grid points per orbit or synodic period, whichever is shortest
 
-        last_angle_error = angle_error
+    Returns:
+        return (count,) array of departure ut, fewer if not found
+    """
+    if vessel_orbit.is_hyperbolic or target_orbit.is_hyperbolic:
+        raise ValueError("transfer windows need elliptic orbits")
+    relative_motion = abs(vessel_orbit.mean_motion - target_orbit.mean_motion)
+    if relative_motion < 1e-12:
+        raise ValueError("orbits have the same period, no transfer window")
+    synodic_period = 2 * pi / relative_motion
+    step = (
+        min(synodic_period, vessel_orbit.period, target_orbit.period) / samples
+    )
+    times = ut + np.arange(0.0, (count + 1) * synodic_period + step, step)
+    errors = _window_error(vessel_orbit, target_orbit, times)
 
-    t = (max_time + min_time) / 2
-    return t
+    # sign changes of the error, leaving out its wrap around +-pi
+    crossing = (np.signbit(errors[:-1]) != np.signbit(errors[1:])) & (
+        np.abs(errors[:-1] - errors[1:]) < pi
+    )
+    low = times[:-1][crossing][:count]
+    high = times[1:][crossing][:count]
+    low_errors = errors[:-1][crossing][:count]
+    while len(low) and np.max(high - low) > 1e-3:
+        middle = (low + high) / 2
+        middle_errors = _window_error(vessel_orbit, target_orbit, middle)
+        same = np.signbit(middle_errors) == np.signbit(low_errors)
+        low = np.where(same, middle, low)
+        low_errors = np.where(same, middle_errors, low_errors)
+        high = np.where(same, high, middle)
+    return (low + high) / 2
 
 
 def hohmann_transfer(
@@ -154,6 +212,47 @@ def hohmann_transfer(
     return vessel.control.add_node(node_ut, prograde=dv)
 
 
+def report_transfer_window(
+    conn: Client, vessel: Vessel, target: Body, dialog: StatusDialog
+) -> bool:
+    """
+    Report the cheapest transfer window from the vessel's body to a target body
+
+    Evaluates a porkchop between the bodies, which must orbit the same
+    parent, taking the vessel orbit as circular parking orbit.
+
+    Args:
+        conn: kRPC connection
+        vessel: vessel
+        target: target body, orbiting the parent of the vessel's body
+        dialog: status dialog
+
+    Returns:
+        return True if reported, False if the target cannot be reached
+    """
+    catalog = body_catalog(conn)
+    origin = catalog[vessel.orbit.body.name]
+    destination = catalog[target.name]
+    if origin.parent is None or origin.parent != destination.parent:
+        return False
+
+    ut = conn.space_center.ut
+    parking_altitude = vessel.orbit.semi_major_axis - origin.equatorial_radius
+    departure_ut, arrival_ut, delta_v = transfer_porkchop(
+        catalog,
+        origin.name,
+        destination.name,
+        ut,
+        size=200,
+        parking_altitude=parking_altitude,
+    ).best()
+    dialog.status_update(
+        f"transfer window to {destination.name}: depart in {departure_ut - ut: .0f} sec, "
+        f"flight time {arrival_ut - departure_ut: .0f} sec, ejection dv {delta_v: 5.1f} m/s"
+    )
+    return True
+
+
 def hohmann_transfer_to_target(conn: Client) -> None:
     """send active vessel into hohmann transfer orbit to the target.
 
@@ -165,11 +264,9 @@ def hohmann_transfer_to_target(conn: Client) -> None:
     Returns:
         return nothing, return when procedure finished
     """
+    set_phase(conn, "hohmann_transfer_to_target: planning")
     vessel = conn.space_center.active_vessel
 
-    # setup stream
-    ut = conn.add_stream(getattr, conn.space_center, "ut")
-
     # Set up dialog
     dialog = StatusDialog(conn)
     dialog.status_update("calculating hohmann transfer orbit to target")
@@ -188,13 +285,20 @@ def hohmann_transfer_to_target(conn: Client) -> None:
 
     # check if vessel and target is orbiting of same body
     if vessel.orbit.body != target.orbit.body:
+        # interplanetary: no node yet, report the best window
+        if conn.space_center.target_body:
+            report_transfer_window(conn, vessel, target, dialog)
         return
 
-    phase_angle = get_phase_angle(vessel, target)
-    transfer_time = time_to_hohmann_transfer_at_phase_angle(
-        vessel, target, ut(), phase_angle
+    windows = transfer_windows(
+        KeplerOrbit.from_krpc_orbit(vessel.orbit),
+        KeplerOrbit.from_krpc_orbit(target.orbit),
+        conn.space_center.ut,
     )
-    hohmann_transfer(vessel, target, transfer_time)
+    if not len(windows):
+        dialog.status_update("no transfer window found to the target")
+        return
+    hohmann_transfer(vessel, target, float(windows[0]))
 
     execute_next_node(conn)
 
@@ -205,4 +309,5 @@ if __name__ == "__main__":
 
     krpc_address = os.environ["KRPC_ADDRESS"]
     conn = krpc.connect(name="hohman transfer", address=krpc_address)
+    profile_from_env(conn)
     hohmann_transfer_to_target(conn)
@@ -0,0 +1,337 @@
+import math
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from scripts.utils.body_catalog import BodyInfo
+from scripts.utils.terrain_cache import TerrainCache
+from scripts.utils.trajectory import (
+    AtmosphereTable,
+    Impact,
+    TrajectoryModel,
+    predict_impact,
+    predict_impacts,
+)
+from scripts.utils.utils import bearing_between_coords, latlon
+
+
+Vector = Tuple[float, float, float]
+
+# predictions refined against the terrain under the impact point, until
+# the ground radius moves less than TERRAIN_TOLERANCE meters
+TERRAIN_ITERATIONS = 3
+TERRAIN_TOLERANCE = 1.0
+
+
+class LandingPrediction(NamedTuple):
+    """Where an unpowered vessel lands, relative to a target
+
+    Attributes:
+        ut: ut of landing, None if the vessel does not land
+        latitude: latitude of the landing point in degree
+        longitude: longitude of the landing point in degree
+        speed: surface speed at landing
+        bearing: bearing from the landing point to the target in degree
+        distance: distance from the vessel to the landing point
+        error: distance from the landing point to the target
+        slope: terrain slope at the landing point in degree, NaN if unknown
+    """
+
+    ut: Optional[float]
+    latitude: float
+    longitude: float
+    speed: float
+    bearing: float
+    distance: float
+    error: float
+    slope: float = math.nan
+
+
+def surface_vector(body: BodyInfo, lat: float, lon: float, height: float):
+    """position of a surface point in the body reference frame"""
+    lat = math.radians(lat)
+    lon = math.radians(lon)
+    radius = body.equatorial_radius + height
+    return (
+        radius * math.cos(lat) * math.cos(lon),
+        radius * math.sin(lat),
+        radius * math.cos(lat) * math.sin(lon),
+    )
+
+
+def _surface_axes(position: Vector) -> Tuple[np.ndarray, ...]:
+    """up, north and east unit vectors at a position"""
+    up = np.asarray(position, dtype=float)
+    up = up / np.linalg.norm(up)
+    # the surface turns toward east, w * (-z, 0, x) in kRPC frames
+    east = np.array((-up[2], 0.0, up[0]))
+    east = east / np.linalg.norm(east)
+    north = np.cross(east, up)
+    north = north if north[1] >= 0 else -north
+    return up, north, east
+
+
+def retrograde_heading(position: Vector, velocity: Vector) -> float:
+    """Return heading opposite to the surface velocity in degree
+
+    Args:
+        position: position in the body reference frame
+        velocity: velocity in the body reference frame
+
+    Returns:
+        return heading in degree, clockwise from north
+    """
+    _, north, east = _surface_axes(position)
+    velocity = np.asarray(velocity, dtype=float)
+    heading = math.degrees(math.atan2(-velocity @ east, -velocity @ north))
+    return heading % 360.0
+
+
+def horizontal_directions(
+    position: Vector, headings: np.ndarray, pitch: float = 0.0
+) -> np.ndarray:
+    """Return unit vectors of headings at a position
+
+    Args:
+        position: position in the body reference frame
+        headings: (N,) headings in degree, clockwise from north
+        pitch: pitch above the horizon in degree
+
+    Returns:
+        return (N, 3) directions in the body reference frame
+    """
+    up, north, east = _surface_axes(position)
+    headings = np.radians(np.asarray(headings, dtype=float))[:, np.newaxis]
+    pitch = math.radians(pitch)
+    horizontal = np.cos(headings) * north + np.sin(headings) * east
+    return math.cos(pitch) * horizontal + math.sin(pitch) * up
+
+
+class ImpactPredictor(object):
+    """Landing point of a vessel, predicted without RPC
+
+    Works from one state vector snapshot in the body reference frame, i.e.
+    vessel.position and vessel.velocity in body.reference_frame, and the
+    cached constants of the body. The trajectory is integrated in the
+    rotating frame of the body, so the landing coordinates account for
+    the body turning under the vessel during the fall.
+
+    With a TerrainCache, predict() lands the vessel on the cached terrain
+    under the predicted impact point instead of the sphere at the target
+    height, and reports the slope there. Terrain outside cached tiles is
+    taken at the target height, so predictions never make RPC.
+
+    Usage:
+        predictor = ImpactPredictor(body_info, target_lat, target_lon)
+        prediction = predictor.predict(position, velocity, ut)
+        misses = predictor.candidate_errors(position, velocity, ut, delta_vs)
+    """
+
+    def __init__(
+        self,
+        body: BodyInfo,
+        target_lat: float,
+        target_lon: float,
+        target_height: float = 0.0,
+        atmosphere: Optional[AtmosphereTable] = None,
+        drag_area: float = 0.0,
+        mass: float = 1.0,
+        terrain: Optional[TerrainCache] = None,
+    ):
+        self.body = body
+        self.target_lat = target_lat
+        self.target_lon = target_lon
+        self.target_height = target_height
+        self.target_position = surface_vector(
+            body, target_lat, target_lon, target_height
+        )
+        self.model = TrajectoryModel.for_body(body, atmosphere, drag_area, mass)
+        self.terrain = terrain
+
+    def _landing_radius(self, landing_radius: Optional[float]) -> float:
+        if landing_radius is None:
+            return self.body.equatorial_radius + self.target_height
+        return landing_radius
+
+    def _terrain_impact(
+        self,
+        position: Vector,
+        velocity: Vector,
+        ut: float,
+        landing_radius: float,
+        impact: Impact,
+    ) -> Impact:
+        """move an impact on the sphere at the target height to the terrain"""
+        # the landing surface keeps its offset from the ground, e.g. the
+        # height of the vessel bottom
+        offset = landing_radius - self._landing_radius(None)
+        radius = landing_radius
+        for _ in range(TERRAIN_ITERATIONS):
+            height = self.terrain.height(
+                impact.latitude, impact.longitude, sample=False
+            )
+            if math.isnan(height):
+                break
+            ground = self.body.equatorial_radius + height + offset
+            if abs(ground - radius) < TERRAIN_TOLERANCE:
+                break
+            refined = predict_impact(self.model, position, velocity, ut, ground)
+            if refined is None:
+                break
+            radius, impact = ground, refined
+        return impact
+
+    def predict(
+        self,
+        position: Vector,
+        velocity: Vector,
+        ut: float,
+        landing_radius: Optional[float] = None,
+    ) -> LandingPrediction:
+        """Predict landing of the vessel
+
+        Args:
+            position: position in the body reference frame
+            velocity: velocity in the body reference frame
+            ut: ut of the state vectors
+            landing_radius: radius of the landing surface, the radius of
+                the target if None, taken relative to the terrain height
+                under the impact point with a terrain cache
+
+        Returns:
+            return LandingPrediction, whose ut is None and whose distance and
+            error are inf when the vessel does not land within an hour
+        """
+        landing_radius = self._landing_radius(landing_radius)
+        impact = predict_impact(
+            self.model, position, velocity, ut, landing_radius
+        )
+        if impact is not None and self.terrain is not None:
+            impact = self._terrain_impact(
+                position, velocity, ut, landing_radius, impact
+            )
+        if impact is None:
+            lat, lon = latlon(position)
+            bearing = bearing_between_coords(
+                lat, lon, self.target_lat, self.target_lon
+            )
+            return LandingPrediction(
+                None, lat, lon, math.nan, bearing, math.inf, math.inf
+            )
+        bearing = bearing_between_coords(
+            impact.latitude, impact.longitude, self.target_lat, self.target_lon
+        )
+        slope = math.nan
+        if self.terrain is not None:
+            slope = self.terrain.slope(
+                impact.latitude, impact.longitude, sample=False
+            )
+        return LandingPrediction(
+            impact.ut,
+            impact.latitude,
+            impact.longitude,
+            impact.speed,
+            bearing,
+            math.dist(position, impact.position),
+            math.dist(self.target_position, impact.position),
+            slope,
+        )
+
+    def candidate_errors(
+        self,
+        position: Vector,
+        velocity: Vector,
+        ut: float,
+        delta_vs: np.ndarray,
+        landing_radius: Optional[float] = None,
+        max_time: float = 3600.0,
+    ) -> np.ndarray:
+        """Predict landing errors of candidate burns in one pass
+
+        Each burn is taken as impulsive, changing the velocity by one row
+        of delta_vs, so that steering can compare burn directions.
+
+        Args:
+            position: position in the body reference frame
+            velocity: velocity in the body reference frame
+            ut: ut of the state vectors
+            delta_vs: (N, 3) velocity changes in the body reference frame
+            landing_radius: radius of the landing surface, the radius of
+                the target if None
+            max_time: seconds of flight after which a candidate does not
+                land
+
+        Returns:
+            return (N,) distances from the landing points to the target,
+            inf for candidates that do not land
+        """
+        delta_vs = np.asarray(delta_vs, dtype=float)
+        positions = np.broadcast_to(
+            np.asarray(position, dtype=float), delta_vs.shape
+        )
+        impacts = predict_impacts(
+            self.model,
+            positions,
+            np.asarray(velocity, dtype=float) + delta_vs,
+            ut,
+            self._landing_radius(landing_radius),
+            max_time,
+        )
+        errors = np.linalg.norm(
+            np.array(impacts.position).T - self.target_position, axis=1
+        )
+        return np.where(np.isnan(errors), math.inf, errors)
+
+    def best_heading(
+        self,
+        position: Vector,
+        velocity: Vector,
+        ut: float,
+        delta_v: float,
+        headings: int = 36,
+        landing_radius: Optional[float] = None,
+        max_time: float = 3600.0,
+    ) -> Optional[Tuple[float, float]]:
+        """Return the horizontal burn heading that best reduces the error
+
+        Evaluates headings evenly spread around the horizon in one batch,
+        and refines the best one by parabolic interpolation.
+
+        Args:
+            position: position in the body reference frame
+            velocity: velocity in the body reference frame
+            ut: ut of the state vectors
+            delta_v: velocity change of the candidate burns
+            headings: number of candidate headings
+            landing_radius: radius of the landing surface, the radius of
+                the target if None
+            max_time: seconds of flight after which a candidate does not
+                land, the search costs time proportional to it
+
+        Returns:
+            return (heading in degree, landing error after the burn), None
+            if no candidate lands within max_time
+        """
+        step = 360.0 / headings
+        candidates = np.arange(headings) * step
+        directions = horizontal_directions(position, candidates)
+        errors = self.candidate_errors(
+            position,
+            velocity,
+            ut,
+            delta_v * directions,
+            landing_radius,
+            max_time,
+        )
+        if not np.isfinite(errors).any():
+            return None
+        i = int(np.argmin(errors))
+        heading = candidates[i]
+        before, best, after = (
+            errors[i - 1],
+            errors[i],
+            errors[(i + 1) % headings],
+        )
+        curvature = before - 2 * best + after
+        if np.isfinite(curvature) and curvature > 0:
+            heading += step * 0.5 * (before - after) / curvature
+        return float(heading % 360.0), float(best)
@@ -0,0 +1,417 @@
+import math
+from typing import NewType, Tuple, Union
+
+import numpy as np
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Orbit = NewType("Orbit", object)
+
+ArrayLike = Union[float, np.ndarray]
+
+# eccentricity below which an orbit is taken as circular
+CIRCULAR_ECCENTRICITY = 1e-9
+
+
+def zup_to_krpc(vectors: np.ndarray) -> np.ndarray:
+    """Convert vectors from KSP "zup" orbit coordinates to kRPC coordinates
+
+    KSP computes orbits in a right-handed frame whose z axis points to the
+    north pole. kRPC reference frames are left-handed with the y axis
+    pointing to the north pole, so converting is a swap of the y and z axes
+    (the conversion is its own inverse).
+
+    Args:
+        vectors: (..., 3) array of vectors
+
+    Returns:
+        (..., 3) array of converted vectors
+    """
+    return np.asarray(vectors)[..., [0, 2, 1]]
+
+
+krpc_to_zup = zup_to_krpc
+
+
+def solve_kepler(
+    mean_anomaly: ArrayLike, eccentricity: float, tolerance: float = 1e-12
+) -> ArrayLike:
+    """Solve Kepler's equation for eccentric (or hyperbolic) anomaly
+
+    Solve M = E - e sin(E) for elliptic orbits,
+    or M = e sinh(H) - H for hyperbolic orbits, with Newton's method.
+
+    Args:
+        mean_anomaly: mean anomaly in radian, scalar or array
+        eccentricity: eccentricity of the orbit
+        tolerance: convergence tolerance in radian
+
+    Returns:
+        eccentric anomaly (or hyperbolic anomaly) in radian
+    """
+    M = np.asarray(mean_anomaly, dtype=float)
+    e = eccentricity
+
+    if e < 1:
+        M = np.mod(M + math.pi, 2 * math.pi) - math.pi
+        E = np.where(e > 0.8, math.pi * np.sign(M), M)
+        for _ in range(50):
+            delta = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+            E = E - delta
+            if np.all(np.abs(delta) < tolerance):
+                break
+    else:
+        E = np.arcsinh(M / e)
+        for _ in range(50):
+            delta = (e * np.sinh(E) - E - M) / (e * np.cosh(E) - 1)
+            E = E - delta
+            if np.all(np.abs(delta) < tolerance):
+                break
+
+    return E
+
+
+class KeplerOrbit(object):
+    """Two-body orbit propagated locally from orbital elements
+
+    Orbital elements are read from kRPC once, then position and velocity
+    at any ut are computed in-process without further round trips.
+    Vectors are returned in the non-rotating reference frame of the
+    orbiting body (body.non_rotating_reference_frame).
+    Elements follow KSP conventions, angles are in radian and
+    semi_major_axis is negative for hyperbolic orbits.
+    """
+
+    def __init__(
+        self,
+        gravitational_parameter: float,
+        semi_major_axis: float,
+        eccentricity: float,
+        inclination: float,
+        longitude_of_ascending_node: float,
+        argument_of_periapsis: float,
+        mean_anomaly_at_epoch: float,
+        epoch: float,
+    ):
+        self.gravitational_parameter = gravitational_parameter
+        self.semi_major_axis = semi_major_axis
+        self.eccentricity = eccentricity
+        self.inclination = inclination
+        self.longitude_of_ascending_node = longitude_of_ascending_node
+        self.argument_of_periapsis = argument_of_periapsis
+        self.mean_anomaly_at_epoch = mean_anomaly_at_epoch
+        self.epoch = epoch
+
+        mu = gravitational_parameter
+        a = semi_major_axis
+        e = eccentricity
+        self.semi_latus_rectum = a * (1 - e * e)
+        self.mean_motion = math.sqrt(mu / abs(a) ** 3)
+
+        # perifocal unit vectors (periapsis and 90 degree ahead) in zup
+        cos_lan = math.cos(longitude_of_ascending_node)
+        sin_lan = math.sin(longitude_of_ascending_node)
+        cos_argp = math.cos(argument_of_periapsis)
+        sin_argp = math.sin(argument_of_periapsis)
+        cos_inc = math.cos(inclination)
+        sin_inc = math.sin(inclination)
+        self._p_vector = np.array(
+            (
+                cos_lan * cos_argp - sin_lan * sin_argp * cos_inc,
+                sin_lan * cos_argp + cos_lan * sin_argp * cos_inc,
+                sin_argp * sin_inc,
+            )
+        )
+        self._q_vector = np.array(
+            (
+                -cos_lan * sin_argp - sin_lan * cos_argp * cos_inc,
+                -sin_lan * sin_argp + cos_lan * cos_argp * cos_inc,
+                cos_argp * sin_inc,
+            )
+        )
+
+    @classmethod
+    def from_krpc_orbit(cls, orbit: Orbit) -> "KeplerOrbit":
+        """Create KeplerOrbit from kRPC orbit
+
+        Read the orbital elements of the orbit once, one RPC each (nine
+        round trips with the body and its gravitational parameter: the
+        kRPC client sends one call per request and has no batched read).
+        Every later query on the KeplerOrbit is local.
+
+        Args:
+            orbit: kRPC orbit object
+
+        Returns:
+            return KeplerOrbit
+        """
+        return cls(
+            orbit.body.gravitational_parameter,
+            orbit.semi_major_axis,
+            orbit.eccentricity,
+            orbit.inclination,
+            orbit.longitude_of_ascending_node,
+            orbit.argument_of_periapsis,
+            orbit.mean_anomaly_at_epoch,
+            orbit.epoch,
+        )
+
+    @classmethod
+    def from_state_vectors(
+        cls,
+        gravitational_parameter: float,
+        position: np.ndarray,
+        velocity: np.ndarray,
+        ut: float,
+    ) -> "KeplerOrbit":
+        """Create KeplerOrbit from state vectors
+
+        Args:
+            gravitational_parameter: GM of the attractor
+            position: position vector in non-rotating reference frame
+            velocity: velocity vector in non-rotating reference frame
+            ut: time of the state vectors
+
+        Returns:
+            return KeplerOrbit
+        """
+        mu = gravitational_parameter
+        r_vector = krpc_to_zup(np.asarray(position, dtype=float))
+        v_vector = krpc_to_zup(np.asarray(velocity, dtype=float))
+        r = np.linalg.norm(r_vector)
+        v2 = np.dot(v_vector, v_vector)
+
+        h_vector = np.cross(r_vector, v_vector)
+        h_unit = h_vector / np.linalg.norm(h_vector)
+        e_vector = (
+            (v2 - mu / r) * r_vector - np.dot(r_vector, v_vector) * v_vector
+        ) / mu
+        e = np.linalg.norm(e_vector)
+        a = 1 / (2 / r - v2 / mu)
+        inclination = math.acos(np.clip(h_unit[2], -1.0, 1.0))
+
+        # fall back to x axis for equatorial, and to node for circular orbits
+        node_vector = np.array((-h_vector[1], h_vector[0], 0.0))
+        if np.linalg.norm(node_vector) < 1e-9 * np.linalg.norm(h_vector):
+            node_unit = np.array((1.0, 0.0, 0.0))
+        else:
+            node_unit = node_vector / np.linalg.norm(node_vector)
+        if e < CIRCULAR_ECCENTRICITY:
+            periapsis_unit = node_unit
+            e = 0.0
+        else:
+            periapsis_unit = e_vector / e
+
+        lan = math.atan2(node_unit[1], node_unit[0])
+        argp = math.atan2(
+            np.dot(np.cross(node_unit, periapsis_unit), h_unit),
+            np.dot(node_unit, periapsis_unit),
+        )
+        nu = math.atan2(
+            np.dot(np.cross(periapsis_unit, r_vector), h_unit),
+            np.dot(periapsis_unit, r_vector),
+        )
+
+        if e < 1:
+            E = 2 * math.atan2(
+                math.sqrt(1 - e) * math.sin(nu / 2),
+                math.sqrt(1 + e) * math.cos(nu / 2),
+            )
+            mean_anomaly = E - e * math.sin(E)
+        else:
+            H = 2 * math.atanh(math.sqrt((e - 1) / (e + 1)) * math.tan(nu / 2))
+            mean_anomaly = e * math.sinh(H) - H
+
+        return cls(
+            mu,
+            a,
+            e,
+            inclination,
+            lan % (2 * math.pi),
+            argp % (2 * math.pi),
+            mean_anomaly,
+            ut,
+        )
+
+    @classmethod
+    def from_surface_state(
+        cls,
+        gravitational_parameter: float,
+        rotational_speed: float,
+        position: np.ndarray,
+        velocity: np.ndarray,
+        ut: float,
+    ) -> "KeplerOrbit":
+        """Create KeplerOrbit from state vectors in the rotating body frame
+
+        Takes vessel.position and vessel.velocity in body.reference_frame,
+        e.g. from streams, so that the orbit is refreshed without RPC.
+        The orbit is oriented in the rotating frame as of ut, which leaves
+        radii, speeds and times unchanged.
+
+        Args:
+            gravitational_parameter: GM of the attractor
+            rotational_speed: rotational speed of the attractor
+            position: position vector in body.reference_frame
+            velocity: velocity vector in body.reference_frame
+
+        Returns:
+            return KeplerOrbit
+        """
+        x, y, z = position
+        w = rotational_speed
+        return cls.from_state_vectors(
+            gravitational_parameter,
+            position,
+            np.asarray(velocity, dtype=float) + (-w * z, 0.0, w * x),
+            ut,
+        )
+
+    @property
+    def is_hyperbolic(self) -> bool:
+        return self.eccentricity >= 1
+
+    @property
+    def period(self) -> float:
+        """orbital period, infinity for hyperbolic orbits"""
+        if self.is_hyperbolic:
+            return math.inf
+        return 2 * math.pi / self.mean_motion
+
+    @property
+    def periapsis(self) -> float:
+        return self.semi_major_axis * (1 - self.eccentricity)
+
+    @property
+    def apoapsis(self) -> float:
+        """apoapsis radius, negative for hyperbolic orbits as in KSP"""
+        return self.semi_major_axis * (1 + self.eccentricity)
+
+    def mean_anomaly_at(self, ut: ArrayLike) -> ArrayLike:
+        return self.mean_anomaly_at_epoch + self.mean_motion * (
+            np.asarray(ut, dtype=float) - self.epoch
+        )
+
+    def true_anomaly_at(self, ut: ArrayLike) -> ArrayLike:
+        e = self.eccentricity
+        E = solve_kepler(self.mean_anomaly_at(ut), e)
+        if e < 1:
+            return 2 * np.arctan2(
+                math.sqrt(1 + e) * np.sin(E / 2),
+                math.sqrt(1 - e) * np.cos(E / 2),
+            )
+        return 2 * np.arctan(math.sqrt((e + 1) / (e - 1)) * np.tanh(E / 2))
+
+    def mean_anomaly_at_true_anomaly(
+        self, true_anomaly: ArrayLike
+    ) -> ArrayLike:
+        e = self.eccentricity
+        half = np.asarray(true_anomaly, dtype=float) / 2
+        if e < 1:
+            E = 2 * np.arctan2(
+                math.sqrt(1 - e) * np.sin(half), math.sqrt(1 + e) * np.cos(half)
+            )
+            return E - e * np.sin(E)
+        H = 2 * np.arctanh(math.sqrt((e - 1) / (e + 1)) * np.tan(half))
+        return e * np.sinh(H) - H
+
+    def time_to_radius(
+        self, radius: ArrayLike, ut: ArrayLike
+    ) -> Tuple[ArrayLike, ArrayLike]:
+        """Return the next time the orbit crosses radius, and the speed then
+
+        Solved in closed form from the elements: both true anomalies at
+        radius are converted to mean anomalies, and the crossing reached
+        first after ut is taken, the mean anomaly wrapping once per period
+        on elliptic orbits. A circular orbit stays at its radius and crosses
+        none.
+
+        Args:
+            radius: radius, scalar or array
+            ut: ut to search from, scalar or array broadcasting with radius
+
+        Returns:
+            return (ut of the crossing, orbital speed at radius), NaN where
+            the orbit never crosses radius after ut, floats for scalar args
+        """
+        mu = self.gravitational_parameter
+        a = self.semi_major_axis
+        e = self.eccentricity
+        r, ut = np.broadcast_arrays(
+            np.asarray(radius, dtype=float), np.asarray(ut, dtype=float)
+        )
+        if e < CIRCULAR_ECCENTRICITY:
+            time = np.full(r.shape, np.nan)
+            if time.ndim == 0:
+                return float(time), float(time)
+            return time, time.copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cos_nu = (self.semi_latus_rectum / r - 1) / e
+            reachable = (np.abs(cos_nu) <= 1) & (r > 0)
+            nu = np.arccos(np.clip(cos_nu, -1.0, 1.0))
+            # outbound at nu, inbound at -nu
+            crossings = self.mean_anomaly_at_true_anomaly(np.stack((nu, -nu)))
+            delta = crossings - self.mean_anomaly_at(ut)
+            if e < 1:
+                delta = np.mod(delta, 2 * math.pi)
+            else:
+                delta = np.where(delta >= 0, delta, np.inf)
+            dt = np.min(delta, axis=0) / self.mean_motion
+            time = np.where(reachable & np.isfinite(dt), ut + dt, np.nan)
+            speed = np.sqrt(mu * (2 / r - 1 / a))
+        speed = np.where(np.isnan(time), np.nan, speed)
+        if time.ndim == 0:
+            return float(time), float(speed)
+        return time, speed
+
+    def true_longitude_at(self, ut: ArrayLike) -> ArrayLike:
+        """longitude of ascending node + argument of periapsis + true anomaly"""
+        return np.mod(
+            self.longitude_of_ascending_node
+            + self.argument_of_periapsis
+            + self.true_anomaly_at(ut),
+            2 * math.pi,
+        )
+
+    def radius_at_true_longitude(self, longitude: ArrayLike) -> ArrayLike:
+        """radius at a true longitude, see true_longitude_at"""
+        nu = (
+            np.asarray(longitude, dtype=float)
+            - self.longitude_of_ascending_node
+            - self.argument_of_periapsis
+        )
+        return self.semi_latus_rectum / (1 + self.eccentricity * np.cos(nu))
+
+    def radius_at(self, ut: ArrayLike) -> ArrayLike:
+        nu = self.true_anomaly_at(ut)
+        return self.semi_latus_rectum / (1 + self.eccentricity * np.cos(nu))
+
+    def state_at(self, ut: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+        """Return position and velocity vector at ut
+
+        Args:
+            ut: scalar ut, or array of ut with shape (N,)
+
+        Returns:
+            return (position, velocity), each (3,) for scalar ut or (N, 3),
+            in non-rotating reference frame of the orbiting body
+        """
+        e = self.eccentricity
+        p = self.semi_latus_rectum
+        nu = np.asarray(self.true_anomaly_at(ut))[..., np.newaxis]
+        cos_nu = np.cos(nu)
+        sin_nu = np.sin(nu)
+
+        r = p / (1 + e * cos_nu)
+        position = r * (cos_nu * self._p_vector + sin_nu * self._q_vector)
+        speed_factor = math.sqrt(self.gravitational_parameter / p)
+        velocity = speed_factor * (
+            -sin_nu * self._p_vector + (e + cos_nu) * self._q_vector
+        )
+        return zup_to_krpc(position), zup_to_krpc(velocity)
+
+    def position_at(self, ut: ArrayLike) -> np.ndarray:
+        return self.state_at(ut)[0]
+
+    def velocity_at(self, ut: ArrayLike) -> np.ndarray:
+        return self.state_at(ut)[1]
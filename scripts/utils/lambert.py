@@ -0,0 +1,291 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from scripts.utils.body_catalog import BodyCatalog
+from scripts.utils.kepler import KeplerOrbit
+
+
+# bisection bounds of the universal variable z, single revolution transfers
+Z_MIN = -40 * math.pi ** 2
+Z_MAX = 4 * math.pi ** 2
+BISECTION_STEPS = 64
+
+
+def stumpff(z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return Stumpff functions C(z) and S(z), broadcasting arrays"""
+    z = np.asarray(z, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        root = np.sqrt(np.abs(z))
+        c_elliptic = (1 - np.cos(root)) / z
+        s_elliptic = (root - np.sin(root)) / root ** 3
+        c_hyperbolic = (np.cosh(root) - 1) / -z
+        s_hyperbolic = (np.sinh(root) - root) / root ** 3
+    c_series = 1 / 2 - z / 24 + z * z / 720
+    s_series = 1 / 6 - z / 120 + z * z / 5040
+    small = np.abs(z) < 1e-3
+    c = np.where(small, c_series, np.where(z > 0, c_elliptic, c_hyperbolic))
+    s = np.where(small, s_series, np.where(z > 0, s_elliptic, s_hyperbolic))
+    return c, s
+
+
+def solve_lambert(
+    gravitational_parameter: float,
+    r1: np.ndarray,
+    r2: np.ndarray,
+    time_of_flight: np.ndarray,
+    normal: np.ndarray = (0.0, 1.0, 0.0),
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Solve Lambert's problem for arrays of transfers at once
+
+    Universal variable formulation, the time of flight equation being
+    solved for z by bisection, which is robust and runs the same steps on
+    every element of the arrays. Only single revolution transfers are
+    solved, in the direction of motion given by normal.
+
+    Args:
+        gravitational_parameter: GM of the attractor
+        r1: (..., 3) departure positions
+        r2: (..., 3) arrival positions
+        time_of_flight: (...) times of flight in seconds
+        normal: angular momentum direction of the transfers, e.g. of the
+            departure orbit, in the frame of r1 and r2
+
+    Returns:
+        return (v1, v2), (..., 3) velocities at departure and arrival, NaN
+        where there is no solution
+    """
+    mu = gravitational_parameter
+    r1 = np.asarray(r1, dtype=float)
+    r2 = np.asarray(r2, dtype=float)
+    tof = np.asarray(time_of_flight, dtype=float)
+    norm1 = np.linalg.norm(r1, axis=-1)
+    norm2 = np.linalg.norm(r2, axis=-1)
+
+    cos_dnu = np.clip(np.sum(r1 * r2, axis=-1) / (norm1 * norm2), -1.0, 1.0)
+    short_way = np.sum(np.cross(r1, r2) * np.asarray(normal), axis=-1) >= 0
+    sin_dnu = np.sqrt(1 - cos_dnu * cos_dnu) * np.where(short_way, 1, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        A = sin_dnu * np.sqrt(norm1 * norm2 / (1 - cos_dnu))
+
+    sqrt_mu_tof = math.sqrt(mu) * tof
+    low = np.full(np.shape(A), Z_MIN)
+    high = np.full(np.shape(A), Z_MAX)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        for _ in range(BISECTION_STEPS):
+            z = (low + high) / 2
+            c, s = stumpff(z)
+            y = norm1 + norm2 + A * (z * s - 1) / np.sqrt(c)
+            t = (y / c) ** 1.5 * s + A * np.sqrt(y)
+            # the time of flight grows with z, y < 0 lies below the solution
+            go_up = (y < 0) | (t < sqrt_mu_tof)
+            low = np.where(go_up, z, low)
+            high = np.where(go_up, high, z)
+
+        z = (low + high) / 2
+        c, s = stumpff(z)
+        y = norm1 + norm2 + A * (z * s - 1) / np.sqrt(c)
+        t = (y / c) ** 1.5 * s + A * np.sqrt(y)
+        solved = (
+            (y > 0)
+            & (np.abs(t - sqrt_mu_tof) <= 1e-6 * sqrt_mu_tof)
+            & np.isfinite(A)
+        )
+
+        f = 1 - y / norm1
+        g = A * np.sqrt(y / mu)
+        g_dot = 1 - y / norm2
+        v1 = (r2 - f[..., np.newaxis] * r1) / g[..., np.newaxis]
+        v2 = (g_dot[..., np.newaxis] * r2 - r1) / g[..., np.newaxis]
+    v1 = np.where(solved[..., np.newaxis], v1, np.nan)
+    v2 = np.where(solved[..., np.newaxis], v2, np.nan)
+    return v1, v2
+
+
+class Porkchop(NamedTuple):
+    """Transfers over a grid of departure and arrival times
+
+    Attributes:
+        departure_ut: (N,) departure ut
+        arrival_ut: (M,) arrival ut
+        c3: (N, M) squared hyperbolic excess speed at departure
+        arrival_v_inf: (N, M) hyperbolic excess speed at arrival
+        delta_v: (N, M) departure delta-v, see porkchop
+    """
+
+    departure_ut: np.ndarray
+    arrival_ut: np.ndarray
+    c3: np.ndarray
+    arrival_v_inf: np.ndarray
+    delta_v: np.ndarray
+
+    def best(self) -> Tuple[float, float, float]:
+        """Return (departure ut, arrival ut, delta-v) of the cheapest cell"""
+        i, j = np.unravel_index(np.nanargmin(self.delta_v), self.delta_v.shape)
+        return (
+            float(self.departure_ut[i]),
+            float(self.arrival_ut[j]),
+            float(self.delta_v[i, j]),
+        )
+
+
+def _porkchop_rows(
+    origin: KeplerOrbit,
+    destination: KeplerOrbit,
+    departure_ut: np.ndarray,
+    arrival_ut: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """departure and arrival excess velocities of a block of the grid"""
+    r1, v_origin = origin.state_at(departure_ut)
+    r2, v_destination = destination.state_at(arrival_ut)
+    normal = np.cross(r1[0], v_origin[0])
+    tof = arrival_ut[np.newaxis, :] - departure_ut[:, np.newaxis]
+    with np.errstate(invalid="ignore"):
+        tof = np.where(tof > 0, tof, np.nan)
+    v1, v2 = solve_lambert(
+        origin.gravitational_parameter,
+        r1[:, np.newaxis, :],
+        r2[np.newaxis, :, :],
+        tof,
+        normal,
+    )
+    departure_v_inf = v1 - v_origin[:, np.newaxis, :]
+    arrival_v_inf = v2 - v_destination[np.newaxis, :, :]
+    return (
+        np.sum(departure_v_inf ** 2, axis=-1),
+        np.linalg.norm(arrival_v_inf, axis=-1),
+    )
+
+
+def _porkchop_chunk(args) -> Tuple[np.ndarray, np.ndarray]:
+    return _porkchop_rows(*args)
+
+
+def porkchop(
+    origin: KeplerOrbit,
+    destination: KeplerOrbit,
+    departure_ut: np.ndarray,
+    arrival_ut: np.ndarray,
+    parking_orbit: Optional[Tuple[float, float]] = None,
+    workers: Optional[int] = None,
+    chunk_rows: int = 25,
+) -> Porkchop:
+    """Evaluate transfers between two orbits over a grid of times
+
+    Departure rows are split into chunks of chunk_rows, solved on a
+    process pool. Cells arriving before departure, or without single
+    revolution solution, are NaN.
+
+    Args:
+        origin: orbit of the departure body, around the common parent
+        destination: orbit of the arrival body, around the common parent
+        departure_ut: (N,) departure ut
+        arrival_ut: (M,) arrival ut
+        parking_orbit: (GM of the departure body, parking orbit radius),
+            delta_v is then the ejection burn from the circular parking
+            orbit, otherwise the sum of the hyperbolic excess speeds
+        workers: number of processes, os.cpu_count() if None, 1 solves in
+            this process
+        chunk_rows: departure rows per chunk
+
+    Returns:
+        return Porkchop
+    """
+    departure_ut = np.asarray(departure_ut, dtype=float)
+    arrival_ut = np.asarray(arrival_ut, dtype=float)
+    chunks = [
+        (origin, destination, rows, arrival_ut)
+        for rows in np.array_split(
+            departure_ut, max(1, math.ceil(len(departure_ut) / chunk_rows))
+        )
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        results = [_porkchop_chunk(chunk) for chunk in chunks]
+    else:
+        # spawn workers, a fork would copy the kRPC socket and the stream
+        # threads of the connected caller
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            results = list(executor.map(_porkchop_chunk, chunks))
+    c3 = np.concatenate([c3 for c3, _ in results])
+    arrival_v_inf = np.concatenate([v_inf for _, v_inf in results])
+
+    if parking_orbit is None:
+        delta_v = np.sqrt(c3) + arrival_v_inf
+    else:
+        mu, radius = parking_orbit
+        delta_v = np.sqrt(c3 + 2 * mu / radius) - math.sqrt(mu / radius)
+    return Porkchop(departure_ut, arrival_ut, c3, arrival_v_inf, delta_v)
+
+
+def hohmann_flight_time(origin: KeplerOrbit, destination: KeplerOrbit) -> float:
+    """half period of the transfer orbit between the semi-major axes"""
+    semi_major_axis = (origin.semi_major_axis + destination.semi_major_axis) / 2
+    return math.pi * math.sqrt(
+        semi_major_axis ** 3 / origin.gravitational_parameter
+    )
+
+
+def transfer_porkchop(
+    catalog: BodyCatalog,
+    origin: str,
+    destination: str,
+    ut: float,
+    size: int = 500,
+    parking_altitude: Optional[float] = None,
+    workers: Optional[int] = None,
+) -> Porkchop:
+    """Porkchop of transfers between two bodies from cached ephemerides
+
+    Departures span one synodic period from ut, arrivals the departures
+    plus 0.5 to 1.5 times the Hohmann flight time.
+
+    Args:
+        catalog: body catalog, see body_catalog
+        origin: name of the departure body
+        destination: name of the arrival body, orbiting the same parent
+        ut: earliest departure
+        size: grid points along each axis
+        parking_altitude: altitude of a circular parking orbit around
+            origin, delta_v is then the ejection burn from it
+        workers: number of processes, see porkchop
+
+    Returns:
+        return Porkchop
+    """
+    if catalog[origin].parent != catalog[destination].parent:
+        raise ValueError(f"{origin} and {destination} orbit different bodies")
+    origin_orbit = catalog.kepler_orbit(origin)
+    destination_orbit = catalog.kepler_orbit(destination)
+
+    relative_motion = abs(
+        origin_orbit.mean_motion - destination_orbit.mean_motion
+    )
+    synodic_period = 2 * math.pi / relative_motion
+    flight_time = hohmann_flight_time(origin_orbit, destination_orbit)
+    departure_ut = ut + np.linspace(0.0, synodic_period, size)
+    arrival_ut = np.linspace(
+        ut + 0.5 * flight_time, ut + synodic_period + 1.5 * flight_time, size
+    )
+
+    parking_orbit = None
+    if parking_altitude is not None:
+        body = catalog[origin]
+        parking_orbit = (
+            body.gravitational_parameter,
+            body.equatorial_radius + parking_altitude,
+        )
+    return porkchop(
+        origin_orbit,
+        destination_orbit,
+        departure_ut,
+        arrival_ut,
+        parking_orbit,
+        workers,
+    )
@@ -1,10 +1,24 @@
 import math
 import time
+from typing import NewType
 
 from krpc.client import Client
+from scripts.utils.ascent_optimizer import optimize_launch
 from scripts.utils.autostage import set_autostaging, unset_autostaging
+from scripts.utils.control_loop import FixedRateLoop
 from scripts.utils.execute_node import execute_next_node
+from scripts.utils.rpc_profiler import profile_from_env, set_phase
 from scripts.utils.status_dialog import StatusDialog
+from scripts.utils.stream_registry import StreamScope
+from scripts.utils.vessel_geometry import vessel_geometry
+from scripts.utils.wait import warp_to
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Vessel = NewType("Vessel", object)
+
+# ascent control loop rate (Hz)
+ASCENT_RATE = 20
 
 
 # TODO: get staging condition per stage number
@@ -25,6 +39,7 @@ def launch_into_orbit(
     use_rcs_on_circulization: bool = False,
     deploy_panel_atm_exit: bool = True,
     deploy_panel_stage: int = None,
+    optimize_turn: bool = False,
 ) -> None:
     """Lunch active vessel into orbit.
 
@@ -34,6 +49,8 @@ def launch_into_orbit(
         conn: kRPC connection
         target_alt: target altitude in m
         target_inc: target inclination in degree
+        turn_start_alt: altitude where the gravity turn starts
+        turn_end_alt: altitude where the gravity turn ends
         auto_launch: when everything set, launch automatically
         auto_stage: staging when no fuel left on the stage
         stop_stage: stop staging on the stage
@@ -45,11 +62,15 @@ def launch_into_orbit(
         use_rcs_on_circulization: turn on rcs during circulization
         deploy_panel_atm_exit: deploy solar/radiator panels after atm exit
         deploy_panel_stage: deploy solar/radiator panels delayed on stage
+        optimize_turn: on the launch pad, replace turn_start_alt and
+            turn_end_alt by the profile of ascent_optimizer.optimize_launch,
+            unless it is on the edge of the searched grid
 
     Returns:
         return nothing, return when procedure finished
 
     """
+    set_phase(conn, "launch_into_orbit: pre-launch")
     vessel = conn.space_center.active_vessel
     body = vessel.orbit.body
 
@@ -57,10 +78,11 @@ def launch_into_orbit(
     dialog = StatusDialog(conn)
 
     # Set up streams for telemetry
-    ut = conn.add_stream(getattr, conn.space_center, "ut")
+    streams = StreamScope(conn, rate=ASCENT_RATE)
+    ut = streams.add_stream(getattr, conn.space_center, "ut")
     atomosphere_depth = body.atmosphere_depth
-    altitude = conn.add_stream(getattr, vessel.flight(), "mean_altitude")
-    apoapsis = conn.add_stream(getattr, vessel.orbit, "apoapsis_altitude")
+    altitude = streams.add_stream(getattr, vessel.flight(), "mean_altitude")
+    apoapsis = streams.add_stream(getattr, vessel.orbit, "apoapsis_altitude")
 
     # Pre-launch setup
     vessel.control.sas = True
@@ -68,6 +90,19 @@ def launch_into_orbit(
     vessel.control.throttle = 1.0
 
     if vessel.situation.name == "pre_launch":
+        if optimize_turn:
+            dialog.status_update("Optimizing gravity turn")
+            best = optimize_launch(conn, target_alt, vessel)
+            if best.reached and not best.on_grid_edge:
+                turn_start_alt = best.turn_start_alt
+                turn_end_alt = best.turn_end_alt
+                dialog.status_update(
+                    f"Gravity turn: {turn_start_alt:.0f} m to {turn_end_alt:.0f} m, {best.delta_v:.0f} m/s"
+                )
+            else:
+                dialog.status_update(
+                    "No optimal gravity turn found, keeping the given one"
+                )
         if auto_launch:
             for i in range(-5, 0):
                 dialog.status_update(f"T={i} ...")
@@ -78,6 +113,7 @@ def launch_into_orbit(
             dialog.status_update("Ready to launch")
 
     # Main ascent loop
+    set_phase(conn, "launch_into_orbit: ascent")
     set_ascent_autostaging(
         conn,
         auto_stage=auto_stage,
@@ -86,6 +122,7 @@ def launch_into_orbit(
         pre_circulization_stage=pre_circulization_stage,
         post_circulization_stage=post_circulization_stage,
         skip_circulization=skip_circulization,
+        vessel=vessel,
     )
 
     ascent_heading = (90 - target_inc) % 360
@@ -101,7 +138,8 @@ def launch_into_orbit(
     state_gravity_turn = False
     state_approach_target_ap = False
     state_coasting_out_of_atm = False
-    while True:
+    ascent_loop = FixedRateLoop(conn, ASCENT_RATE, "ascent")
+    for _ in ascent_loop.ticks():
         if apoapsis() <= target_alt * 0.9:
             vessel.control.throttle = 1
             # Gravity turn
@@ -172,6 +210,7 @@ def launch_into_orbit(
                         pre_circulization_stage=pre_circulization_stage,
                         post_circulization_stage=post_circulization_stage,
                         skip_circulization=skip_circulization,
+                        vessel=vessel,
                     )
 
         raise_apoapsis_last_throttle = vessel.control.throttle
@@ -179,9 +218,11 @@ def launch_into_orbit(
         raise_apoapsis_last_ut = ut()
 
     vessel.control.throttle = 0
+    streams.close()
+    dialog.status_update(ascent_loop.stats.summary())
 
     if auto_stage:
-        unset_autostaging()
+        unset_autostaging(vessel)
 
     if deploy_panel_atm_exit:
         deploy_panels(conn)
@@ -190,6 +231,7 @@ def launch_into_orbit(
         return
 
     # pre-circularization setup
+    set_phase(conn, "launch_into_orbit: circularization")
     vessel.control.rcs = use_rcs_on_circulization
 
     # Plan circularization burn (using vis-viva equation)
@@ -202,7 +244,7 @@ def launch_into_orbit(
     v2 = math.sqrt(mu * ((2.0 / r) - (1.0 / a2)))
     delta_v = v2 - v1
     vessel.control.add_node(
-        ut() + vessel.orbit.time_to_apoapsis, prograde=delta_v
+        conn.space_center.ut + vessel.orbit.time_to_apoapsis, prograde=delta_v
     )
 
     vessel.auto_pilot.disengage()
@@ -230,6 +272,7 @@ def set_ascent_autostaging(
     pre_circulization_stage: int = None,
     post_circulization_stage: int = None,
     skip_circulization: bool = False,
+    vessel: Vessel = None,
 ):
     if not auto_stage:
         return
@@ -245,7 +288,7 @@ def set_ascent_autostaging(
     ]
     if len(ascent_stop_stages) != 0:
         ascent_stop_stage = max(ascent_stop_stages)
-    set_autostaging(conn, stop_stage=ascent_stop_stage)
+    set_autostaging(conn, stop_stage=ascent_stop_stage, vessel=vessel)
 
 
 def deploy_panels(conn: Client):
@@ -253,7 +296,8 @@ def deploy_panels(conn: Client):
     dialog = StatusDialog(conn)
 
     dialog.status_update("Deploying solar/radiator panels")
-    for panel in vessel.parts.solar_panels + vessel.parts.radiators:
+    geometry = vessel_geometry(conn, vessel)
+    for panel in geometry.solar_panels + geometry.radiators:
         if panel.deployable:
             panel.deployed = True
 
@@ -272,7 +316,7 @@ def warp_for_longtitude(conn: Client, longtitude: float):
 
     dialog.status_update("Waiting for launch timing")
     lead_time = 5
-    conn.space_center.warp_to(longtitude_ut - lead_time)
+    warp_to(conn, longtitude_ut - lead_time)
 
 
 if __name__ == "__main__":
@@ -281,6 +325,7 @@ if __name__ == "__main__":
 
     krpc_address = os.environ["KRPC_ADDRESS"]
     connection = krpc.connect(name="Launch into orbit", address=krpc_address)
+    profile_from_env(connection)
     warp_for_longtitude(connection, 205.8)
     launch_into_orbit(
         connection, 100000, 95, turn_start_alt=18000, turn_end_alt=550000
@@ -1,14 +1,17 @@
 import math
-from typing import NewType
+from typing import NamedTuple, NewType, Optional, Tuple, Union
 
 import numpy as np
-from astropy import units as AstropyUnit
 from krpc.client import Client
 from numpy.linalg import norm
-from poliastro.maneuver import Maneuver
-from poliastro.twobody import Orbit as PoliastroOrbit
 from scripts.utils.execute_node import execute_next_node
-from scripts.utils.krpc_poliastro import krpc_poliastro_bodies
+from scripts.utils.kepler import ArrayLike, KeplerOrbit
+from scripts.utils.maneuver_planner import (
+    horizontal_dv_for_periapsis,
+    prograde_dv_for_apoapsis,
+)
+from scripts.utils.orbital_frame import OrbitalFrames, orbital_frames
+from scripts.utils.rpc_profiler import profile_from_env
 from scripts.utils.status_dialog import StatusDialog
 
 
@@ -29,159 +32,194 @@ def dot(v1, v2):
     return np.clip(np.dot(v1_u, v2_u), -1.0, 1.0)
 
 
-def velocity_at_ut(
-    orbit: Orbit, at_ut: float, reference_frame: ReferenceFrame = None
-):
-    """Return velocity vector of orbit at ut
+def _kepler_orbit(orbit: Union[Orbit, KeplerOrbit]) -> KeplerOrbit:
+    if isinstance(orbit, KeplerOrbit):
+        return orbit
+    return KeplerOrbit.from_krpc_orbit(orbit)
+
+
+def prograde_vector_at_ut(orbit: Union[Orbit, KeplerOrbit], at_ut: ArrayLike):
+    """Return prograde vector of orbit at ut
 
-    Return velocity vector of orbit at ut
-    If we could access KSP Orbit.getOrbitalVelocityAtUT() via kRPC api...
+    Return prograde vector of orbit at ut,
+    in non-rotating reference frame of the orbiting body.
+    Use orbital_frames() directly when more than one vector is needed.
 
     Args:
-        orbit: kRPC orbit object
-        at_ut: at specific time
-        reference_frame: reference_frame to be used
+        orbit: kRPC orbit object or KeplerOrbit
+        at_ut: at specific time, or array of ut
 
     Returns:
-        return velocity vector
+        return prograde unit vector(s)
     """
-    if not reference_frame:
-        attractor = orbit.body
-        reference_frame = attractor.non_rotating_reference_frame
-
-    velocity_vector = np.subtract(
-        orbit.position_at(at_ut + 0.5, reference_frame),
-        orbit.position_at(at_ut - 0.5, reference_frame),
-    )
-    return velocity_vector
+    return orbital_frames(_kepler_orbit(orbit), at_ut).prograde
 
 
-def prograde_vector_at_ut(
-    orbit: Orbit, at_ut: float, reference_frame: ReferenceFrame = None
+def anti_radial_vector_at_ut(
+    orbit: Union[Orbit, KeplerOrbit], at_ut: ArrayLike
 ):
-    """Return prograde vector of orbit at ut
+    """Return anti-radial vector of orbit at ut
 
-    Return prograde vector of orbit at ut
+    Return anti-radial vector of orbit at ut,
+    in non-rotating reference frame of the orbiting body.
+    Use orbital_frames() directly when more than one vector is needed.
 
     Args:
-        orbit: kRPC orbit object
-        at_ut: at specific time
-        reference_frame: reference_frame to be used
+        orbit: kRPC orbit object or KeplerOrbit
+        at_ut: at specific time, or array of ut
 
     Returns:
-        return prograde unit vector
+        return anti-radial unit vector(s)
     """
-    if not reference_frame:
-        attractor = orbit.body
-        reference_frame = attractor.non_rotating_reference_frame
+    return orbital_frames(_kepler_orbit(orbit), at_ut).anti_radial
 
-    orbit_speed = velocity_at_ut(orbit, at_ut, reference_frame)
 
-    return unit_vector(orbit_speed)
+def normal_vector_at_ut(orbit: Union[Orbit, KeplerOrbit], at_ut: ArrayLike):
+    """Return normal vector of orbit at ut
 
+    Return normal vector of orbit at ut,
+    in non-rotating reference frame of the orbiting body.
+    Use orbital_frames() directly when more than one vector is needed.
 
-def anti_radial_vector_at_ut(
-    orbit: Orbit, at_ut: float, reference_frame: ReferenceFrame = None
-):
-    """Return anti-radial vector of orbit at ut
+    Args:
+        orbit: kRPC orbit object or KeplerOrbit
+        at_ut: at specific time, or array of ut
 
-    Return anti-radial vector of orbit at ut
+    Returns:
+        return normal unit vector(s)
+    """
+    return orbital_frames(_kepler_orbit(orbit), at_ut).normal
+
+
+def upward_vector_at_ut(orbit: Union[Orbit, KeplerOrbit], at_ut: ArrayLike):
+    """Return upward vector of orbit at ut
+
+    Return upward vector of orbit at ut,
+    in non-rotating reference frame of the orbiting body.
+    Use orbital_frames() directly when more than one vector is needed.
 
     Args:
-        orbit: kRPC orbit object
-        at_ut: at specific time
-        reference_frame: reference_frame to be used
+        orbit: kRPC orbit object or KeplerOrbit
+        at_ut: at specific time, or array of ut
 
     Returns:
-        return anti-radial unit vector
+        return upward unit vector(s)
     """
-    if not reference_frame:
-        attractor = orbit.body
-        reference_frame = attractor.non_rotating_reference_frame
-
-    prograde_vector = prograde_vector_at_ut(orbit, at_ut, reference_frame)
-    upward_vector = upward_vector_at_ut(orbit, at_ut, reference_frame)
-    anti_radial_vector = upward_vector - prograde_vector * dot(
-        prograde_vector, upward_vector
-    )
-
-    return unit_vector(anti_radial_vector)
+    return orbital_frames(_kepler_orbit(orbit), at_ut).upward
 
 
-def normal_vector_at_ut(
-    orbit: Orbit, at_ut: float, reference_frame: ReferenceFrame = None
-):
-    """Return normal vector of orbit at ut
+def horizontal_vector_at_ut(orbit: Union[Orbit, KeplerOrbit], at_ut: ArrayLike):
+    """Return horizontal vector of orbit at ut
 
-    Return normal vector of orbit at ut
+    Return horizontal vector of orbit at ut,
+    in non-rotating reference frame of the orbiting body.
+    Use orbital_frames() directly when more than one vector is needed.
 
     Args:
-        orbit: kRPC orbit object
-        at_ut: at specific time
-        reference_frame: reference_frame to be used
+        orbit: kRPC orbit object or KeplerOrbit
+        at_ut: at specific time, or array of ut
 
     Returns:
-        return normal unit vector
+        return horizontal unit vector(s)
     """
-    if not reference_frame:
-        attractor = orbit.body
-        reference_frame = attractor.non_rotating_reference_frame
+    return orbital_frames(_kepler_orbit(orbit), at_ut).horizontal
 
-    prograde_vector = prograde_vector_at_ut(orbit, at_ut, reference_frame)
-    anti_radial_vector = anti_radial_vector_at_ut(orbit, at_ut, reference_frame)
-    normal_vector = np.cross(prograde_vector, anti_radial_vector)
 
-    return unit_vector(normal_vector)
+class ManeuverNode(NamedTuple):
+    """Planned maneuver node, arguments for vessel.control.add_node"""
 
+    ut: float
+    prograde: float = 0.0
+    normal: float = 0.0
+    radial: float = 0.0
+
+
+def _node_from_dv_vector(
+    frames: OrbitalFrames, node_ut: float, dv_vector: np.ndarray
+) -> ManeuverNode:
+    return ManeuverNode(
+        node_ut,
+        prograde=float(np.dot(dv_vector, frames.prograde)),
+        normal=float(np.dot(dv_vector, frames.normal)),
+        radial=float(np.dot(dv_vector, frames.anti_radial)),
+    )
+
+
+def _add_node(vessel: Vessel, node: ManeuverNode):
+    return vessel.control.add_node(
+        node.ut, prograde=node.prograde, normal=node.normal, radial=node.radial
+    )
 
-def upward_vector_at_ut(
-    orbit: Orbit, at_ut: float, reference_frame: ReferenceFrame = None
-):
-    """Return upward vector of orbit at ut
 
-    Return upward vector of orbit at ut
+def plan_circularize(orbit: KeplerOrbit, node_ut: float) -> ManeuverNode:
+    """Plan circularize burn
 
     Args:
-        orbit: kRPC orbit object
-        at_ut: at specific time
-        reference_frame: reference_frame to be used
+        orbit: KeplerOrbit of the vessel
+        node_ut: schedule burn at specific time
 
     Returns:
-        return upward unit vector
+        return ManeuverNode
     """
-    if not reference_frame:
-        attractor = orbit.body
-        reference_frame = attractor.non_rotating_reference_frame
+    frames = orbital_frames(orbit, node_ut)
 
-    upward_vector = orbit.position_at(at_ut, reference_frame)
-    return unit_vector(upward_vector)
+    # v = sqrt(GM/r)
+    circular_orbit_speed = math.sqrt(
+        orbit.gravitational_parameter / norm(frames.position)
+    )
+    desired_orbit_speed = frames.horizontal * circular_orbit_speed
 
+    dv_vector = desired_orbit_speed - frames.velocity
+    return _node_from_dv_vector(frames, node_ut, dv_vector)
 
-def horizontal_vector_at_ut(
-    orbit: Orbit, at_ut: float, reference_frame: ReferenceFrame = None
-):
-    """Return horizontal vector of orbit at ut
 
-    Return horizontal vector of orbit at ut
+def plan_change_apoapsis(
+    orbit: KeplerOrbit, node_ut: float, new_apoapsis: float
+) -> Optional[ManeuverNode]:
+    """Plan prograde/retrograde burn to change apoapsis
 
     Args:
-        orbit: kRPC orbit object
-        at_ut: at specific time
-        reference_frame: reference_frame to be used
+        orbit: KeplerOrbit of the vessel
+        node_ut: schedule burn at specific time
+        new_apoapsis: new apoapsis radius
 
     Returns:
-        return horizontal unit vector
+        return ManeuverNode, None if new apoapsis is below periapsis
     """
-    if not reference_frame:
-        attractor = orbit.body
-        reference_frame = attractor.non_rotating_reference_frame
-
-    prograde_vector = prograde_vector_at_ut(orbit, at_ut, reference_frame)
-    upward_vector = upward_vector_at_ut(orbit, at_ut, reference_frame)
-    horizontal_vector = prograde_vector - upward_vector * dot(
-        prograde_vector, upward_vector
+    if new_apoapsis <= orbit.periapsis:
+        return None
+
+    position, velocity = orbit.state_at(node_ut)
+    dv = prograde_dv_for_apoapsis(
+        position, velocity, orbit.gravitational_parameter, new_apoapsis
     )
-    return unit_vector(horizontal_vector)
+    return ManeuverNode(node_ut, prograde=float(dv))
+
+
+def plan_change_periapsis(
+    orbit: KeplerOrbit, node_ut: float, new_periapsis: float
+) -> Optional[ManeuverNode]:
+    """Plan horizontal burn to change periapsis
+
+    Args:
+        orbit: KeplerOrbit of the vessel
+        node_ut: schedule burn at specific time
+        new_periapsis: new periapsis radius
+
+    Returns:
+        return ManeuverNode, None if new periapsis is above apoapsis
+    """
+    if not orbit.apoapsis < 0 and new_periapsis >= orbit.apoapsis:
+        return None
+
+    frames = orbital_frames(orbit, node_ut)
+    dv = horizontal_dv_for_periapsis(
+        frames.position,
+        frames.velocity,
+        orbit.gravitational_parameter,
+        new_periapsis,
+    )
+    return _node_from_dv_vector(frames, node_ut, dv * frames.horizontal)
 
 
 def circularize(conn: Client, node_ut: float):
@@ -198,36 +236,9 @@ def circularize(conn: Client, node_ut: float):
         return nothing, return when procedure finished
     """
     vessel = conn.space_center.active_vessel
-    attractor = vessel.orbit.body
-    reference_frame = attractor.non_rotating_reference_frame
+    orbit = KeplerOrbit.from_krpc_orbit(vessel.orbit)
 
-    circularize_radius = vessel.orbit.radius_at(node_ut)
-
-    # v = sqrt(GM/r)
-    circular_orbit_speed = math.sqrt(
-        attractor.gravitational_parameter / circularize_radius
-    )
-
-    actual_orbit_speed = velocity_at_ut(vessel.orbit, node_ut, reference_frame)
-    prograde_vector_at_node = prograde_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    anti_radial_vector_at_node = anti_radial_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    horizontal_vector_at_node = horizontal_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    desired_orbit_speed = horizontal_vector_at_node * circular_orbit_speed
-
-    dv_vector = desired_orbit_speed - actual_orbit_speed
-    dv_prograde = dot(dv_vector, prograde_vector_at_node) * norm(dv_vector)
-    dv_anti_radial = dot(dv_vector, anti_radial_vector_at_node) * norm(
-        dv_vector
-    )
-    vessel.control.add_node(
-        node_ut, radial=dv_anti_radial, prograde=dv_prograde, normal=0
-    )
+    _add_node(vessel, plan_circularize(orbit, node_ut))
 
     # TODO: replace this logic to burn for dynamic circulize?
     # instead of just executing node, dynamically update direction for circulize
@@ -250,68 +261,13 @@ def change_apoapsis(conn: Client, node_ut: float, new_apoapsis_alt: float):
     """
     vessel = conn.space_center.active_vessel
     attractor = vessel.orbit.body
-    reference_frame = attractor.non_rotating_reference_frame
+    orbit = KeplerOrbit.from_krpc_orbit(vessel.orbit)
 
-    attractor_surface_radius = (
-        vessel.orbit.apoapsis - vessel.orbit.apoapsis_altitude
-    )
-    new_apoapsis = new_apoapsis_alt + attractor_surface_radius
-
-    if new_apoapsis <= vessel.orbit.periapsis:
+    new_apoapsis = new_apoapsis_alt + attractor.equatorial_radius
+    node = plan_change_apoapsis(orbit, node_ut, new_apoapsis)
+    if not node:
         return
-
-    krpc_bodies, poliastro_bodies = krpc_poliastro_bodies(conn)
-
-    ut = conn.space_center.ut
-
-    time_to_burn = node_ut - ut
-    is_raising = new_apoapsis > vessel.orbit.apoapsis
-
-    prograde_vector_at_node = prograde_vector_at_ut(vessel.orbit, node_ut)
-    burn_direction = 1 if is_raising else -1
-    burn_vector = burn_direction * prograde_vector_at_node
-
-    r_i = vessel.position(reference_frame) * AstropyUnit.m
-    v_i = vessel.velocity(reference_frame) * AstropyUnit.m / AstropyUnit.s
-    ss_i = PoliastroOrbit.from_vectors(
-        poliastro_bodies[attractor.name], r_i, v_i
-    )
-
-    # get upper bound of deltaV
-    min_dv = 0
-    max_dv = 0
-    if is_raising:
-        max_dv = 0.25
-        tmp_new_ap = vessel.orbit.apoapsis
-        while tmp_new_ap < new_apoapsis:
-            max_dv *= 2
-            tmp_burn = max_dv * burn_vector * AstropyUnit.m / AstropyUnit.s
-            tmp_maneuver = Maneuver((time_to_burn * AstropyUnit.s, tmp_burn))
-            tmp_new_ss = ss_i.apply_maneuver(tmp_maneuver)
-            tmp_new_ap = abs(tmp_new_ss.r_a.to(AstropyUnit.m).value)
-            if max_dv > 100000:
-                break
-    else:
-        # orbital speed should be max_dv for lowering apoapsis
-        max_dv = norm(velocity_at_ut(vessel.orbit, node_ut, reference_frame))
-
-    # binary search
-    while max_dv - min_dv > 0.01:
-        tmp_dv = (max_dv + min_dv) / 2.0
-        tmp_burn = tmp_dv * burn_vector * AstropyUnit.m / AstropyUnit.s
-        tmp_maneuver = Maneuver((time_to_burn * AstropyUnit.s, tmp_burn))
-        tmp_new_ss = ss_i.apply_maneuver(tmp_maneuver)
-        tmp_new_ap = abs(tmp_new_ss.r_a.to(AstropyUnit.m).value)
-
-        if (is_raising and tmp_new_ap > new_apoapsis) or (
-            not is_raising and tmp_new_ap < new_apoapsis
-        ):
-            max_dv = tmp_dv
-        else:
-            min_dv = tmp_dv
-
-    dv = burn_direction * (max_dv + min_dv) / 2.0
-    vessel.control.add_node(node_ut, prograde=dv)
+    _add_node(vessel, node)
 
     # TODO: replace this logic to burn for dynamic change apoapsis?
     # instead of just executing node, dynamically update direction
@@ -334,92 +290,52 @@ def change_periapsis(conn: Client, node_ut: float, new_periapsis_alt: float):
     """
     vessel = conn.space_center.active_vessel
     attractor = vessel.orbit.body
-    reference_frame = attractor.non_rotating_reference_frame
-
-    attractor_surface_radius = (
-        vessel.orbit.apoapsis - vessel.orbit.apoapsis_altitude
-    )
-    new_periapsis = new_periapsis_alt + attractor_surface_radius
+    orbit = KeplerOrbit.from_krpc_orbit(vessel.orbit)
 
-    if not vessel.orbit.apoapsis < 0 and new_periapsis >= vessel.orbit.apoapsis:
+    new_periapsis = new_periapsis_alt + attractor.equatorial_radius
+    node = plan_change_periapsis(orbit, node_ut, new_periapsis)
+    if not node:
         return
+    _add_node(vessel, node)
 
-    krpc_bodies, poliastro_bodies = krpc_poliastro_bodies(conn)
+    # TODO: replace this logic to burn for dynamic change periapsis?
+    # instead of just executing node, dynamically update direction
+    execute_next_node(conn)
 
-    ut = conn.space_center.ut
 
-    time_to_burn = node_ut - ut
-    is_raising = new_periapsis > vessel.orbit.periapsis
+def plan_match_plane(
+    v_orbit: Orbit, t_orbit: Orbit
+) -> Tuple[ManeuverNode, bool]:
+    """Plan plane change burn to match the orbit plane of target
 
-    prograde_vector_at_node = prograde_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    anti_radial_vector_at_node = anti_radial_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    normal_vector_at_node = normal_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    horizontal_vector_at_node = horizontal_vector_at_ut(
-        vessel.orbit, node_ut, reference_frame
-    )
-    burn_direction = 1 if is_raising else -1
-    burn_vector = burn_direction * horizontal_vector_at_node
+    Burn at the sooner of the ascending and descending nodes.
 
-    r_i = vessel.position(reference_frame) * AstropyUnit.m
-    v_i = vessel.velocity(reference_frame) * AstropyUnit.m / AstropyUnit.s
-    ss_i = PoliastroOrbit.from_vectors(
-        poliastro_bodies[attractor.name], r_i, v_i
-    )
+    Args:
+        v_orbit: kRPC orbit of the vessel
+        t_orbit: kRPC orbit of the target
 
-    # get upper bound of deltaV
-    min_dv = 0
-    max_dv = 0
-    if is_raising:
-        max_dv = 0.25
-        tmp_new_pe = vessel.orbit.periapsis
-        while tmp_new_pe < new_periapsis:
-            max_dv *= 2
-            tmp_burn = max_dv * burn_vector * AstropyUnit.m / AstropyUnit.s
-            tmp_maneuver = Maneuver((time_to_burn * AstropyUnit.s, tmp_burn))
-            tmp_new_ss = ss_i.apply_maneuver(tmp_maneuver)
-            tmp_new_pe = abs(tmp_new_ss.r_p.to(AstropyUnit.m).value)
-            if max_dv > 100000:
-                break
+    Returns:
+        return (node, True if the burn is at the ascending node)
+    """
+    # find sooner timing
+    ut_an = v_orbit.ut_at_true_anomaly(v_orbit.true_anomaly_at_an(t_orbit))
+    ut_dn = v_orbit.ut_at_true_anomaly(v_orbit.true_anomaly_at_dn(t_orbit))
+    if ut_an < ut_dn:
+        ascending = True
+        node_ut = ut_an
     else:
-        # horizontal speed should be max_dv for lowering periapsis
-        max_dv = vessel.flight(reference_frame).horizontal_speed
-
-    # binary search
-    while max_dv - min_dv > 0.01:
-        tmp_dv = (max_dv + min_dv) / 2.0
-        tmp_burn = tmp_dv * burn_vector * AstropyUnit.m / AstropyUnit.s
-        tmp_maneuver = Maneuver((time_to_burn * AstropyUnit.s, tmp_burn))
-        tmp_new_ss = ss_i.apply_maneuver(tmp_maneuver)
-        tmp_new_pe = abs(tmp_new_ss.r_p.to(AstropyUnit.m).value)
-
-        if (is_raising and tmp_new_pe > new_periapsis) or (
-            not is_raising and tmp_new_pe < new_periapsis
-        ):
-            max_dv = tmp_dv
-        else:
-            min_dv = tmp_dv
-
-    dv_vector = burn_vector * (max_dv + min_dv) / 2.0
-
-    dv_prograde = dot(dv_vector, prograde_vector_at_node) * norm(dv_vector)
-    dv_anti_radial = dot(dv_vector, anti_radial_vector_at_node) * norm(
-        dv_vector
-    )
-    dv_normal = dot(dv_vector, normal_vector_at_node) * norm(dv_vector)
+        ascending = False
+        node_ut = ut_dn
 
-    vessel.control.add_node(
-        node_ut, prograde=dv_prograde, radial=dv_anti_radial, normal=dv_normal
-    )
+    # calculate plane change burn
+    speed_at_node = v_orbit.orbital_speed_at(node_ut)
+    rel_inc = v_orbit.relative_inclination(t_orbit)
+    normal = speed_at_node * math.sin(rel_inc)
+    prograde = speed_at_node * math.cos(rel_inc) - speed_at_node
+    if ascending:
+        normal *= -1
 
-    # TODO: replace this logic to burn for dynamic change periapsis?
-    # instead of just executing node, dynamically update direction
-    execute_next_node(conn)
+    return ManeuverNode(node_ut, prograde=prograde, normal=normal), ascending
 
 
 def match_plane_with_target(conn: Client):
@@ -444,33 +360,14 @@ def match_plane_with_target(conn: Client):
     if not target:
         return
 
-    v_orbit = vessel.orbit
-    t_orbit = target.orbit
-
-    # find sooner timing
-    ut_an = v_orbit.ut_at_true_anomaly(v_orbit.true_anomaly_at_an(t_orbit))
-    ut_dn = v_orbit.ut_at_true_anomaly(v_orbit.true_anomaly_at_dn(t_orbit))
-    if ut_an < ut_dn:
-        ascending = True
-        node_ut = ut_an
-    else:
-        ascending = False
-        node_ut = ut_dn
-
-    # calculate plane change burn
-    speed_at_node = v_orbit.orbital_speed_at(node_ut)
-    rel_inc = v_orbit.relative_inclination(t_orbit)
-    normal = speed_at_node * math.sin(rel_inc)
-    prograde = speed_at_node * math.cos(rel_inc) - speed_at_node
-    if ascending:
-        normal *= -1
+    node, ascending = plan_match_plane(vessel.orbit, target.orbit)
 
     node_desc = "ascending node" if ascending else "decending node"
     dialog.status_update(
-        f"Match plane with {target.name} on {node_desc} (ut: {node_ut: .2f})"
+        f"Match plane with {target.name} on {node_desc} (ut: {node.ut: .2f})"
     )
 
-    vessel.control.add_node(node_ut, normal=normal, prograde=prograde)
+    _add_node(vessel, node)
     execute_next_node(conn)
 
 
@@ -480,6 +377,7 @@ if __name__ == "__main__":
 
     krpc_address = os.environ["KRPC_ADDRESS"]
     conn = krpc.connect(name="maneuver", address=krpc_address)
+    profile_from_env(conn)
     circularize(
         conn,
         conn.space_center.ut
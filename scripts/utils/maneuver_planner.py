@@ -0,0 +1,259 @@
+import math
+from typing import Callable, NamedTuple, Tuple
+
+import numpy as np
+from scripts.utils.kepler import KeplerOrbit, krpc_to_zup
+
+
+def apsides_from_state(
+    position: np.ndarray, velocity: np.ndarray, gravitational_parameter: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return periapsis and apoapsis radius of the orbit through a state
+
+    Vectorized over leading dimensions of position and velocity.
+    Apoapsis is returned as absolute value for hyperbolic orbits,
+    same as poliastro Orbit.r_a used to be read in maneuver.py.
+
+    Args:
+        position: (..., 3) position vector
+        velocity: (..., 3) velocity vector
+        gravitational_parameter: GM of the attractor
+
+    Returns:
+        return (periapsis, apoapsis)
+    """
+    mu = gravitational_parameter
+    r = np.linalg.norm(position, axis=-1)
+    v2 = np.sum(velocity * velocity, axis=-1)
+    h = np.linalg.norm(np.cross(position, velocity), axis=-1)
+
+    energy = v2 / 2 - mu / r
+    with np.errstate(divide="ignore", invalid="ignore"):
+        semi_major_axis = -mu / (2 * energy)
+    eccentricity = np.sqrt(np.maximum(0.0, 1 + 2 * energy * h * h / mu ** 2))
+
+    periapsis = h * h / mu / (1 + eccentricity)
+    apoapsis = np.abs(semi_major_axis * (1 + eccentricity))
+    return periapsis, apoapsis
+
+
+# number of candidates evaluated at once to bracket numerical solutions
+_BRACKET_SAMPLES = 257
+
+
+class ManeuverCandidates(NamedTuple):
+    """Resulting orbits of candidate burns, each field has shape (N,)"""
+
+    periapsis: np.ndarray
+    apoapsis: np.ndarray
+    eccentricity: np.ndarray
+    inclination: np.ndarray
+
+
+def evaluate_maneuvers(
+    gravitational_parameter: float,
+    position: np.ndarray,
+    velocity: np.ndarray,
+    ut: float,
+    burn_ut: float,
+    dv_vectors: np.ndarray,
+) -> ManeuverCandidates:
+    """Evaluate resulting orbits of candidate burns in one call
+
+    The state is propagated to burn_ut, then every candidate deltaV is
+    applied as an impulse. Vectors are in non-rotating reference frame of
+    the attractor, apoapsis is absolute value as in apsides_from_state.
+
+    Args:
+        gravitational_parameter: GM of the attractor
+        position: position vector at ut
+        velocity: velocity vector at ut
+        ut: time of the state vectors
+        burn_ut: time of the burn
+        dv_vectors: (N, 3) candidate deltaV vectors
+
+    Returns:
+        return ManeuverCandidates
+    """
+    mu = gravitational_parameter
+    if burn_ut != ut:
+        orbit = KeplerOrbit.from_state_vectors(mu, position, velocity, ut)
+        position, velocity = orbit.state_at(burn_ut)
+
+    position = krpc_to_zup(np.asarray(position, dtype=float))
+    new_velocity = krpc_to_zup(
+        np.asarray(velocity, dtype=float) + np.atleast_2d(dv_vectors)
+    )
+
+    r = np.linalg.norm(position)
+    v2 = np.sum(new_velocity * new_velocity, axis=-1)
+    h_vector = np.cross(position, new_velocity)
+    h = np.linalg.norm(h_vector, axis=-1)
+
+    energy = v2 / 2 - mu / r
+    with np.errstate(divide="ignore", invalid="ignore"):
+        semi_major_axis = -mu / (2 * energy)
+        inclination = np.arccos(np.clip(h_vector[:, 2] / h, -1.0, 1.0))
+    eccentricity = np.sqrt(np.maximum(0.0, 1 + 2 * energy * h * h / mu ** 2))
+
+    return ManeuverCandidates(
+        h * h / mu / (1 + eccentricity),
+        np.abs(semi_major_axis * (1 + eccentricity)),
+        eccentricity,
+        inclination,
+    )
+
+
+def _bracket_root(dvs: np.ndarray, errors: np.ndarray) -> Tuple[float, float]:
+    """Return the first [lower, upper] of dvs where errors change sign"""
+    sign_changes = np.nonzero(np.diff(np.sign(errors)))[0]
+    if len(sign_changes) == 0:
+        best = dvs[np.argmin(np.abs(errors))]
+        return best, best
+    i = sign_changes[0]
+    return dvs[i], dvs[i + 1]
+
+
+def _find_root(
+    func: Callable[[float], float],
+    lower: float,
+    upper: float,
+    tolerance: float = 0.01,
+    max_iterations: int = 100,
+) -> float:
+    """Find root of func in [lower, upper] with bracketed secant method
+
+    Secant steps which leave the bracket fall back to bisection.
+    If func does not change sign in the bracket, the end closest to the
+    root is returned.
+    """
+    if lower == upper:
+        return lower
+    f_lower = func(lower)
+    f_upper = func(upper)
+    if f_lower * f_upper > 0:
+        return lower if abs(f_lower) < abs(f_upper) else upper
+
+    for _ in range(max_iterations):
+        if upper - lower <= tolerance:
+            break
+        x = upper - f_upper * (upper - lower) / (f_upper - f_lower)
+        if not lower < x < upper or not math.isfinite(x):
+            x = (lower + upper) / 2
+        f_x = func(x)
+        if f_x == 0:
+            return x
+        if f_x * f_lower < 0:
+            upper, f_upper = x, f_x
+        else:
+            lower, f_lower = x, f_x
+
+    return (lower + upper) / 2
+
+
+def prograde_dv_for_apoapsis(
+    position: np.ndarray,
+    velocity: np.ndarray,
+    gravitational_parameter: float,
+    new_apoapsis: float,
+) -> float:
+    """Return prograde deltaV at the state to change apoapsis
+
+    Solved analytically from vis-viva and conservation of angular momentum
+    (a prograde burn does not change flight path angle).
+    Fall back to a bracketed secant search when no closed form exists.
+
+    Args:
+        position: position vector at the burn
+        velocity: velocity vector at the burn
+        gravitational_parameter: GM of the attractor
+        new_apoapsis: target apoapsis radius
+
+    Returns:
+        return deltaV along prograde, negative for retrograde
+    """
+    mu = gravitational_parameter
+    r = np.linalg.norm(position)
+    speed = np.linalg.norm(velocity)
+    cos_flight_path = np.linalg.norm(np.cross(position, velocity)) / (r * speed)
+    ra = new_apoapsis
+
+    # apsis condition: (r s cos(fpa))^2 / (2 ra^2) - mu / ra = s^2 / 2 - mu / r
+    denominator = r * ((r * cos_flight_path) ** 2 - ra * ra)
+    if ra > r and denominator < 0:
+        new_speed = math.sqrt(2 * mu * ra * (r - ra) / denominator)
+        return new_speed - speed
+
+    prograde = velocity / speed
+
+    def apoapsis_error(dv: float) -> float:
+        _, apoapsis = apsides_from_state(position, velocity + dv * prograde, mu)
+        return apoapsis - ra
+
+    if ra > apsides_from_state(position, velocity, mu)[1]:
+        dvs = np.linspace(0.0, 100000.0, _BRACKET_SAMPLES)
+    else:
+        dvs = np.linspace(-speed, 0.0, _BRACKET_SAMPLES)
+    candidates = evaluate_maneuvers(
+        mu, position, velocity, 0, 0, dvs[:, np.newaxis] * prograde
+    )
+    return _find_root(
+        apoapsis_error, *_bracket_root(dvs, candidates.apoapsis - ra)
+    )
+
+
+def horizontal_dv_for_periapsis(
+    position: np.ndarray,
+    velocity: np.ndarray,
+    gravitational_parameter: float,
+    new_periapsis: float,
+) -> float:
+    """Return horizontal deltaV at the state to change periapsis
+
+    Solved analytically from vis-viva and conservation of angular momentum
+    (a horizontal burn does not change radial speed).
+    Fall back to a bracketed secant search when no closed form exists.
+
+    Args:
+        position: position vector at the burn
+        velocity: velocity vector at the burn
+        gravitational_parameter: GM of the attractor
+        new_periapsis: target periapsis radius
+
+    Returns:
+        return deltaV along horizontal, negative for backward
+    """
+    mu = gravitational_parameter
+    r = np.linalg.norm(position)
+    upward = position / r
+    radial_speed = np.dot(velocity, upward)
+    horizontal_velocity = velocity - radial_speed * upward
+    horizontal_speed = np.linalg.norm(horizontal_velocity)
+    rp = new_periapsis
+
+    # apsis condition: (r vh)^2 / (2 rp^2) - mu / rp = (vr^2 + vh^2) / 2 - mu / r
+    if 0 < rp < r:
+        new_horizontal_speed = math.sqrt(
+            (radial_speed ** 2 + 2 * mu * (1 / rp - 1 / r))
+            / ((r / rp) ** 2 - 1)
+        )
+        return new_horizontal_speed - horizontal_speed
+
+    horizontal = horizontal_velocity / horizontal_speed
+
+    def periapsis_error(dv: float) -> float:
+        periapsis, _ = apsides_from_state(
+            position, velocity + dv * horizontal, mu
+        )
+        return periapsis - rp
+
+    if rp > apsides_from_state(position, velocity, mu)[0]:
+        dvs = np.linspace(0.0, 100000.0, _BRACKET_SAMPLES)
+    else:
+        dvs = np.linspace(-horizontal_speed, 0.0, _BRACKET_SAMPLES)
+    candidates = evaluate_maneuvers(
+        mu, position, velocity, 0, 0, dvs[:, np.newaxis] * horizontal
+    )
+    return _find_root(
+        periapsis_error, *_bracket_root(dvs, candidates.periapsis - rp)
+    )
@@ -0,0 +1,321 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, NewType, Optional
+
+from krpc.client import Client
+from scripts.utils.decent import vertical_landing
+from scripts.utils.execute_node import execute_next_node
+from scripts.utils.hohmann_transfer import hohmann_transfer_to_target
+from scripts.utils.launch_into_orbit import launch_into_orbit
+from scripts.utils.rpc_profiler import profile_from_env
+from scripts.utils.telemetry import Telemetry
+from scripts.utils.wait import (
+    pointing_error_expression,
+    set_warp_handler,
+    threshold_expression,
+    ut_expression,
+)
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Expression = NewType("Expression", object)
+Flight = NewType("Flight", object)
+
+# time acceleration of each rails warp factor in KSP
+RAILS_WARP_RATES = (1, 5, 10, 50, 100, 1000, 10000, 100000)
+# real seconds left at a warp factor before dropping to the next lower one
+WARP_STEP_SECONDS = 2.0
+
+
+class MissionRuntime(object):
+    """asyncio runtime running procedures concurrently on one connection
+
+    Blocking procedures run on worker threads and share the connection and
+    its stream registry, so identical streams are transferred once.
+    Waits of the runtime are kRPC events delivered to the event loop, so
+    any number of coroutines can wait without holding a thread. Rails
+    warps of procedures (wait.warp_to) go through warp_to of the runtime,
+    so a warping procedure does not hold the connection.
+
+    Usage:
+        runtime = MissionRuntime(conn)
+        runtime.log_telemetry(1, altitude=(getattr, flight, "mean_altitude"))
+        await launch_into_orbit_async(runtime, 100000, 0)
+        await runtime.close()
+    """
+
+    def __init__(self, conn: Client, max_workers: int = 4):
+        self.conn = conn
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mission"
+        )
+        # procedures block on runtime waits, which need free call workers
+        self._procedure_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="procedure"
+        )
+        self._tasks: List[asyncio.Task] = []
+        self._telemetries: List[Telemetry] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._warp_targets: List[float] = []
+        set_warp_handler(conn, self._warp_from_thread)
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking function (e.g. an RPC) on a worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_procedure(self, procedure: Callable, *args, **kwargs) -> Any:
+        """Run a blocking procedure taking conn as first argument
+
+        Args:
+            procedure: procedure, e.g. launch_into_orbit
+            args: arguments of the procedure after conn
+
+        Returns:
+            return the return value of the procedure
+        """
+        self._loop = asyncio.get_running_loop()
+        return await self._loop.run_in_executor(
+            self._procedure_executor,
+            functools.partial(procedure, self.conn, *args, **kwargs),
+        )
+
+    def start(self, coroutine) -> asyncio.Task:
+        """Start a coroutine as a task, cancelled on close()"""
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.append(task)
+        return task
+
+    async def wait_for_expression(
+        self, expression: Expression, timeout: Optional[float] = None
+    ) -> bool:
+        """Wait until a kRPC expression becomes true
+
+        Args:
+            expression: boolean conn.krpc.Expression
+            timeout: timeout in seconds, None waits forever
+
+        Returns:
+            return True if the expression became true, False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        fired = asyncio.Event()
+        event = await self.call(self.conn.krpc.add_event, expression)
+        event.add_callback(lambda: loop.call_soon_threadsafe(fired.set))
+        try:
+            await self.call(event.start)
+            await asyncio.wait_for(fired.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            await self.call(event.remove)
+
+    async def wait_until(
+        self,
+        obj: object,
+        attribute: str,
+        threshold: float,
+        above: bool = True,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """Wait until obj.attribute crosses threshold, see wait.wait_until"""
+        expression = await self.call(
+            threshold_expression, self.conn, obj, attribute, threshold, above
+        )
+        return await self.wait_for_expression(expression, timeout)
+
+    async def wait_until_ut(
+        self, ut: float, timeout: Optional[float] = None
+    ) -> bool:
+        """Wait until universal time reaches ut"""
+        expression = await self.call(ut_expression, self.conn, ut)
+        return await self.wait_for_expression(expression, timeout)
+
+    async def wait_until_pointing_error_below(
+        self,
+        flight: Flight,
+        target_direction: Iterable[float],
+        max_angle: float,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """Wait until vessel points within max_angle of target_direction"""
+        expression = await self.call(
+            pointing_error_expression,
+            self.conn,
+            flight,
+            target_direction,
+            max_angle,
+        )
+        return await self.wait_for_expression(expression, timeout)
+
+    async def warp_to(self, ut: float):
+        """Rails warp to ut without blocking the connection
+
+        space_center.warp_to holds the RPC connection until the warp ends,
+        which stalls every other procedure. This steps the rails warp
+        factor down as ut comes closer, and waits for each step on an event.
+        Concurrent warps share the rails warp, which always steps down for
+        the earliest pending ut, so that no warp overshoots its ut.
+
+        Args:
+            ut: universal time to warp to
+        """
+        space_center = self.conn.space_center
+        self._warp_targets.append(ut)
+        try:
+            while True:
+                now = await self.call(getattr, space_center, "ut")
+                if now >= ut:
+                    if len(self._warp_targets) == 1:
+                        await self.call(
+                            setattr, space_center, "rails_warp_factor", 0
+                        )
+                    break
+                target = min(t for t in self._warp_targets if t > now)
+                max_factor = await self.call(
+                    getattr, space_center, "maximum_rails_warp_factor"
+                )
+                factor = 0
+                for i, rate in enumerate(RAILS_WARP_RATES[: max_factor + 1]):
+                    if rate * WARP_STEP_SECONDS < target - now:
+                        factor = i
+                if factor == 0:
+                    if target < ut:
+                        # the warp ending first stops it, then warp further
+                        await self.wait_until_ut(target)
+                        continue
+                    await self.call(
+                        setattr, space_center, "rails_warp_factor", 0
+                    )
+                    break
+                await self.call(
+                    setattr, space_center, "rails_warp_factor", factor
+                )
+                await self.wait_until_ut(
+                    target - RAILS_WARP_RATES[factor] * WARP_STEP_SECONDS
+                )
+        finally:
+            self._warp_targets.remove(ut)
+        await self.wait_until_ut(ut)
+
+    def _warp_from_thread(self, ut: float):
+        """wait.warp_to of procedures, blocking the worker thread only"""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if self._loop is None or on_loop or not self._loop.is_running():
+            self.conn.space_center.warp_to(ut)
+            return
+        asyncio.run_coroutine_threadsafe(self.warp_to(ut), self._loop).result()
+
+    async def every(self, interval: float, func: Callable, *args):
+        """Call func every interval seconds until cancelled
+
+        Coroutine functions are awaited on the loop, other functions run
+        on a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            if asyncio.iscoroutinefunction(func):
+                await func(*args)
+            else:
+                await self.call(func, *args)
+            next_time += interval
+            await asyncio.sleep(max(0, next_time - loop.time()))
+
+    def telemetry(self, rate: Optional[float] = None, **channels) -> Telemetry:
+        """Return Telemetry on the shared streams, closed on close()"""
+        telemetry = Telemetry(self.conn, rate=rate, **channels)
+        self._telemetries.append(telemetry)
+        return telemetry
+
+    def log_telemetry(
+        self, rate: float, log: Callable = print, **channels
+    ) -> asyncio.Task:
+        """Start logging telemetry snapshots at rate Hz
+
+        Args:
+            rate: logging rate in Hz
+            log: function called with each TelemetrySnapshot
+            channels: channels, as Telemetry
+
+        Returns:
+            return the logging task
+        """
+        telemetry = self.telemetry(rate, **channels)
+
+        async def log_snapshot():
+            log(telemetry.snapshot())
+
+        return self.start(self.every(1 / rate, log_snapshot))
+
+    async def close(self):
+        """Cancel started tasks and release streams
+
+        Procedures already running on worker threads are not interrupted.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for telemetry in self._telemetries:
+            telemetry.close()
+        self._telemetries.clear()
+        set_warp_handler(self.conn, None)
+        self._executor.shutdown(wait=False)
+        self._procedure_executor.shutdown(wait=False)
+
+
+async def launch_into_orbit_async(runtime: MissionRuntime, *args, **kwargs):
+    """launch_into_orbit on the runtime, same arguments without conn"""
+    return await runtime.run_procedure(launch_into_orbit, *args, **kwargs)
+
+
+async def vertical_landing_async(runtime: MissionRuntime, *args, **kwargs):
+    """vertical_landing on the runtime, same arguments without conn"""
+    return await runtime.run_procedure(vertical_landing, *args, **kwargs)
+
+
+async def execute_next_node_async(runtime: MissionRuntime, *args, **kwargs):
+    """execute_next_node on the runtime, same arguments without conn"""
+    return await runtime.run_procedure(execute_next_node, *args, **kwargs)
+
+
+async def hohmann_transfer_to_target_async(
+    runtime: MissionRuntime, *args, **kwargs
+):
+    """hohmann_transfer_to_target on the runtime, same arguments without conn"""
+    return await runtime.run_procedure(
+        hohmann_transfer_to_target, *args, **kwargs
+    )
+
+
+if __name__ == "__main__":
+    import os
+    import krpc
+
+    async def main(conn: Client):
+        runtime = MissionRuntime(conn)
+        vessel = conn.space_center.active_vessel
+        flight = vessel.flight(vessel.orbit.body.reference_frame)
+        runtime.log_telemetry(
+            1,
+            ut=(getattr, conn.space_center, "ut"),
+            altitude=(getattr, flight, "mean_altitude"),
+            speed=(getattr, flight, "speed"),
+        )
+        try:
+            await launch_into_orbit_async(runtime, 100000, 0)
+        finally:
+            await runtime.close()
+
+    krpc_address = os.environ["KRPC_ADDRESS"]
+    conn = krpc.connect(name="mission runtime", address=krpc_address)
+    profile_from_env(conn)
+    asyncio.run(main(conn))
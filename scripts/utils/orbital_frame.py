@@ -0,0 +1,56 @@
+from typing import NamedTuple
+
+import numpy as np
+from scripts.utils.kepler import ArrayLike, KeplerOrbit
+
+
+class OrbitalFrames(NamedTuple):
+    """Orbital state and direction vectors sampled at one or more ut
+
+    Each field is (3,) for a scalar ut or (N, 3) for an array of ut,
+    in non-rotating reference frame of the orbiting body.
+    """
+
+    position: np.ndarray
+    velocity: np.ndarray
+    prograde: np.ndarray
+    upward: np.ndarray
+    anti_radial: np.ndarray
+    normal: np.ndarray
+    horizontal: np.ndarray
+
+
+def _unit_vectors(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def _row_dot(v1: np.ndarray, v2: np.ndarray) -> np.ndarray:
+    return np.clip(np.sum(v1 * v2, axis=-1, keepdims=True), -1.0, 1.0)
+
+
+def orbital_frames(orbit: KeplerOrbit, uts: ArrayLike) -> OrbitalFrames:
+    """Return orbital frame vectors of orbit at ut(s)
+
+    Compute position, velocity and the prograde, upward, anti-radial,
+    normal and horizontal unit vectors in one vectorized pass.
+
+    Args:
+        orbit: KeplerOrbit
+        uts: scalar ut, or array of ut with shape (N,)
+
+    Returns:
+        return OrbitalFrames
+    """
+    position, velocity = orbit.state_at(uts)
+
+    prograde = _unit_vectors(velocity)
+    upward = _unit_vectors(position)
+    cos_flight_path = _row_dot(prograde, upward)
+
+    anti_radial = _unit_vectors(upward - prograde * cos_flight_path)
+    normal = _unit_vectors(np.cross(prograde, anti_radial))
+    horizontal = _unit_vectors(prograde - upward * cos_flight_path)
+
+    return OrbitalFrames(
+        position, velocity, prograde, upward, anti_radial, normal, horizontal
+    )
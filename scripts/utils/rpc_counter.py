@@ -0,0 +1,52 @@
+import threading
+import weakref
+
+from krpc.client import Client
+
+
+class RPCCounter(object):
+    """Counter of remote procedure calls made on a connection
+
+    Wraps conn._invoke, which every RPC of the client goes through.
+    Calls are counted per thread, so concurrent procedures on the same
+    connection do not see each other's calls. Stream reads are not RPCs
+    and are not counted.
+    """
+
+    def __init__(self, conn: Client):
+        self._local = threading.local()
+        self._total = 0
+        self._lock = threading.Lock()
+        invoke = conn._invoke
+
+        def counted_invoke(*args, **kwargs):
+            self._local.count = self.count + 1
+            with self._lock:
+                self._total += 1
+            return invoke(*args, **kwargs)
+
+        conn._invoke = counted_invoke
+
+    @property
+    def count(self) -> int:
+        """number of RPCs made by the current thread"""
+        return getattr(self._local, "count", 0)
+
+    @property
+    def total(self) -> int:
+        """number of RPCs made by every thread"""
+        return self._total
+
+
+_counters = weakref.WeakKeyDictionary()
+_counters_lock = threading.Lock()
+
+
+def rpc_counter(conn: Client) -> RPCCounter:
+    """Return the RPC counter of the connection, installed on first use"""
+    with _counters_lock:
+        counter = _counters.get(conn)
+        if not counter:
+            counter = RPCCounter(conn)
+            _counters[conn] = counter
+        return counter
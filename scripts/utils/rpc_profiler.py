@@ -0,0 +1,261 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from krpc.client import Client
+
+
+# helper modules skipped when attributing a call to its calling function
+_HELPER_MODULES = {
+    __name__,
+    "scripts.utils.rpc_counter",
+    "scripts.utils.stream_registry",
+    "scripts.utils.telemetry",
+    "scripts.utils.wait",
+    "scripts.utils.control_loop",
+    "scripts.sim.remote",
+    "scripts.sim.client",
+}
+
+NO_PHASE = "-"
+
+
+class CallStats(NamedTuple):
+    phase: str
+    caller: str
+    procedure: str
+    calls: int
+    total_time: float
+    max_time: float
+
+
+class RPCProfiler(object):
+    """Profiler of remote procedure calls made on a connection
+
+    Wraps conn._invoke, and counts and times every RPC, attributed to the
+    calling function (the first caller outside krpc and the stream helpers)
+    and to the current phase set with set_phase() or phase().
+    Stream reads are not RPCs and are not profiled.
+
+    Usage:
+        with RPCProfiler(conn, trace_path="trace.json") as profiler:
+            vertical_landing(conn)
+        print(profiler.summary())
+    """
+
+    def __init__(
+        self,
+        conn: Client,
+        trace_path: Optional[str] = None,
+        max_trace_events: int = 1000000,
+    ):
+        self.trace_path = trace_path
+        self.max_trace_events = max_trace_events
+        self.enabled = True
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: Dict[Tuple[str, str, str], List[float]] = defaultdict(
+            lambda: [0, 0.0, 0.0]
+        )
+        self._trace: List[dict] = []
+        invoke = conn._invoke
+
+        def profiled_invoke(service, procedure, *args, **kwargs):
+            if not self.enabled:
+                return invoke(service, procedure, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return invoke(service, procedure, *args, **kwargs)
+            finally:
+                self._record(
+                    f"{service}.{procedure}",
+                    start,
+                    time.perf_counter() - start,
+                )
+
+        conn._invoke = profiled_invoke
+        with _profilers_lock:
+            _profilers[conn] = self
+
+    @property
+    def phase_name(self) -> str:
+        """current phase of the calling thread"""
+        return getattr(self._local, "phase", NO_PHASE)
+
+    @phase_name.setter
+    def phase_name(self, name: str):
+        self._local.phase = name
+
+    def _record(self, procedure: str, start: float, duration: float):
+        caller, line = _calling_function(sys._getframe(2))
+        phase = self.phase_name
+        with self._lock:
+            stats = self._stats[(phase, caller, procedure)]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            if len(self._trace) < self.max_trace_events:
+                self._trace.append(
+                    {
+                        "name": procedure,
+                        "cat": phase,
+                        "ph": "X",
+                        "ts": (start - self._start) * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": {"caller": caller, "line": line},
+                    }
+                )
+
+    def stats(self) -> List[CallStats]:
+        """Return statistics per phase, caller and procedure
+
+        Returns:
+            return list of CallStats, in descending order of total time
+        """
+        with self._lock:
+            stats = [
+                CallStats(phase, caller, procedure, int(s[0]), s[1], s[2])
+                for (phase, caller, procedure), s in self._stats.items()
+            ]
+        return sorted(stats, key=lambda s: s.total_time, reverse=True)
+
+    def summary(self, limit: int = 30) -> str:
+        """Return summary table of the most time consuming calls
+
+        Args:
+            limit: max number of rows
+
+        Returns:
+            return the table as text
+        """
+        stats = self.stats()
+        calls = sum(s.calls for s in stats)
+        total_time = sum(s.total_time for s in stats)
+        lines = [
+            f"{calls} RPCs, {total_time:.3f} s total",
+            f"{'phase':<28} {'caller':<40} {'procedure':<48} "
+            f"{'calls':>7} {'total ms':>10} {'mean ms':>8} {'max ms':>8}",
+        ]
+        for s in stats[:limit]:
+            lines.append(
+                f"{s.phase[:28]:<28} {s.caller[-40:]:<40} "
+                f"{s.procedure[-48:]:<48} {s.calls:>7} "
+                f"{s.total_time * 1000:>10.1f} "
+                f"{s.total_time / s.calls * 1000:>8.2f} "
+                f"{s.max_time * 1000:>8.2f}"
+            )
+        if len(stats) > limit:
+            lines.append(f"... {len(stats) - limit} more rows")
+        return "\n".join(lines)
+
+    def write_trace(self, path: Optional[str] = None):
+        """Write calls as a Chrome trace (chrome://tracing, Perfetto) file
+
+        Args:
+            path: output path, trace_path if None
+        """
+        path = path or self.trace_path
+        with self._lock:
+            events = list(self._trace)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+
+    def close(self):
+        """Stop profiling, and write the trace file if trace_path is set"""
+        self.enabled = False
+        if self.trace_path:
+            self.write_trace()
+
+    def __enter__(self) -> "RPCProfiler":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _calling_function(frame) -> Tuple[str, int]:
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        # krpc generates service classes at runtime, without a module name
+        if not (
+            not module
+            or module == "krpc"
+            or module.startswith("krpc.")
+            or module in _HELPER_MODULES
+        ):
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            return f"{module}.{name}", frame.f_lineno
+        frame = frame.f_back
+    return "<unknown>", 0
+
+
+_profilers = weakref.WeakKeyDictionary()
+_profilers_lock = threading.Lock()
+
+
+def set_phase(conn: Client, name: str):
+    """Set phase of the calling thread for the profiler of the connection
+
+    Does nothing when the connection is not profiled.
+
+    Args:
+        conn: kRPC connection
+        name: phase name, e.g. "vertical_landing: descent"
+    """
+    profiler = _profilers.get(conn)
+    if profiler:
+        profiler.phase_name = name
+
+
+class phase(object):
+    """Context manager setting the profiler phase within a block"""
+
+    def __init__(self, conn: Client, name: str):
+        self._profiler = _profilers.get(conn)
+        self._name = name
+        self._previous = None
+
+    def __enter__(self):
+        if self._profiler:
+            self._previous = self._profiler.phase_name
+            self._profiler.phase_name = self._name
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profiler:
+            self._profiler.phase_name = self._previous
+
+
+def profile_from_env(conn: Client) -> Optional[RPCProfiler]:
+    """Profile the connection if KRPC_PROFILE is set
+
+    KRPC_PROFILE is the path of the trace file. The summary is printed and
+    the trace file is written at exit.
+
+    Args:
+        conn: kRPC connection
+
+    Returns:
+        return RPCProfiler, None if KRPC_PROFILE is not set
+    """
+    trace_path = os.environ.get("KRPC_PROFILE")
+    if not trace_path:
+        return None
+    profiler = RPCProfiler(conn, trace_path=trace_path)
+
+    def report():
+        profiler.close()
+        print(profiler.summary())
+        print(f"RPC trace written to {trace_path}")
+
+    atexit.register(report)
+    return profiler
@@ -0,0 +1,232 @@
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from krpc.client import Client
+
+
+class StreamStats(NamedTuple):
+    name: str
+    users: int
+    rate: float
+
+
+class SharedStream(object):
+    """Handle of a shared kRPC stream for one user
+
+    Call the handle to get the latest value, as a kRPC stream.
+    """
+
+    def __init__(self, registry: "StreamRegistry", key: Any, stream):
+        self._registry = registry
+        self._key = key
+        self._stream = stream
+        self._rate = None
+        # handles of a linked StreamScope, whose streams share one rate
+        self._linked: Optional[List["SharedStream"]] = None
+        self.removed = False
+
+    def __call__(self):
+        return self._stream()
+
+    @property
+    def rate(self) -> float:
+        """update rate of the underlying stream in Hz, 0 is unlimited"""
+        return self._stream.rate
+
+    @rate.setter
+    def rate(self, rate: float):
+        """request update rate in Hz for this user, 0 is unlimited
+
+        The underlying stream runs at the highest rate requested by its users,
+        so it may update faster than requested. Streams of a linked
+        StreamScope run at the highest rate requested for any of them.
+        """
+        self._rate = rate
+        self._registry._update_rate(self._key)
+
+    def remove(self):
+        self._registry.release(self)
+
+
+class _Entry(object):
+    def __init__(self, name: str, stream):
+        self.name = name
+        self.stream = stream
+        self.handles = []
+        self.rate = 0
+
+
+class StreamRegistry(object):
+    """Reference-counted registry of kRPC streams on a connection
+
+    Identical (function, arguments) streams are shared between all users,
+    and the server-side stream is removed when its last user releases it.
+    A shared stream runs at the highest rate requested by its users (kRPC
+    itself returns the same stream for identical calls on a connection).
+    """
+
+    def __init__(self, conn: Client):
+        self._conn = conn
+        self._entries: Dict[Any, _Entry] = {}
+        self._lock = threading.RLock()
+
+    def add_stream(self, func: Callable, *args, **kwargs) -> SharedStream:
+        """Return handle of a shared stream, same arguments as conn.add_stream
+
+        Args:
+            func: function or getattr, as conn.add_stream
+            args: arguments, as conn.add_stream
+
+        Returns:
+            return SharedStream
+        """
+        key = (func, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # unhashable arguments cannot be shared
+            key = object()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                stream = self._conn.add_stream(func, *args, **kwargs)
+                entry = _Entry(_stream_name(func, args), stream)
+                self._entries[key] = entry
+            handle = SharedStream(self, key, entry.stream)
+            entry.handles.append(handle)
+            return handle
+
+    def release(self, handle: SharedStream):
+        """Release a handle, and remove the stream when it is the last user
+
+        Args:
+            handle: SharedStream returned by add_stream
+        """
+        with self._lock:
+            if handle.removed:
+                return
+            handle.removed = True
+            # streams linked through the handle may slow down without it
+            keys = self._linked_keys(handle._key)
+            entry = self._entries[handle._key]
+            entry.handles.remove(handle)
+            if not entry.handles:
+                del self._entries[handle._key]
+                entry.stream.remove()
+            for key in keys:
+                self._update_rate(key)
+
+    def _linked_keys(self, key: Any) -> List[Any]:
+        """Return keys of the streams sharing a rate with the stream of key"""
+        keys = [key]
+        for linked_key in keys:
+            entry = self._entries.get(linked_key)
+            for handle in entry.handles if entry else ():
+                for linked in handle._linked or ():
+                    if not linked.removed and linked._key not in keys:
+                        keys.append(linked._key)
+        return keys
+
+    def _update_rate(self, key: Any):
+        with self._lock:
+            if key not in self._entries:
+                return
+            keys = self._linked_keys(key)
+            entries = [self._entries[k] for k in keys if k in self._entries]
+            # users that never requested a rate keep the default, unlimited
+            rates = [h._rate or 0 for e in entries for h in e.handles]
+            if not rates or 0 in rates:
+                rate = 0
+            else:
+                rate = max(rates)
+            for entry in entries:
+                if rate != entry.rate:
+                    entry.stream.rate = rate
+                    entry.rate = rate
+
+    def stats(self) -> List[StreamStats]:
+        """Return users and update rate of every registered stream"""
+        with self._lock:
+            return [
+                StreamStats(entry.name, len(entry.handles), entry.rate)
+                for entry in self._entries.values()
+            ]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _stream_name(func: Callable, args: tuple) -> str:
+    if func is getattr and len(args) == 2:
+        return f"{type(args[0]).__name__}.{args[1]}"
+    return getattr(func, "__qualname__", repr(func))
+
+
+_registries = weakref.WeakKeyDictionary()
+_registries_lock = threading.Lock()
+
+
+def stream_registry(conn: Client) -> StreamRegistry:
+    """Return the stream registry of the connection"""
+    with _registries_lock:
+        registry = _registries.get(conn)
+        if registry is None:
+            registry = StreamRegistry(conn)
+            _registries[conn] = registry
+        return registry
+
+
+def _release_all(registry: StreamRegistry, handles: List[SharedStream]):
+    for handle in handles:
+        registry.release(handle)
+    handles.clear()
+
+
+class StreamScope(object):
+    """Streams used by one procedure, released together
+
+    Streams are released on close(), at the end of a with block,
+    or when the scope is garbage collected (e.g. procedure raised).
+    The streams of a linked scope all run at one rate, the highest rate
+    any user of any of them requests, so that values read together are
+    updated together.
+    """
+
+    def __init__(
+        self, conn: Client, rate: Optional[float] = None, linked: bool = False
+    ):
+        self._registry = stream_registry(conn)
+        self._handles = []
+        self._rate = rate
+        self._linked = linked
+        self._finalizer = weakref.finalize(
+            self, _release_all, self._registry, self._handles
+        )
+        self._finalizer.atexit = False
+
+    def add_stream(self, func: Callable, *args, **kwargs) -> SharedStream:
+        """Add a shared stream to the scope, same arguments as conn.add_stream
+
+        Returns:
+            return SharedStream
+        """
+        handle = self._registry.add_stream(func, *args, **kwargs)
+        self._handles.append(handle)
+        if self._linked:
+            handle._linked = self._handles
+            if self._rate is None:
+                self._registry._update_rate(handle._key)
+        if self._rate is not None:
+            handle.rate = self._rate
+        return handle
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self) -> "StreamScope":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,77 @@
+from collections import namedtuple
+from typing import Optional
+
+from krpc.client import Client
+from scripts.utils.stream_registry import StreamScope
+
+
+class Telemetry(object):
+    """Set of streams read together as immutable snapshots
+
+    Channels are given as keyword arguments in conn.add_stream form, e.g.
+    Telemetry(conn, ut=(getattr, conn.space_center, "ut")).
+    snapshot() returns a namedtuple (immutable, no per-instance dict) of
+    the latest value of every channel. kRPC stores the values of a stream
+    update one stream at a time, so a snapshot may mix two updates: values
+    can lag each other by up to one update period. The channels share
+    streams with other users of the connection and all run at one rate,
+    the highest requested for any of them (see StreamScope).
+    """
+
+    def __init__(self, conn: Client, rate: Optional[float] = None, **channels):
+        self._conn = conn
+        self._streams = StreamScope(conn, linked=True)
+        self._names = tuple(channels)
+        self._channels = [
+            self._streams.add_stream(*spec) for spec in channels.values()
+        ]
+        self.snapshot_type = namedtuple("TelemetrySnapshot", self._names)
+        self._rate = None
+        if rate is not None:
+            self.rate = rate
+
+    @property
+    def rate(self) -> Optional[float]:
+        """requested update rate in Hz, None if not requested"""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: float):
+        """set update rate of every channel in Hz, 0 is unlimited
+
+        Channels run faster when another user of one of their streams
+        requests a higher rate.
+
+        Args:
+            rate: update rate in Hz
+        """
+        self._rate = rate
+        for channel in self._channels:
+            channel.rate = rate
+
+    def snapshot(self, wait: bool = False, timeout: Optional[float] = None):
+        """Return current values of every channel
+
+        Args:
+            wait: wait for the next stream update before reading, which
+                paces the caller at the stream rate
+            timeout: timeout in seconds for waiting
+
+        Returns:
+            return TelemetrySnapshot namedtuple
+        """
+        if wait:
+            condition = self._conn.stream_update_condition
+            with condition:
+                condition.wait(timeout)
+        values = [channel() for channel in self._channels]
+        return self.snapshot_type._make(values)
+
+    def close(self):
+        self._streams.close()
+
+    def __enter__(self) -> "Telemetry":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,368 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+import numpy as np
+from krpc.client import Client
+from scripts.utils.control_loop import FixedRateLoop, LoopStats
+from scripts.utils.telemetry import Telemetry
+
+
+INDEX_FILE = "index.json"
+# .npy headers are padded to this size, so they can be rewritten in place
+HEADER_SIZE = 128
+# records buffered by the sampler before they are handed to the writer
+CHUNK_SIZE = 1024
+# seconds after which a partial chunk is written, for live readers
+FLUSH_INTERVAL = 1.0
+# built-in channels: seconds since recording start, and universal time
+TIME_CHANNEL = "time"
+UT_CHANNEL = "SpaceCenter.ut"
+
+
+def channel_name(func: Callable, *args) -> str:
+    """Return default name of a stream channel
+
+    Attributes are named "<class>.<attribute>" and methods by their
+    qualified name, e.g. "Flight.surface_altitude" or "Vessel.position".
+    """
+    if func is getattr:
+        obj, attribute = args
+        return f"{type(obj).__name__}.{attribute}"
+    return getattr(func, "__qualname__", getattr(func, "__name__", repr(func)))
+
+
+def flight_channels(conn: Client) -> Dict[str, tuple]:
+    """Return channels of a typical flight log of the active vessel
+
+    Vessel position, velocity and direction are in the body reference
+    frame, which lets scripts.sim.replay rebuild the vessel state. Flight
+    values are in the hybrid frame used by vertical_landing, positioned at
+    the body center and rotating with the surface.
+    """
+    vessel = conn.space_center.active_vessel
+    orbit = vessel.orbit
+    control = vessel.control
+    ref_frame = conn.space_center.ReferenceFrame.create_hybrid(
+        position=orbit.body.reference_frame,
+        rotation=vessel.surface_reference_frame,
+    )
+    flight = vessel.flight(ref_frame)
+    body_frame = orbit.body.reference_frame
+    specs = [
+        (vessel.position, body_frame),
+        (vessel.velocity, body_frame),
+        (vessel.direction, body_frame),
+        (getattr, vessel, "mass"),
+        (getattr, vessel, "thrust"),
+        (getattr, vessel, "available_thrust"),
+        (getattr, vessel, "situation"),
+        (getattr, orbit, "radius"),
+        (getattr, orbit, "apoapsis_altitude"),
+        (getattr, orbit, "periapsis_altitude"),
+        (getattr, flight, "mean_altitude"),
+        (getattr, flight, "surface_altitude"),
+        (getattr, flight, "speed"),
+        (getattr, flight, "vertical_speed"),
+        (getattr, flight, "horizontal_speed"),
+        (getattr, flight, "latitude"),
+        (getattr, flight, "longitude"),
+        (getattr, flight, "direction"),
+        (getattr, control, "throttle"),
+        (getattr, control, "current_stage"),
+    ]
+    return {channel_name(*spec): spec for spec in specs}
+
+
+def _npy_header(dtype: np.dtype, shape: tuple) -> bytes:
+    """Return .npy version 1.0 header padded to HEADER_SIZE bytes"""
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": shape,
+        }
+    )
+    padding = HEADER_SIZE - 10 - len(header) - 1
+    if padding < 0:
+        raise ValueError(f"npy header too long for shape {shape}")
+    header = header + " " * padding + "\n"
+    return (
+        b"\x93NUMPY\x01\x00"
+        + len(header).to_bytes(2, "little")
+        + header.encode("latin1")
+    )
+
+
+class _Column(object):
+    """Channel written as one .npy file, appended in chunks"""
+
+    def __init__(self, directory: str, name: str, value: Any):
+        self.name = name
+        self.enum = type(value) if isinstance(value, Enum) else None
+        sample = np.asarray(value.value if self.enum else value)
+        if sample.dtype.kind not in "biuf":
+            raise TypeError(
+                f"channel {name}: {type(value).__name__} is not fixed width"
+            )
+        self.dtype = np.dtype(
+            np.float64 if sample.dtype.kind == "f" else sample.dtype
+        )
+        self.shape = sample.shape
+        self.file_name = re.sub(r"[^\w.-]", "_", name) + ".npy"
+        self.records = 0
+        self._file = open(os.path.join(directory, self.file_name), "wb")
+        self._file.write(_npy_header(self.dtype, (0,) + self.shape))
+        self._file.flush()
+
+    def buffer(self, size: int) -> np.ndarray:
+        return np.empty((size,) + self.shape, dtype=self.dtype)
+
+    def encode(self, value: Any) -> Any:
+        return value.value if self.enum else value
+
+    def write(self, block: np.ndarray):
+        self._file.write(block.tobytes())
+        self.records += len(block)
+        # keep the file loadable while recording
+        self._file.seek(0)
+        self._file.write(_npy_header(self.dtype, (self.records,) + self.shape))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def index(self) -> Dict[str, Any]:
+        entry = {
+            "file": self.file_name,
+            "dtype": self.dtype.str,
+            "shape": list(self.shape),
+        }
+        if self.enum:
+            entry["enum"] = {m.name: m.value for m in self.enum}
+        return entry
+
+
+class TelemetryRecorder(object):
+    """Recorder of streams into a directory of columnar .npy files
+
+    A sampler thread reads every channel as one Telemetry snapshot at a
+    fixed rate, and hands chunks of CHUNK_SIZE records to a writer thread
+    that appends them to one .npy file per channel, or any partial chunk
+    after FLUSH_INTERVAL seconds. Reading streams makes no RPC, so
+    recording does not load the connection or the control loops. Files
+    stay loadable with np.load(mmap_mode="r") while recording, and lag at
+    most FLUSH_INTERVAL behind. index.json describes the channels.
+
+    Channels are given as conn.add_stream specs, either as a list named
+    with channel_name(), or as a dict of name to spec. The TIME_CHANNEL
+    (seconds since start) and UT_CHANNEL channels are always recorded.
+    Enum values are recorded as integers, with names in the index.
+
+    Usage:
+        with TelemetryRecorder(conn, "logs/landing", flight_channels(conn)):
+            vertical_landing(conn)
+        recording = load_recording("logs/landing")
+    """
+
+    def __init__(
+        self,
+        conn: Client,
+        directory: str,
+        channels: Union[Dict[str, tuple], Iterable[tuple]],
+        rate: float = 10.0,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        if not isinstance(channels, dict):
+            channels = {channel_name(*spec): spec for spec in channels}
+        channels = dict(channels)
+        channels.setdefault(UT_CHANNEL, (getattr, conn.space_center, "ut"))
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.rate = rate
+        self.metadata = metadata or {}
+        self._names = [TIME_CHANNEL] + list(channels)
+        self._telemetry = Telemetry(
+            conn,
+            rate=rate,
+            **{f"c{i}": spec for i, spec in enumerate(channels.values())},
+        )
+        first = (0.0,) + tuple(self._telemetry.snapshot())
+        self._columns = [
+            _Column(directory, name, value)
+            for name, value in zip(self._names, first)
+        ]
+        self._write_index(None)
+
+        self._loop = FixedRateLoop(conn, rate, "telemetry recorder")
+        self._chunks: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._start = time.monotonic()
+        self._sampler = threading.Thread(
+            target=self._sample, name="telemetry sampler", daemon=True
+        )
+        self._writer = threading.Thread(
+            target=self._write, name="telemetry writer", daemon=True
+        )
+        self._writer.start()
+        self._sampler.start()
+
+    def _new_buffers(self) -> List[np.ndarray]:
+        return [column.buffer(CHUNK_SIZE) for column in self._columns]
+
+    def _sample(self):
+        buffers = self._new_buffers()
+        count = 0
+        last_flush = time.monotonic()
+        for _ in self._loop.ticks():
+            if self._stop.is_set():
+                break
+            values = (time.monotonic() - self._start,) + tuple(
+                self._telemetry.snapshot()
+            )
+            for column, buffer, value in zip(self._columns, buffers, values):
+                buffer[count] = column.encode(value)
+            count += 1
+            now = time.monotonic()
+            if count == CHUNK_SIZE or now - last_flush >= FLUSH_INTERVAL:
+                self._chunks.put((buffers, count))
+                buffers = self._new_buffers()
+                count = 0
+                last_flush = now
+        if count:
+            self._chunks.put((buffers, count))
+        self._chunks.put(None)
+
+    def _write(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            buffers, count = chunk
+            for column, buffer in zip(self._columns, buffers):
+                column.write(buffer[:count])
+
+    def _write_index(self, records: Optional[int]):
+        index = {
+            "rate": self.rate,
+            "records": records,
+            "metadata": self.metadata,
+            "channels": {
+                column.name: column.index() for column in self._columns
+            },
+        }
+        with open(os.path.join(self.directory, INDEX_FILE), "w") as f:
+            json.dump(index, f, indent=2)
+
+    @property
+    def stats(self) -> LoopStats:
+        """statistics of the sampler loop"""
+        return self._loop.stats
+
+    def close(self):
+        """Stop recording, flush every record and write the index"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._sampler.join()
+        self._writer.join()
+        self._telemetry.close()
+        for column in self._columns:
+            column.close()
+        self._write_index(self._columns[0].records)
+
+    def __enter__(self) -> "TelemetryRecorder":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Recording(NamedTuple):
+    """Recorded channels, memory-mapped read-only"""
+
+    directory: str
+    index: Dict[str, Any]
+    channels: Dict[str, np.ndarray]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.channels[name]
+
+    def __len__(self) -> int:
+        return len(self.channels[TIME_CHANNEL])
+
+    def enum_names(self, name: str) -> Optional[Dict[int, str]]:
+        """Return enum value to name map of a channel, None if not an enum"""
+        members = self.index["channels"][name].get("enum")
+        if members is None:
+            return None
+        return {value: member for member, value in members.items()}
+
+
+def _load_column(directory: str, entry: Dict[str, Any]) -> np.ndarray:
+    try:
+        return np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+    except (ValueError, EOFError):
+        # no record written yet, an empty array cannot be memory-mapped,
+        # and the header may not be on disk yet
+        return np.empty([0] + entry["shape"], dtype=entry["dtype"])
+
+
+def load_recording(directory: str) -> Recording:
+    """Load a recording without copying it
+
+    Channels are truncated to the number of records of the shortest one,
+    so a recording still being written loads consistently.
+
+    Args:
+        directory: directory written by TelemetryRecorder
+
+    Returns:
+        return Recording of np.memmap arrays
+    """
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        index = json.load(f)
+    channels = {
+        name: _load_column(directory, entry)
+        for name, entry in index["channels"].items()
+    }
+    records = min(len(array) for array in channels.values())
+    channels = {name: array[:records] for name, array in channels.items()}
+    return Recording(directory, index, channels)
+
+
+if __name__ == "__main__":
+    import krpc
+    import sys
+
+    krpc_address = os.environ["KRPC_ADDRESS"]
+    conn = krpc.connect(name="telemetry recorder", address=krpc_address)
+    vessel = conn.space_center.active_vessel
+    recorder = TelemetryRecorder(
+        conn,
+        sys.argv[1],
+        flight_channels(conn),
+        metadata={"body": vessel.orbit.body.name, "vessel": vessel.name},
+    )
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        recorder.close()
+        print(recorder.stats.summary())
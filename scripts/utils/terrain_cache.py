@@ -0,0 +1,257 @@
+import math
+import os
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from krpc.client import Client
+from scripts.utils.body_catalog import BodyInfo, body_catalog
+from scripts.utils.utils import cache_path
+
+
+ArrayLike = Union[float, np.ndarray]
+
+# bump when the tile layout changes, so stale tiles are not read
+TERRAIN_VERSION = 1
+
+
+class TerrainCache(object):
+    """Terrain height of a body, sampled in tiles and cached on disk
+
+    The body is split into tile_size x tile_size degree tiles, each sampled
+    with body.surface_height on a (samples + 1) x (samples + 1) grid the
+    first time a query falls in it. Tiles are saved as .npy files under the
+    cache directory, keyed by game fingerprint, so later flights make no
+    RPC for terrain. Queries are answered locally by bilinear
+    interpolation, and take arrays of coordinates. Sampling a tile costs
+    (samples + 1)^2 RPCs, so a control loop should prefetch() its tiles
+    first, or query with sample=False and get NaN outside cached tiles.
+
+    Usage:
+        terrain = terrain_cache(conn, "Mun")
+        terrain.prefetch(target_lat, target_lon)
+        heights = terrain.height(lats, lons, sample=False)
+    """
+
+    def __init__(
+        self,
+        conn: Client,
+        body: BodyInfo,
+        fingerprint: str,
+        tile_size: float = 1.0,
+        samples: int = 16,
+    ):
+        if 180.0 % tile_size:
+            raise ValueError(f"tile_size {tile_size} does not divide 180")
+        self.body = body
+        self.tile_size = tile_size
+        self.samples = samples
+        self.directory = os.path.dirname(
+            cache_path(
+                "terrain",
+                f"v{TERRAIN_VERSION}",
+                fingerprint,
+                body.name,
+                f"{tile_size:g}deg_{samples}",
+                "tile",
+            )
+        )
+        self.conn = conn
+        self._rows = int(round(180.0 / tile_size))
+        self._columns = 2 * self._rows
+        self._tiles: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _tile_path(self, row: int, column: int) -> str:
+        return os.path.join(self.directory, f"{row}_{column}.npy")
+
+    def _sample_tile(self, row: int, column: int) -> np.ndarray:
+        krpc_body = self.conn.space_center.bodies[self.body.name]
+        steps = np.linspace(0.0, self.tile_size, self.samples + 1)
+        lats = -90.0 + row * self.tile_size + steps
+        lons = -180.0 + column * self.tile_size + steps
+        return np.array(
+            [
+                [krpc_body.surface_height(lat, lon) for lon in lons]
+                for lat in lats
+            ]
+        )
+
+    def cached_tile(self, row: int, column: int) -> Optional[np.ndarray]:
+        """Return heights of a tile from memory or disk, None if not cached
+
+        Args:
+            row: tile row, from the south pole
+            column: tile column, from longitude -180
+
+        Returns:
+            return (samples + 1, samples + 1) array of heights, by lat, lon
+        """
+        key = (row, column)
+        with self._lock:
+            heights = self._tiles.get(key)
+            if heights is not None:
+                return heights
+            try:
+                heights = np.load(self._tile_path(row, column))
+            except (OSError, ValueError):
+                return None
+            self._tiles[key] = heights
+            return heights
+
+    def tile(self, row: int, column: int) -> np.ndarray:
+        """Return heights of a tile, sampling it if not cached
+
+        Args:
+            row: tile row, from the south pole
+            column: tile column, from longitude -180
+
+        Returns:
+            return (samples + 1, samples + 1) array of heights, by lat, lon
+        """
+        heights = self.cached_tile(row, column)
+        if heights is not None:
+            return heights
+        with self._lock:
+            key = (row, column)
+            heights = self._tiles.get(key)
+            if heights is not None:
+                return heights
+            path = self._tile_path(row, column)
+            heights = self._sample_tile(row, column)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, heights)
+            os.replace(tmp_path, path)
+            self._tiles[key] = heights
+            return heights
+
+    def prefetch(self, lat: ArrayLike, lon: ArrayLike):
+        """Sample the tiles of coords now, so later queries make no RPC
+
+        Args:
+            lat: latitudes in degree
+            lon: longitudes in degree
+        """
+        rows, columns, _, _ = self._locate(lat, lon)
+        for key in np.unique(rows * self._columns + columns):
+            self.tile(*divmod(int(key), self._columns))
+
+    def _locate(self, lat: ArrayLike, lon: ArrayLike):
+        """tile indices and fractional grid position of coords"""
+        lat, lon = np.broadcast_arrays(
+            np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        )
+        y = (np.clip(lat, -90.0, 90.0) + 90.0) / self.tile_size
+        x = ((lon + 180.0) % 360.0) / self.tile_size
+        rows = np.minimum(np.floor(y).astype(int), self._rows - 1)
+        columns = np.minimum(np.floor(x).astype(int), self._columns - 1)
+        return (
+            rows,
+            columns,
+            (y - rows) * self.samples,
+            (x - columns) * self.samples,
+        )
+
+    def _interpolate(self, lat: ArrayLike, lon: ArrayLike, sample: bool):
+        """height and its gradient per grid step, by bilinear interpolation"""
+        rows, columns, v, u = self._locate(lat, lon)
+        height = np.full(rows.shape, np.nan)
+        d_lat = np.full(rows.shape, np.nan)
+        d_lon = np.full(rows.shape, np.nan)
+        keys = rows * self._columns + columns
+        for key in np.unique(keys):
+            mask = keys == key
+            row, column = divmod(int(key), self._columns)
+            if sample:
+                heights = self.tile(row, column)
+            else:
+                heights = self.cached_tile(row, column)
+                if heights is None:
+                    continue
+            tv, tu = v[mask], u[mask]
+            i = np.minimum(np.floor(tv).astype(int), self.samples - 1)
+            j = np.minimum(np.floor(tu).astype(int), self.samples - 1)
+            fv = tv - i
+            fu = tu - j
+            h00 = heights[i, j]
+            h01 = heights[i, j + 1]
+            h10 = heights[i + 1, j]
+            h11 = heights[i + 1, j + 1]
+            south = h00 + (h01 - h00) * fu
+            north = h10 + (h11 - h10) * fu
+            height[mask] = south + (north - south) * fv
+            d_lat[mask] = north - south
+            d_lon[mask] = (h01 - h00) * (1 - fv) + (h11 - h10) * fv
+        return height, d_lat, d_lon
+
+    def height(
+        self, lat: ArrayLike, lon: ArrayLike, sample: bool = True
+    ) -> ArrayLike:
+        """Return terrain height above the equatorial radius
+
+        Args:
+            lat: latitudes in degree
+            lon: longitudes in degree
+            sample: sample missing tiles, NaN outside cached tiles if False
+
+        Returns:
+            return heights in meter, float for scalar args
+        """
+        height, _, _ = self._interpolate(lat, lon, sample)
+        return height if height.ndim else float(height)
+
+    def slope(
+        self, lat: ArrayLike, lon: ArrayLike, sample: bool = True
+    ) -> ArrayLike:
+        """Return terrain slope, angle between the ground and the horizon
+
+        Args:
+            lat: latitudes in degree
+            lon: longitudes in degree
+            sample: sample missing tiles, NaN outside cached tiles if False
+
+        Returns:
+            return slopes in degree, float for scalar args
+        """
+        _, d_lat, d_lon = self._interpolate(lat, lon, sample)
+        step = math.radians(self.tile_size / self.samples)
+        north = self.body.equatorial_radius * step
+        east = north * np.maximum(np.cos(np.radians(lat)), 1e-6)
+        slope = np.degrees(np.arctan(np.hypot(d_lat / north, d_lon / east)))
+        return slope if slope.ndim else float(slope)
+
+
+_terrain_caches = {}
+_terrain_caches_lock = threading.Lock()
+
+
+def terrain_cache(
+    conn: Client, body_name: str, tile_size: float = 1.0, samples: int = 16
+) -> TerrainCache:
+    """Return terrain cache of a body, shared by the game's connections
+
+    Args:
+        conn: kRPC connection
+        body_name: name of the body
+        tile_size: tile size in degree, must divide 180
+        samples: grid steps per tile side
+
+    Returns:
+        return TerrainCache
+    """
+    catalog = body_catalog(conn)
+    key = (catalog.fingerprint, body_name, tile_size, samples)
+    with _terrain_caches_lock:
+        cache = _terrain_caches.get(key)
+        if cache is None:
+            cache = TerrainCache(
+                conn,
+                catalog[body_name],
+                catalog.fingerprint,
+                tile_size,
+                samples,
+            )
+            _terrain_caches[key] = cache
+        # sample missing tiles over the latest connection
+        cache.conn = conn
+        return cache
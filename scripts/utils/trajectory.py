@@ -0,0 +1,425 @@
+import math
+import os
+import threading
+from typing import Callable, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from krpc.client import Client
+from scripts.utils.body_catalog import BodyInfo, body_catalog
+from scripts.utils.utils import cache_path, latlon, latlon_array
+
+
+ArrayLike = Union[float, np.ndarray]
+State = Tuple[ArrayLike, ArrayLike, ArrayLike, ArrayLike, ArrayLike, ArrayLike]
+
+# step size control: a step covers at most STEP_FRACTION of the estimated
+# time to impact, and half the drag time constant, but no less than
+# MIN_STEP, the last step crossing the ground being interpolated
+STEP_FRACTION = 0.2
+MIN_STEP = 1.0
+MAX_STEP = 5.0
+
+
+class AtmosphereTable(NamedTuple):
+    """Atmosphere density, sampled on a uniform altitude grid
+
+    Densities are interpolated linearly in log space, exact for an
+    exponential atmosphere, and are 0 above depth.
+    """
+
+    depth: float
+    log_densities: np.ndarray
+
+    @property
+    def step(self) -> float:
+        return self.depth / (len(self.log_densities) - 1)
+
+    def density(self, altitude: float) -> float:
+        """Return density in kg/m^3 at an altitude, for a scalar"""
+        if altitude >= self.depth:
+            return 0.0
+        x = max(0.0, altitude) / self.step
+        i = int(x)
+        low = self.log_densities[i]
+        return math.exp(low + (self.log_densities[i + 1] - low) * (x - i))
+
+    def densities(self, altitudes: np.ndarray) -> np.ndarray:
+        """Return densities in kg/m^3 at altitudes, for an array"""
+        x = np.clip(altitudes, 0.0, self.depth) / self.step
+        i = np.minimum(x.astype(int), len(self.log_densities) - 2)
+        low = self.log_densities[i]
+        density = np.exp(low + (self.log_densities[i + 1] - low) * (x - i))
+        return np.where(altitudes < self.depth, density, 0.0)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def atmosphere_table(
+    conn: Client, body_name: str, samples: int = 128
+) -> Optional[AtmosphereTable]:
+    """Return atmosphere table of a body, None if it has no atmosphere
+
+    Densities are read with body.density_at once per game, and cached in
+    memory and in the local cache directory.
+
+    Args:
+        conn: kRPC connection
+        body_name: name of the body
+        samples: number of altitudes sampled from sea level to the top
+
+    Returns:
+        return AtmosphereTable or None
+    """
+    catalog = body_catalog(conn)
+    body = catalog[body_name]
+    if not body.has_atmosphere:
+        return None
+    key = (catalog.fingerprint, body_name, samples)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            return table
+        path = cache_path(
+            "atmosphere", catalog.fingerprint, f"{body_name}_{samples}.npy"
+        )
+        try:
+            densities = np.load(path)
+        except (OSError, ValueError):
+            krpc_body = conn.space_center.bodies[body_name]
+            altitudes = np.linspace(0.0, body.atmosphere_depth, samples)
+            densities = np.array([krpc_body.density_at(a) for a in altitudes])
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, densities)
+            os.replace(tmp_path, path)
+        log_densities = np.log(np.maximum(densities, 1e-12))
+        table = AtmosphereTable(body.atmosphere_depth, log_densities)
+        _tables[key] = table
+        return table
+
+
+class TrajectoryModel(NamedTuple):
+    """Forces on an unpowered vessel, in the rotating frame of a body
+
+    Gravity of a point mass, the Coriolis and centrifugal terms of the
+    body rotation, and quadratic drag 0.5 * rho * |v| * v * drag_area / mass
+    against the air at rest in the rotating frame. drag_area is the drag
+    coefficient times the reference area, in m^2.
+    """
+
+    gravitational_parameter: float
+    equatorial_radius: float
+    rotational_speed: float
+    atmosphere: Optional[AtmosphereTable] = None
+    drag_area: float = 0.0
+    mass: float = 1.0
+
+    @classmethod
+    def for_body(
+        cls,
+        body: BodyInfo,
+        atmosphere: Optional[AtmosphereTable] = None,
+        drag_area: float = 0.0,
+        mass: float = 1.0,
+    ) -> "TrajectoryModel":
+        return cls(
+            body.gravitational_parameter,
+            body.equatorial_radius,
+            body.rotational_speed,
+            atmosphere,
+            drag_area,
+            mass,
+        )
+
+    @property
+    def drag_factor(self) -> float:
+        """drag acceleration per density and squared speed"""
+        if self.atmosphere is None:
+            return 0.0
+        return 0.5 * self.drag_area / self.mass
+
+
+def estimate_drag_area(drag: float, dynamic_pressure: float) -> float:
+    """Return drag area from a measured drag force
+
+    Args:
+        drag: magnitude of flight.drag in N
+        dynamic_pressure: flight.dynamic_pressure in Pa
+
+    Returns:
+        return drag coefficient times reference area in m^2
+    """
+    if dynamic_pressure <= 0:
+        return 0.0
+    return drag / dynamic_pressure
+
+
+class Impact(NamedTuple):
+    """Predicted impact, arrays for batch predictions
+
+    position is in the body reference frame, velocity relative to the
+    surface. Fields are NaN for trajectories that do not impact.
+    """
+
+    ut: ArrayLike
+    position: Tuple[ArrayLike, ArrayLike, ArrayLike]
+    velocity: Tuple[ArrayLike, ArrayLike, ArrayLike]
+    speed: ArrayLike
+    latitude: ArrayLike
+    longitude: ArrayLike
+
+
+def _acceleration(
+    model: TrajectoryModel,
+    density: Callable[[ArrayLike], ArrayLike],
+    drag_factor: float,
+    x: ArrayLike,
+    y: ArrayLike,
+    z: ArrayLike,
+    vx: ArrayLike,
+    vy: ArrayLike,
+    vz: ArrayLike,
+):
+    """acceleration, for floats or arrays alike
+
+    kRPC frames are left-handed with y to the north pole, the velocity of
+    a point of the rotating frame being w * (-z, 0, x).
+    """
+    r2 = x * x + y * y + z * z
+    r = r2 ** 0.5
+    g = -model.gravitational_parameter / (r2 * r)
+    w = model.rotational_speed
+    ax = g * x + w * (2.0 * vz + w * x)
+    ay = g * y
+    az = g * z - w * (2.0 * vx - w * z)
+    if drag_factor:
+        rho = density(r - model.equatorial_radius)
+        k = drag_factor * rho * (vx * vx + vy * vy + vz * vz) ** 0.5
+        ax = ax - k * vx
+        ay = ay - k * vy
+        az = az - k * vz
+    return ax, ay, az
+
+
+def _rk4_step(model, density, drag_factor, s: State, h: ArrayLike) -> State:
+    x, y, z, vx, vy, vz = s
+    a1 = _acceleration(model, density, drag_factor, *s)
+    h2 = 0.5 * h
+    s2 = (
+        x + h2 * vx,
+        y + h2 * vy,
+        z + h2 * vz,
+        vx + h2 * a1[0],
+        vy + h2 * a1[1],
+        vz + h2 * a1[2],
+    )
+    a2 = _acceleration(model, density, drag_factor, *s2)
+    s3 = (
+        x + h2 * s2[3],
+        y + h2 * s2[4],
+        z + h2 * s2[5],
+        vx + h2 * a2[0],
+        vy + h2 * a2[1],
+        vz + h2 * a2[2],
+    )
+    a3 = _acceleration(model, density, drag_factor, *s3)
+    s4 = (
+        x + h * s3[3],
+        y + h * s3[4],
+        z + h * s3[5],
+        vx + h * a3[0],
+        vy + h * a3[1],
+        vz + h * a3[2],
+    )
+    a4 = _acceleration(model, density, drag_factor, *s4)
+    h6 = h / 6.0
+    return (
+        x + h6 * (vx + 2.0 * (s2[3] + s3[3]) + s4[3]),
+        y + h6 * (vy + 2.0 * (s2[4] + s3[4]) + s4[4]),
+        z + h6 * (vz + 2.0 * (s2[5] + s3[5]) + s4[5]),
+        vx + h6 * (a1[0] + 2.0 * (a2[0] + a3[0]) + a4[0]),
+        vy + h6 * (a1[1] + 2.0 * (a2[1] + a3[1]) + a4[1]),
+        vz + h6 * (a1[2] + 2.0 * (a2[2] + a3[2]) + a4[2]),
+    )
+
+
+def _step_size(drag_factor, rho, radial_speed, speed, altitude):
+    """step for a scalar state, see STEP_FRACTION"""
+    h = MAX_STEP
+    if radial_speed < 0:
+        h = min(h, STEP_FRACTION * altitude / -radial_speed)
+    if rho:
+        h = min(h, 0.5 / (drag_factor * rho * speed))
+    return max(h, MIN_STEP)
+
+
+def _hermite(s0: State, s1: State, h: ArrayLike, t: ArrayLike):
+    """position and velocity at fraction t of a step, cubic Hermite"""
+    t2 = t * t
+    t3 = t2 * t
+    h00 = 2 * t3 - 3 * t2 + 1
+    h10 = (t3 - 2 * t2 + t) * h
+    h01 = 3 * t2 - 2 * t3
+    h11 = (t3 - t2) * h
+    d00 = (6 * t2 - 6 * t) / h
+    d10 = 3 * t2 - 4 * t + 1
+    d11 = 3 * t2 - 2 * t
+    position = tuple(
+        h00 * s0[i] + h10 * s0[i + 3] + h01 * s1[i] + h11 * s1[i + 3]
+        for i in range(3)
+    )
+    velocity = tuple(
+        d00 * (s0[i] - s1[i]) + d10 * s0[i + 3] + d11 * s1[i + 3]
+        for i in range(3)
+    )
+    return position, velocity
+
+
+def predict_impact(
+    model: TrajectoryModel,
+    position: Tuple[float, float, float],
+    velocity: Tuple[float, float, float],
+    ut: float,
+    surface_radius: float,
+    max_time: float = 3600.0,
+) -> Optional[Impact]:
+    """Predict where and when an unpowered vessel hits the ground
+
+    Integrates the trajectory with RK4 in the rotating frame of the body,
+    in steps shrinking toward the ground, and interpolates the crossing
+    of surface_radius. Takes well under a millisecond for a descent.
+
+    Args:
+        model: forces on the vessel
+        position: position in the body reference frame
+        velocity: velocity in the body reference frame, i.e. surface-relative
+        ut: current ut
+        surface_radius: radius of the ground at the impact site
+        max_time: give up after this many seconds of flight
+
+    Returns:
+        return Impact, None if the vessel does not impact within max_time
+    """
+    density = model.atmosphere.density if model.atmosphere else None
+    drag_factor = model.drag_factor
+    depth = model.atmosphere.depth if model.atmosphere else 0.0
+    s = tuple(float(v) for v in position) + tuple(float(v) for v in velocity)
+    elapsed = 0.0
+    while elapsed < max_time:
+        x, y, z, vx, vy, vz = s
+        r = (x * x + y * y + z * z) ** 0.5
+        altitude = r - surface_radius
+        sea_altitude = r - model.equatorial_radius
+        rho = (
+            density(sea_altitude) if drag_factor and sea_altitude < depth else 0
+        )
+        speed = (vx * vx + vy * vy + vz * vz) ** 0.5
+        radial_speed = (x * vx + y * vy + z * vz) / r
+        h = _step_size(drag_factor, rho, radial_speed, speed, altitude)
+        s1 = _rk4_step(model, density, drag_factor, s, h)
+        r1 = (s1[0] * s1[0] + s1[1] * s1[1] + s1[2] * s1[2]) ** 0.5
+        if r1 <= surface_radius:
+            t = altitude / (r - r1)
+            p, v = _hermite(s, s1, h, t)
+            lat, lon = latlon(p)
+            return Impact(
+                ut + elapsed + t * h,
+                p,
+                v,
+                (v[0] * v[0] + v[1] * v[1] + v[2] * v[2]) ** 0.5,
+                lat,
+                lon,
+            )
+        s = s1
+        elapsed += h
+    return None
+
+
+def predict_impacts(
+    model: TrajectoryModel,
+    positions: np.ndarray,
+    velocities: np.ndarray,
+    ut: float,
+    surface_radius: ArrayLike,
+    max_time: float = 3600.0,
+) -> Impact:
+    """Predict impacts of a batch of trajectories at once
+
+    Same as predict_impact, for (N, 3) arrays of states, each trajectory
+    taking its own steps. The loop runs until the last trajectory lands,
+    so batch trajectories of similar length, e.g. candidate burns.
+
+    Args:
+        model: forces on the vessel
+        positions: (N, 3) positions in the body reference frame
+        velocities: (N, 3) surface-relative velocities
+        ut: ut of the states
+        surface_radius: radius of the ground, scalar or (N,)
+        max_time: give up after this many seconds of flight
+
+    Returns:
+        return Impact of (N,) arrays, NaN where no impact within max_time
+    """
+    positions = np.asarray(positions, dtype=float)
+    velocities = np.asarray(velocities, dtype=float)
+    n = len(positions)
+    surface_radius = np.broadcast_to(
+        np.asarray(surface_radius, dtype=float), (n,)
+    )
+    density = model.atmosphere.densities if model.atmosphere else None
+    drag_factor = model.drag_factor
+    s = tuple(positions.T) + tuple(velocities.T)
+
+    active = np.ones(n, dtype=bool)
+    elapsed = np.zeros(n)
+    impact_time = np.full(n, np.nan)
+    impact_position = np.full((3, n), np.nan)
+    impact_velocity = np.full((3, n), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        while active.any():
+            x, y, z, vx, vy, vz = s
+            r = np.sqrt(x * x + y * y + z * z)
+            altitude = r - surface_radius
+            radial_speed = (x * vx + y * vy + z * vz) / r
+            h = np.where(
+                radial_speed < 0,
+                STEP_FRACTION * altitude / -radial_speed,
+                MAX_STEP,
+            )
+            if drag_factor:
+                rho = density(r - model.equatorial_radius)
+                speed = np.sqrt(vx * vx + vy * vy + vz * vz)
+                h = np.where(
+                    rho > 0, np.minimum(h, 0.5 / (drag_factor * rho * speed)), h
+                )
+            # each trajectory takes its own step, done ones stay put
+            h = np.where(active, np.clip(h, MIN_STEP, MAX_STEP), 0.0)
+
+            s1 = _rk4_step(model, density, drag_factor, s, h)
+            r1 = np.sqrt(s1[0] * s1[0] + s1[1] * s1[1] + s1[2] * s1[2])
+            hit = active & (r1 <= surface_radius)
+            if hit.any():
+                t = altitude[hit] / (r[hit] - r1[hit])
+                p, v = _hermite(
+                    tuple(c[hit] for c in s),
+                    tuple(c[hit] for c in s1),
+                    h[hit],
+                    t,
+                )
+                impact_time[hit] = elapsed[hit] + t * h[hit]
+                impact_position[:, hit] = p
+                impact_velocity[:, hit] = v
+            elapsed += h
+            active &= ~hit & (elapsed < max_time)
+            s = tuple(np.where(active, c1, c) for c, c1 in zip(s, s1))
+
+    lat, lon = latlon_array(impact_position.T)
+    return Impact(
+        ut + impact_time,
+        tuple(impact_position),
+        tuple(impact_velocity),
+        np.sqrt((impact_velocity ** 2).sum(axis=0)),
+        lat,
+        lon,
+    )
@@ -1,4 +1,5 @@
 import math
+import os
 import numpy as np
 
 def norm(v):
@@ -12,27 +13,123 @@ def dot(v1, v2):
     v2_u = unit_vector(v2)
     return np.clip(np.dot(v1_u, v2_u), -1.0, 1.0)
 
+def _great_circle(lat1, lon1, lat2, lon2):
+    """sine and cosine terms of the great circle between coords in degree
+
+    Returns (y, x, c), where atan2(y, x) is the initial bearing and
+    atan2(hypot(y, x), c) the central angle. atan2 stays accurate for
+    close and antipodal coords, unlike arccos.
+    """
+    lat1, lon1, lat2, lon2 = (np.deg2rad(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+    sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+    cos_dlon = np.cos(dlon)
+    y = np.sin(dlon) * cos_lat2
+    x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_dlon
+    c = sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_dlon
+    return y, x, c
+
+def angle_between_coords_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """calculate radian between (lat,lon) coords, broadcasting arrays
+
+    Args:
+        lat1: latitudes of first coordinations (degree)
+        lon1: longtitudes of first coordinations (degree)
+        lat2: latitudes of second coordinations (degree)
+        lon2: longtitudes of second coordinations (degree)
+
+    Returns:
+        radians between coordinations, in the broadcast shape of the args
+    """
+    y, x, c = _great_circle(lat1, lon1, lat2, lon2)
+    return np.arctan2(np.hypot(y, x), c)
+
+def distance_between_coords_array(lat1, lon1, lat2, lon2, body_radius) -> np.ndarray:
+    """calculate distance between (lat,lon) coords, broadcasting arrays
+
+    Args:
+        lat1: latitudes of first coordinations (degree)
+        lon1: longtitudes of first coordinations (degree)
+        lat2: latitudes of second coordinations (degree)
+        lon2: longtitudes of second coordinations (degree)
+        body_radius: radius of body
+
+    Returns:
+        distances between coordinations, in the broadcast shape of the args
+    """
+    return body_radius * angle_between_coords_array(lat1, lon1, lat2, lon2)
+
+def bearing_between_coords_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """calculate initial bearing between (lat,lon) coords, broadcasting arrays
+
+    Args:
+        lat1: latitudes of first coordinations (degree)
+        lon1: longtitudes of first coordinations (degree)
+        lat2: latitudes of second coordinations (degree)
+        lon2: longtitudes of second coordinations (degree)
+
+    Returns:
+        initial bearings from first to second (degree, in [0, 360))
+    """
+    y, x, _ = _great_circle(lat1, lon1, lat2, lon2)
+    return np.rad2deg(np.arctan2(y, x)) % 360
+
+def bearing_and_distance_between_coords_array(lat1, lon1, lat2, lon2, body_radius) -> (np.ndarray, np.ndarray):
+    """calculate distance and initial bearing between (lat,lon) coords at once
+
+    Args:
+        lat1: latitudes of first coordinations (degree)
+        lon1: longtitudes of first coordinations (degree)
+        lat2: latitudes of second coordinations (degree)
+        lon2: longtitudes of second coordinations (degree)
+        body_radius: radius of body
+
+    Returns:
+        distances between coordinations
+        initial bearings from first to second (degree)
+    """
+    y, x, c = _great_circle(lat1, lon1, lat2, lon2)
+    distance = body_radius * np.arctan2(np.hypot(y, x), c)
+    bearing = np.rad2deg(np.arctan2(y, x)) % 360
+    return distance, bearing
+
+def latlon_array(vectors) -> (np.ndarray, np.ndarray):
+    """calculate (lat, lon) from position vectors, broadcasting arrays
+
+    Args:
+        vectors: (...,3) array of (x,y,z) position vectors
+
+    Returns:
+        lattitudes in degree, of shape (...)
+        longtitudes in degree, of shape (...)
+    """
+    vectors = np.asarray(vectors, dtype=float)
+    x, y, z = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+    lon = np.arctan2(z, x)
+    lat = np.arctan2(y, np.hypot(x, z))
+    return np.rad2deg(lat), np.rad2deg(lon)
+
 def angle_between_coords(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """calculate radian between 2 (lat,lon) coords in radian
+    """calculate radian between 2 (lat,lon) coords in degree
 
-    Extended description of function.
+    Scalar version of angle_between_coords_array.
 
     Args:
         lat1: latitude of first coordination
         lon1: longtitude of first coordination
-        lat2: latitude of first coordination
-        lon2: longtitude of first coordination
+        lat2: latitude of second coordination
+        lon2: longtitude of second coordination
 
     Returns:
         radian between two coordinations
     """
-    lat1, lon1, lat2, lon2 = np.deg2rad((lat1, lon1, lat2, lon2))
-    return np.arccos(np.sin(lat1)*np.sin(lat2) + np.cos(lat1)*np.cos(lat2) * np.cos(abs(lon1 - lon2)))
+    return float(angle_between_coords_array(lat1, lon1, lat2, lon2))
 
 def distance_between_coords(lat1: float, lon1: float, lat2: float, lon2: float, body_radius: float) -> float:
     """calculate distance between 2 (lat,lon) coords
 
-    Extended description of function.
+    Scalar version of distance_between_coords_array.
 
     Args:
         lat1: latitude of first coordination
@@ -43,42 +140,29 @@ def distance_between_coords(lat1: float, lon1: float, lat2: float, lon2: float,
 
     Returns:
         distance between two coordinations
-    """ 
-    lat1, lon1, lat2, lon2 = np.deg2rad((lat1, lon1, lat2, lon2))
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = np.sin(0.5*dlat)**2.0 + np.cos(lat1)*np.cos(lat2)*(np.sin(0.5*dlon)**2.0)
-    c = 2.0*np.arctan2(np.sqrt(a), np.sqrt(1-a))
-    distance = body_radius * c
-    return distance
+    """
+    return float(distance_between_coords_array(lat1, lon1, lat2, lon2, body_radius))
 
 def bearing_between_coords(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """calculate initial bearing between 2 (lat,lon) coords
 
-    Extended description of function.
+    Scalar version of bearing_between_coords_array.
 
     Args:
         lat1: latitude of first coordination
         lon1: longtitude of first coordination
         lat2: latitude of second coordination
         lon2: longtitude of second coordination
-        body_radius: radius of body
 
     Returns:
         initial bearing from first to second (degree)
-    """ 
-    lat1, lon1, lat2, lon2 = np.deg2rad((lat1, lon1, lat2, lon2))
-    dlon = lon2 - lon1
-
-    y = np.sin(dlon) * np.cos(lat2)
-    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
-    bearing = np.rad2deg(np.arctan2(y, x)) % 360
-    return bearing
+    """
+    return float(bearing_between_coords_array(lat1, lon1, lat2, lon2))
 
 def bearing_and_distance_between_coords(lat1: float, lon1: float, lat2: float, lon2: float, body_radius: float) -> ():
     """calculate distance and initial bearing between 2 (lat,lon) coords
 
-    Extended description of function.
+    Scalar version of bearing_and_distance_between_coords_array.
 
     Args:
         lat1: latitude of first coordination
@@ -90,13 +174,14 @@ def bearing_and_distance_between_coords(lat1: float, lon1: float, lat2: float, l
     Returns:
         distance between two coordinations
         initial bearing from first to second (degree)
-    """ 
-    return distance_between_coords(lat1, lon1, lat2, lon2, body_radius), bearing_between_coords(lat1, lon1, lat2, lon2)
+    """
+    distance, bearing = bearing_and_distance_between_coords_array(lat1, lon1, lat2, lon2, body_radius)
+    return float(distance), float(bearing)
 
 def latlon(vector):
     """function to calculate (lat, lon) from state vectors (x,y,z)
 
-    Extended description of function.
+    Scalar version of latlon_array.
 
     Args:
         vector: (x,y,z) state vector
@@ -104,12 +189,9 @@ def latlon(vector):
     Returns:
         lattitude in degree
         longtitude in degree
-    """ 
-    lon = np.arctan2(vector[2], vector[0])
-    p = (vector[0]**2.0 + vector[2]** 2.0)**0.5
-    lat = np.arctan2(vector[1], p)
-    lat, lon = np.rad2deg((lat, lon))
-    return lat, lon
+    """
+    lat, lon = latlon_array(vector)
+    return float(lat), float(lon)
 
 def angle_between(v1, v2):
     """Calculate angle between two vector.
@@ -136,6 +218,23 @@ def clamp_2pi(x):
 
     return x
 
+def cache_path(*parts: str) -> str:
+    """return path of a file in local cache directory
+
+    The cache directory is $KRPC_CARRIER_CACHE_DIR, or ~/.cache/ksp-krpc-carrier.
+    Parent directories of the file are created.
+
+    Args:
+        parts: path components under cache directory
+
+    Returns:
+        path of the file
+    """
+    cache_dir = os.environ.get("KRPC_CARRIER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ksp-krpc-carrier"))
+    path = os.path.join(cache_dir, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
 class PIDController(object):
     """ Robust, single parameter, proportional-integral-derivative controller
         http://brettbeauregard.com/blog/2011/04/improving-the-beginners-pid-introduction/ """
@@ -0,0 +1,51 @@
+import math
+from typing import NamedTuple, Tuple
+
+
+# standard gravity used by KSP for specific impulse
+G0 = 9.80665
+# kg per unit of resource
+RESOURCE_DENSITY = {"LiquidFuel": 5.0, "Oxidizer": 5.0, "SolidFuel": 7.5}
+
+
+class StageSpec(NamedTuple):
+    """Parts of a vessel separated by one decoupler
+
+    Engines ignite when current stage reaches activate_stage, and the
+    parts are dropped when current stage reaches decouple_stage.
+    Engines burn resources of their own stage only. Engines with solid fuel
+    burn at full thrust regardless of throttle.
+    Resource amounts are in KSP units, thrust in N, isp in seconds.
+    thrust and specific_impulse are in vacuum, sea_level_specific_impulse
+    is at 1 atm (the vacuum one if 0). Mass flow does not depend on
+    pressure, thrust drops with the isp in an atmosphere.
+    """
+
+    activate_stage: int
+    decouple_stage: int
+    dry_mass: float
+    thrust: float = 0.0
+    specific_impulse: float = 0.0
+    liquid_fuel: float = 0.0
+    oxidizer: float = 0.0
+    solid_fuel: float = 0.0
+    sea_level_specific_impulse: float = 0.0
+
+
+class VesselDesign(NamedTuple):
+    """Vessel, a cylinder of height along its forward axis
+
+    Flown by the simulator in scripts.sim, and by the ascent model of
+    ascent_optimizer, see ascent_optimizer.design_from_vessel.
+    """
+
+    name: str
+    stages: Tuple[StageSpec, ...]
+    height: float = 5.0
+    width: float = 2.5
+    drag_area: float = 1.0
+    legs: int = 0
+    solar_panels: int = 0
+    radiators: int = 0
+    turn_rate: float = math.radians(30)
+    crash_speed: float = 10.0
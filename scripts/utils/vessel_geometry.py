@@ -0,0 +1,227 @@
+import math
+import threading
+import weakref
+from functools import cached_property
+from typing import Any, Dict, List, NewType, Optional, Tuple
+
+from krpc.client import Client
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Vessel = NewType("Vessel", object)
+Part = NewType("Part", object)
+
+
+class VesselGeometry(object):
+    """Parts and shape of a vessel, valid until its next staging
+
+    Every attribute is read over RPC on first use only, then kept for the
+    life of the snapshot. Get snapshots with vessel_geometry(), which
+    replaces them when the vessel stages or loses parts.
+
+    Attributes:
+        stage: current stage when the snapshot was taken
+        part_count: number of parts when the snapshot was taken
+    """
+
+    def __init__(self, vessel: Vessel, stage: int, part_count: int):
+        self.vessel = vessel
+        self.stage = stage
+        self.part_count = part_count
+
+    @cached_property
+    def bounding_box(self) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+        """bounding box in vessel.reference_frame, y toward the nose"""
+        return self.vessel.bounding_box(self.vessel.reference_frame)
+
+    def lower_bound(self, cos_up: float = 1.0) -> float:
+        """lowest point of the vessel along up, relative to its center
+
+        Takes the attitude without an RPC: cos_up is the cosine between the
+        nose and up, i.e. the first coord of flight.direction in a frame
+        rotating with the surface frame. As roll is unknown, the sideways
+        extent is taken at its worst, so the bound is conservative when
+        the vessel is tilted.
+
+        Args:
+            cos_up: cosine of the angle between the nose and up, 1 upright
+
+        Returns:
+            return offset in meter, negative below the center of mass
+        """
+        (x_min, y_min, z_min), (x_max, y_max, z_max) = self.bounding_box
+        side = math.hypot(
+            max(abs(x_min), abs(x_max)), max(abs(z_min), abs(z_max))
+        )
+        cos_up = max(-1.0, min(1.0, cos_up))
+        sin_up = math.sqrt(1.0 - cos_up * cos_up)
+        return min(y_min * cos_up, y_max * cos_up) - side * sin_up
+
+    @cached_property
+    def parts(self) -> List[Part]:
+        return self.vessel.parts.all
+
+    @cached_property
+    def engines(self) -> List[Any]:
+        return self.vessel.parts.engines
+
+    @cached_property
+    def legs(self) -> List[Any]:
+        return self.vessel.parts.legs
+
+    @cached_property
+    def solar_panels(self) -> List[Any]:
+        return self.vessel.parts.solar_panels
+
+    @cached_property
+    def radiators(self) -> List[Any]:
+        return self.vessel.parts.radiators
+
+    @cached_property
+    def parachutes(self) -> List[Any]:
+        return self.vessel.parts.parachutes
+
+    @cached_property
+    def dry_mass_by_decouple_stage(self) -> Dict[int, float]:
+        """dry mass of parts by the stage they are decoupled in"""
+        masses: Dict[int, float] = {}
+        for part in self.parts:
+            stage = part.decouple_stage
+            masses[stage] = masses.get(stage, 0.0) + part.dry_mass
+        return masses
+
+
+class VesselGeometryCache(object):
+    """Current VesselGeometry of a vessel
+
+    An event on a change of current_stage or of the part count marks the
+    snapshot stale, and the next get() takes a new one. The event fires
+    on the stream thread, so a caller that just staged passes the stage
+    it knows to get() rather than waiting for the event.
+    """
+
+    def __init__(self, conn: Client, vessel: Vessel):
+        self._conn = conn
+        self._vessel = vessel
+        self._geometry: Optional[VesselGeometry] = None
+        self._stale = True
+        self._event = None
+        self._lock = threading.RLock()
+
+    def get(self, stage: Optional[int] = None) -> VesselGeometry:
+        """Return the current snapshot
+
+        Args:
+            stage: current stage if known, a snapshot of another stage is
+                replaced at once
+
+        Returns:
+            return VesselGeometry
+        """
+        with self._lock:
+            geometry = self._geometry
+            if (
+                self._stale
+                or geometry is None
+                or (stage is not None and stage != geometry.stage)
+            ):
+                geometry = self._refresh()
+            return geometry
+
+    def invalidate(self):
+        """Mark the snapshot stale, the next get() takes a new one"""
+        with self._lock:
+            self._stale = True
+
+    def _refresh(self) -> VesselGeometry:
+        self._remove_event()
+        vessel = self._vessel
+        stage = vessel.control.current_stage
+        part_count = len(vessel.parts.all)
+        self._geometry = VesselGeometry(vessel, stage, part_count)
+        self._stale = False
+        self._arm(stage, part_count)
+        return self._geometry
+
+    def _arm(self, stage: int, part_count: int):
+        conn = self._conn
+        vessel = self._vessel
+        expression = conn.krpc.Expression
+        stage_changed = expression.not_equal(
+            expression.call(
+                conn.get_call(getattr, vessel.control, "current_stage")
+            ),
+            expression.constant_int(stage),
+        )
+        parts_changed = expression.not_equal(
+            expression.count(
+                expression.call(conn.get_call(getattr, vessel.parts, "all"))
+            ),
+            expression.constant_int(part_count),
+        )
+        event = conn.krpc.add_event(
+            expression.or_(stage_changed, parts_changed)
+        )
+        self._event = event
+
+        def on_change():
+            with self._lock:
+                if self._event is event:
+                    self._stale = True
+
+        event.add_callback(on_change)
+        event.start()
+
+    def _remove_event(self):
+        if self._event is not None:
+            self._event.remove()
+            self._event = None
+
+    def close(self):
+        """Remove the event, the cache can still be used"""
+        with self._lock:
+            self._remove_event()
+            self._stale = True
+
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def vessel_geometry_cache(
+    conn: Client, vessel: Optional[Vessel] = None
+) -> VesselGeometryCache:
+    """Return the geometry cache of a vessel, shared on the connection
+
+    Args:
+        conn: kRPC connection
+        vessel: vessel, active vessel if None
+
+    Returns:
+        return VesselGeometryCache
+    """
+    if vessel is None:
+        vessel = conn.space_center.active_vessel
+    with _caches_lock:
+        caches = _caches.setdefault(conn, {})
+        cache = caches.get(vessel)
+        if cache is None:
+            cache = VesselGeometryCache(conn, vessel)
+            caches[vessel] = cache
+        return cache
+
+
+def vessel_geometry(
+    conn: Client, vessel: Optional[Vessel] = None, stage: Optional[int] = None
+) -> VesselGeometry:
+    """Return the current geometry of a vessel, without RPC when unchanged
+
+    Args:
+        conn: kRPC connection
+        vessel: vessel, active vessel if None
+        stage: current stage if known, see VesselGeometryCache.get
+
+    Returns:
+        return VesselGeometry
+    """
+    return vessel_geometry_cache(conn, vessel).get(stage)
@@ -0,0 +1,344 @@
+import asyncio
+import math
+import threading
+import weakref
+from typing import Callable, Iterable, List, NewType, Optional
+
+import numpy as np
+from krpc.client import Client
+
+
+# TODO: type hint for kRPC remote objects may need to be separated
+Expression = NewType("Expression", object)
+Flight = NewType("Flight", object)
+Vessel = NewType("Vessel", object)
+Leg = NewType("Leg", object)
+
+# situations counted as touchdown by touchdown_expression
+TOUCHDOWN_SITUATIONS = ("landed", "splashed")
+
+# rails warp of each connection, replacing space_center.warp_to
+_warp_handlers = weakref.WeakKeyDictionary()
+_warp_handlers_lock = threading.Lock()
+
+
+def wait_for_expression(
+    conn: Client, expression: Expression, timeout: Optional[float] = None
+) -> bool:
+    """Block until a kRPC expression becomes true
+
+    The expression is evaluated by the server, which wakes the client up
+    when it holds, so waiting costs no client CPU and no polling RPC.
+
+    Args:
+        conn: kRPC connection
+        expression: boolean conn.krpc.Expression
+        timeout: timeout in seconds, None waits forever
+
+    Returns:
+        return True if the expression became true, False on timeout
+    """
+    # the event's callback sets the flag, a wait timing out leaves it unset
+    flag = EventFlag(conn, expression)
+    try:
+        return flag.wait(timeout)
+    finally:
+        flag.remove()
+
+
+def attribute_expression(
+    conn: Client, obj: object, attribute: str
+) -> Expression:
+    """Return expression of the value of obj.attribute"""
+    return conn.krpc.Expression.call(conn.get_call(getattr, obj, attribute))
+
+
+def threshold_expression(
+    conn: Client,
+    obj: object,
+    attribute: str,
+    threshold: float,
+    above: bool = True,
+) -> Expression:
+    """Return expression of obj.attribute crossing threshold
+
+    Args:
+        conn: kRPC connection
+        obj: kRPC object, e.g. vessel.flight()
+        attribute: name of a float or double attribute, e.g. "mean_altitude"
+        threshold: threshold value
+        above: value >= threshold if True, value <= threshold if False
+
+    Returns:
+        return boolean conn.krpc.Expression
+    """
+    Expr = conn.krpc.Expression
+    value = attribute_expression(conn, obj, attribute)
+    threshold = Expr.constant_double(threshold)
+    if above:
+        return Expr.greater_than_or_equal(value, threshold)
+    return Expr.less_than_or_equal(value, threshold)
+
+
+def ut_expression(conn: Client, ut: float) -> Expression:
+    """Return expression of universal time reaching ut"""
+    return threshold_expression(conn, conn.space_center, "ut", ut)
+
+
+def pointing_error_expression(
+    conn: Client,
+    flight: Flight,
+    target_direction: Iterable[float],
+    max_angle: float,
+) -> Expression:
+    """Return expression of vessel pointing within max_angle of target
+
+    Compares flight.direction with target_direction on the server as
+    dot(direction, target) >= cos(max_angle).
+
+    Args:
+        conn: kRPC connection
+        flight: vessel.flight() in the reference frame of target_direction
+        target_direction: target direction vector
+        max_angle: allowed pointing error in radian
+
+    Returns:
+        return boolean conn.krpc.Expression
+    """
+    Expr = conn.krpc.Expression
+    target = np.asarray(target_direction, dtype=float)
+    target = target / np.linalg.norm(target)
+
+    direction = attribute_expression(conn, flight, "direction")
+    dot = None
+    for i, component in enumerate(target):
+        if component == 0:
+            continue
+        term = Expr.multiply(
+            Expr.get(direction, Expr.constant_int(i)),
+            Expr.constant_double(float(component)),
+        )
+        dot = term if dot is None else Expr.add(dot, term)
+
+    return Expr.greater_than_or_equal(
+        dot, Expr.constant_double(math.cos(max_angle))
+    )
+
+
+def wait_until(
+    conn: Client,
+    obj: object,
+    attribute: str,
+    threshold: float,
+    above: bool = True,
+    timeout: Optional[float] = None,
+) -> bool:
+    """Block until obj.attribute crosses threshold
+
+    Args:
+        conn: kRPC connection
+        obj: kRPC object, e.g. vessel.flight()
+        attribute: name of a float or double attribute, e.g. "mean_altitude"
+        threshold: threshold value
+        above: wait until value >= threshold if True, value <= threshold if False
+        timeout: timeout in seconds, None waits forever
+
+    Returns:
+        return True if the value crossed the threshold, False on timeout
+    """
+    expression = threshold_expression(conn, obj, attribute, threshold, above)
+    return wait_for_expression(conn, expression, timeout)
+
+
+def wait_until_ut(
+    conn: Client, ut: float, timeout: Optional[float] = None
+) -> bool:
+    """Block until universal time reaches ut
+
+    Args:
+        conn: kRPC connection
+        ut: universal time to wait for
+        timeout: timeout in seconds of real time, None waits forever
+
+    Returns:
+        return True if ut is reached, False on timeout
+    """
+    return wait_for_expression(conn, ut_expression(conn, ut), timeout)
+
+
+def wait_until_pointing_error_below(
+    conn: Client,
+    flight: Flight,
+    target_direction: Iterable[float],
+    max_angle: float,
+    timeout: Optional[float] = None,
+) -> bool:
+    """Block until vessel points within max_angle of target_direction
+
+    Args:
+        conn: kRPC connection
+        flight: vessel.flight() in the reference frame of target_direction
+        target_direction: target direction vector
+        max_angle: allowed pointing error in radian
+        timeout: timeout in seconds, None waits forever
+
+    Returns:
+        return True if pointing error is below max_angle, False on timeout
+    """
+    expression = pointing_error_expression(
+        conn, flight, target_direction, max_angle
+    )
+    return wait_for_expression(conn, expression, timeout)
+
+
+def set_warp_handler(conn: Client, handler: Optional[Callable[[float], None]]):
+    """Set the function warp_to calls on the connection, None to unset
+
+    MissionRuntime sets one, so that procedures sharing the connection
+    warp without holding it.
+    """
+    with _warp_handlers_lock:
+        if handler is None:
+            _warp_handlers.pop(conn, None)
+        else:
+            _warp_handlers[conn] = handler
+
+
+def warp_to(conn: Client, ut: float):
+    """Block until universal time reaches ut, warping on rails
+
+    Procedures call this in place of conn.space_center.warp_to, which holds
+    the RPC connection until the warp ends.
+
+    Args:
+        conn: kRPC connection
+        ut: universal time to warp to
+    """
+    with _warp_handlers_lock:
+        handler = _warp_handlers.get(conn)
+    if handler is None:
+        conn.space_center.warp_to(ut)
+    else:
+        handler(ut)
+
+
+def touchdown_expression(
+    conn: Client, vessel: Vessel, legs: Optional[List[Leg]] = None
+) -> Expression:
+    """Return expression of the vessel touching down
+
+    True when any leg is grounded, or when the situation is one of
+    TOUCHDOWN_SITUATIONS. The situation is compared as an int, and is
+    enough for vessels without legs.
+
+    Args:
+        conn: kRPC connection
+        vessel: vessel
+        legs: legs to watch, vessel.parts.legs if None
+
+    Returns:
+        return boolean conn.krpc.Expression
+    """
+    Expr = conn.krpc.Expression
+    if legs is None:
+        legs = vessel.parts.legs
+
+    situation = Expr.cast(
+        attribute_expression(conn, vessel, "situation"), conn.krpc.Type.int()
+    )
+    expression = None
+    for name in TOUCHDOWN_SITUATIONS:
+        value = getattr(conn.space_center.VesselSituation, name).value
+        term = Expr.equal(situation, Expr.constant_int(value))
+        expression = term if expression is None else Expr.or_(expression, term)
+    for leg in legs:
+        expression = Expr.or_(
+            expression, attribute_expression(conn, leg, "is_grounded")
+        )
+    return expression
+
+
+class EventFlag(object):
+    """Flag set by the server when an expression becomes true
+
+    Wraps a kRPC event, so that callers can poll is_set() without RPC,
+    block on wait(), register callbacks or await the flag from asyncio.
+    Callbacks run on the stream thread once the flag is set, or at once
+    when added after it.
+
+    Usage:
+        touchdown = touchdown_event(conn, vessel)
+        touchdown.add_callback(lambda: print("touchdown"))
+        await touchdown
+        touchdown.remove()
+    """
+
+    def __init__(self, conn: Client, expression: Expression):
+        self._flag = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._event = conn.krpc.add_event(expression)
+        self._event.add_callback(self._set)
+        self._event.start()
+
+    def _set(self):
+        with self._lock:
+            self._flag.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def is_set(self) -> bool:
+        return self._flag.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the flag is set
+
+        Args:
+            timeout: timeout in seconds, None waits forever
+
+        Returns:
+            return True if the flag is set, False on timeout
+        """
+        return self._flag.wait(timeout)
+
+    def add_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if not self._flag.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def __await__(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                future.set_result(True)
+
+        self.add_callback(lambda: loop.call_soon_threadsafe(resolve))
+        return future.__await__()
+
+    def remove(self):
+        """Remove the server-side event"""
+        self._event.remove()
+
+
+def touchdown_event(
+    conn: Client, vessel: Vessel, legs: Optional[List[Leg]] = None
+) -> EventFlag:
+    """Return flag set by the server on touchdown
+
+    One event covers every leg and the situation, so detection costs no
+    RPC per control loop iteration whatever the number of legs.
+
+    Args:
+        conn: kRPC connection
+        vessel: vessel
+        legs: legs to watch, vessel.parts.legs if None
+
+    Returns:
+        return EventFlag, remove() it when done
+    """
+    return EventFlag(conn, touchdown_expression(conn, vessel, legs))